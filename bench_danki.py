@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Reproduce the performance numbers quoted for the batch machinery in danki_app.py.
+
+    python bench_danki.py                 # all sections
+    python bench_danki.py tm apkg         # some of them: tm, payload, apkg, gui
+
+Run from the repository root (the offline dictionary is read from ./dictionary).
+Anki is replaced by the FakeAnki from test_danki_core.py behind a local HTTP
+server, so AnkiConnect timings include the HTTP round-trips but not the time a
+real Anki spends writing its collection; TTS is replaced by synthetic clips.
+The gui section needs PyQt5 and runs offscreen.
+"""
+import copy
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from test_danki_core import FakeAnki, d  # also points HOME at a scratch directory
+
+CLIP_BYTES = 24_000  # about 3 s of 64 kbit/s MP3
+
+
+def start_fake_anki():
+    """FakeAnki served over HTTP on a free port; ANKI is pointed at it."""
+    fake = FakeAnki()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with lock:
+                body = json.dumps(fake.post(payload)).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    d.ANKI.endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+    return fake
+
+
+def synthetic_tts(text, filename_hint=None):
+    return d.clip_from_bytes(b"\xff\xf3" * (CLIP_BYTES // 2), d.expected_clip_filename(text))
+
+
+def dictionary_words(count, offset=0):
+    d.load_offline_dictionary()
+    words = list(d.GERMAN_DICT)[offset:offset + count]
+    return [d.convert_dict_to_anki_format(d.lookup_word_in_dictionary(word), word) for word in words]
+
+
+def bench_tm(size=100_000, queries=5_000):
+    """user-026: translation memory hit rate and lookup latency at `size` phrases."""
+    random.seed(1)
+    subjects = ["Ich", "Du", "Er", "Sie", "Wir", "Ihr", "Mein Bruder", "Die Lehrerin", "Unser Nachbar", "Das Kind"]
+    verbs = ["gehe", "kaufe", "sehe", "lese", "koche", "besuche", "finde", "suche", "male", "trage"]
+    objects = ["ein Buch", "den Hund", "das Auto", "eine Jacke", "den Park", "die Stadt", "einen Kuchen",
+               "das Museum", "die Zeitung", "einen Apfel"]
+    adverbs = ["heute", "morgen", "jeden Tag", "am Wochenende", "oft", "selten", "gestern", "gern", "immer", "nie"]
+    tm = d.TranslationMemory(path=os.path.join(tempfile.mkdtemp(), "tm.jsonl"))
+    parts = []
+    started = time.perf_counter()
+    for i in range(size):
+        parts.append([random.choice(subjects), random.choice(verbs), random.choice(adverbs), random.choice(objects), f"{i}."])
+        phrase = " ".join(parts[-1])
+        tm.add(phrase, phrase, "-")
+    build = time.perf_counter() - started
+    # Workload: 30% repeats, 30% stored phrases with one word changed, 40% new phrases
+    workload = []
+    for _ in range(queries):
+        r = random.random()
+        if r < 0.3:
+            workload.append(" ".join(random.choice(parts)))
+        elif r < 0.6:
+            edited = list(random.choice(parts))
+            edited[2] = random.choice([adverb for adverb in adverbs if adverb != edited[2]])
+            workload.append(" ".join(edited))
+        else:
+            workload.append(f"Ein ganz neuer Satz über {random.choice(objects)} mit der Nummer {random.randint(0, 10 ** 9)}")
+    latencies = []
+    for phrase in workload:
+        started = time.perf_counter()
+        tm.lookup(phrase)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    stats = tm.stats()
+    print(f"[tm] {size} phrases indexed in {build:.1f}s; {queries} lookups (30% repeats, 30% one word changed, 40% new)")
+    print(f"[tm] hit rate {stats['hit_rate']:.1%} ({stats['exact_hits']} exact, {stats['fuzzy_hits']} fuzzy); "
+          f"latency mean {stats['avg_lookup_ms']:.3f} ms, p50 {latencies[len(latencies) // 2] * 1000:.3f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.3f} ms")
+
+
+def bench_payload(words=100):
+    """user-031: addNotes request size and peak Python memory, clips by path vs inline base64."""
+    d.generate_tts_audio = synthetic_tts
+    for offset, mode in enumerate(("inline", "path")):
+        d.media_transfer_mode = lambda mode=mode: mode
+        parsed = dictionary_words(words, offset * words)
+        tracemalloc.start()
+        built = d.build_word_notes(parsed, "German", True)
+        notes = [note for note, _ in built if note is not None]
+        body = json.dumps({"action": "addNotes", "version": 6, "params": {"notes": notes}})
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        clips = sum(len(note["audio"]) for note in notes)
+        print(f"[payload] {mode:6}: {len(notes)} notes, {clips} clips of {CLIP_BYTES // 1000} KB: "
+              f"request {len(body) / 1e6:.2f} MB, peak memory {peak / 1e6:.1f} MB")
+        for note in notes:
+            d.release_spooled_audio(note)
+
+
+def bench_apkg(words=2_000):
+    """user-033/user-042: notes/sec written to an .apkg versus sent with canAddNotes + addNotes."""
+    d.generate_tts_audio = synthetic_tts
+    d.media_transfer_mode = lambda: "path"
+    start_fake_anki()
+    parsed = dictionary_words(words)
+    notes = [note for note, _ in d.build_word_notes(parsed, "German", True) if note is not None]
+    spooled = {audio["path"]: open(audio["path"], "rb").read() for note in notes for audio in note["audio"]}
+    field_names = list(notes[0]["fields"])
+    models = {d.NOTE_TYPE: {"id": 1700000000001, "fields": field_names, "css": "",
+                            "templates": [{"name": "Card 1", "qfmt": "{{base_d}}", "afmt": "{{base_e}}"}]}}
+
+    def respool():
+        for path, data in spooled.items():
+            with open(path, "wb") as f:
+                f.write(data)
+
+    requests_before = d.ANKI.request_count
+    started = time.perf_counter()
+    results = d.commit_notes(copy.deepcopy(notes))
+    anki_seconds = time.perf_counter() - started
+    added = sum(1 for success, _ in results if success)
+    respool()
+    path = os.path.join(tempfile.mkdtemp(), "bench.apkg")
+    started = time.perf_counter()
+    written = d.write_apkg(path, copy.deepcopy(notes), models)
+    apkg_seconds = time.perf_counter() - started
+    print(f"[apkg] {len(notes)} notes with {len(spooled)} clips")
+    print(f"[apkg] canAddNotes + addNotes (fake AnkiConnect): {added} notes in {anki_seconds:.2f}s = {added / anki_seconds:,.0f} notes/s "
+          f"({d.ANKI.request_count - requests_before} requests)")
+    print(f"[apkg] write_apkg: {written} notes in {apkg_seconds:.2f}s = {written / apkg_seconds:,.0f} notes/s "
+          f"({os.path.getsize(path) / 1e6:.1f} MB package)")
+
+
+def bench_gui(words=5_000):
+    """user-048: GUI-thread cost of the WordMaster log and progress bar for a synthetic batch."""
+    d.load_qt()
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import QApplication, QProgressBar, QTextEdit, QVBoxLayout, QWidget
+
+    class SyntheticPipeline:
+        """Three log lines and one progress tick per word, as a WordMaster batch emits them."""
+        summary = {}
+
+        def run(self):
+            for i in range(words):
+                self.on_message(f"Processing: Wort{i}...")
+                self.on_message(f"✓ Wort{i} → word {i} [Dictionary]\n")
+                self.on_progress(1)
+            return {"added": words, "total": words}
+
+    app = QApplication.instance() or QApplication([])
+    for buffered in (False, True):
+        window = QWidget()
+        layout = QVBoxLayout(window)
+        box, bar = QTextEdit(), QProgressBar()
+        box.setReadOnly(True)
+        box.setFixedHeight(150)
+        layout.addWidget(box)
+        layout.addWidget(bar)
+        window.show()
+        bar.setMaximum(words)
+        bar.setValue(0)
+        signals = d.WordPipelineSignals(window)
+        if buffered:
+            log, progress = d.LogBuffer(box, d.BATCH_LOG_PATH), d.ProgressThrottle(bar)
+            progress.reset(words)
+            callbacks, finish = (log.append, progress.advance), lambda: (progress.flush(), log.flush())
+        else:
+            signals.message.connect(box.append)
+            signals.progress.connect(lambda n: bar.setValue(bar.value() + n))
+            callbacks, finish = (), lambda: None
+        gaps, last = [], [time.perf_counter()]
+
+        def beat():
+            now = time.perf_counter()
+            gaps.append(now - last[0])
+            last[0] = now
+
+        heartbeat = QTimer()
+        heartbeat.timeout.connect(beat)
+        heartbeat.start(10)
+        clock = {}
+
+        def finished(summary):
+            finish()
+            app.processEvents()
+            heartbeat.stop()
+            label = "LogBuffer + ProgressThrottle" if buffered else "one signal per message"
+            print(f"[gui] {label:28}: {words} words, GUI-thread CPU {time.thread_time() - clock['cpu']:.2f}s, "
+                  f"longest event-loop stall {max(gaps) * 1000:.0f} ms, bar {bar.value()}/{words}")
+            app.quit()
+
+        def go():
+            last[0] = time.perf_counter()
+            clock["cpu"] = time.thread_time()
+            signals.start(SyntheticPipeline(), *callbacks)
+
+        signals.finished.connect(finished)
+        QTimer.singleShot(50, go)
+        app.exec_()
+        window.close()
+
+
+SECTIONS = {"tm": bench_tm, "payload": bench_payload, "apkg": bench_apkg, "gui": bench_gui}
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or list(SECTIONS):
+        SECTIONS[name]()
@@ -1,5 +1,5 @@
-from PyQt5.QtCore import Qt, QTimer, QUrl
-from PyQt5.QtGui import QPixmap, QCursor, QDesktopServices
+import time
+_STARTUP_T0 = time.perf_counter()
 import random
 # --- Humorous donation messages ---
 DONATION_MESSAGES = [
@@ -12,40 +12,87 @@ DONATION_MESSAGES = [
 import webbrowser
 is_processing = False
 is_processing_phrase = False
-import requests
 import json
 import re
 import os
+import importlib
+import importlib.util
 import tempfile
 import base64
 import subprocess
-from PyQt5 import QtWidgets
-from PyQt5 import QtGui
-from PyQt5.QtWidgets import (
-    QApplication, QWidget, QLabel, QPushButton, QTextEdit, QVBoxLayout,
-    QComboBox, QHBoxLayout, QMessageBox, QInputDialog, QProgressBar, QLineEdit, QCheckBox, QToolButton, QDialog
-)
-from PyQt5.QtCore import QSize
+import shutil
+import sqlite3
+import csv
+import zipfile
+import zlib
+import pickle
+import hashlib
+import html
+import threading
+import queue
+import ctypes
+import ctypes.util
+import io
+import wave
+import codecs
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
 import sys
+import argparse
+import secrets
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
 from pathlib import Path
-import asyncio
 
-# Try to import edge-tts
-try:
-    import edge_tts
-    EDGE_TTS_AVAILABLE = True
-except ImportError:
-    EDGE_TTS_AVAILABLE = False
-    print("[TTS] edge-tts not installed. Using macOS say only.")
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access.
+
+    requests (~75 ms) and edge_tts (~180 ms, via aiohttp) are only needed once
+    something goes over the network, so they stay off the startup path.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+requests = LazyModule("requests")
+asyncio = LazyModule("asyncio")  # only the Edge TTS worker needs it
+
+# Check for edge-tts without importing it
+EDGE_TTS_AVAILABLE = importlib.util.find_spec("edge_tts") is not None
+if EDGE_TTS_AVAILABLE:
+    edge_tts = LazyModule("edge_tts")
+else:
+    print("[TTS] edge-tts not installed. Using macOS say only.", file=sys.stderr)
+
+EDGE_TTS_VOICE = "de-DE-KatjaNeural"
+MACOS_SAY_VOICE = "Anna"
+ESPEAK_VOICE = "de"
 
 # Session state for Edge TTS
 EDGE_TTS_SESSION_DISABLED = False
 EDGE_TTS_FAILURE_COUNT = 0
+EDGE_TTS_STATE_LOCK = threading.Lock()  # guards the two globals above across TTS workers
+
+# Full JSON dumps of every AI result and note (set DANKI_DEBUG=1); per-word dumps slow down big batches
+DEBUG_DUMPS = bool(os.environ.get("DANKI_DEBUG"))
 
 # Global variables for offline dictionary
 API_KEY = None
 API_PROVIDER = "gemini"  # "gemini" or "openai"
 GERMAN_DICT = None
+_dictionary_thread = None  # set while the GUI loads the dictionary in the background
+
+def wait_for_dictionary():
+    """Block until a background dictionary load (if any) has finished."""
+    if _dictionary_thread is not None:
+        _dictionary_thread.join()
 
 def load_offline_dictionary():
     """Load the offline German-English dictionary from JSON file."""
@@ -72,14 +119,28 @@ def load_offline_dictionary():
             GERMAN_DICT = None
             return
         
-        with open(dict_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # Reuse the dictionary parsed by an earlier launch while the file is unchanged (size + mtime)
+        stat = os.stat(dict_path)
+        stamp = {"version": SNAPSHOT_VERSION, "file": os.path.basename(dict_path),
+                 "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        GERMAN_DICT = read_pickle_file(DICTIONARY_CACHE_PATH, stamp)
+        if GERMAN_DICT is not None:
+            print(f"✅ Loaded offline dictionary: {len(GERMAN_DICT)} words from {os.path.basename(dict_path)} (warm start)")
+        else:
+            with open(dict_path, 'rb') as f:
+                data = json.load(f)
             # Extract the nested 'dictionary' key
             GERMAN_DICT = data.get('dictionary', {})
+            try:
+                write_pickle_file(DICTIONARY_CACHE_PATH, stamp, GERMAN_DICT)
+            except Exception as e:
+                print(f"[DICT] Could not cache the parsed dictionary: {e}")
             print(f"✅ Loaded offline dictionary: {len(GERMAN_DICT)} words from {os.path.basename(dict_path)}")
     except Exception as e:
         print(f"[DICT] Failed to load offline dictionary: {e}")
         GERMAN_DICT = None
+    finally:
+        STARTUP_TRACE.mark("dictionary loaded")
 
 def lookup_word_in_dictionary(word):
     """Look up a word in the offline dictionary.
@@ -153,25 +214,6 @@ def convert_dict_to_anki_format(dict_entry, word):
     
     return result
 
-# --- Shortcut-aware QTextEdit ---
-class ShortcutAwareTextEdit(QTextEdit):
-    def __init__(self, callback=None, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.callback = callback
-
-    def keyPressEvent(self, event):
-        if ((event.modifiers() & Qt.ShiftModifier) and
-                event.key() in (Qt.Key_Return, Qt.Key_Enter)):
-            if self.callback and callable(self.callback) and self.toPlainText().strip():
-                self.setDisabled(True)  # Prevent further input
-                def safe_callback():
-                    if self.callback and callable(self.callback):
-                        self.callback()
-                    QTimer.singleShot(1500, lambda: self.setDisabled(False))
-                QTimer.singleShot(0, safe_callback)
-                return
-        super().keyPressEvent(event)
-
 def resource_path(relative_path):
     if hasattr(sys, '_MEIPASS'):
         return os.path.join(sys._MEIPASS, relative_path)
@@ -243,14 +285,41 @@ def refresh_window_icon(window, app_icon, icon_path):
     apply_windows_window_icon(window, icon_path)
 
 CONFIG_PATH = Path(os.path.expanduser("~/.danki/gemini_config.json"))
+TRANSLATION_LANGUAGES = ["English", "Spanish", "Hindi", "French"]
 
 # --- Unified config handling ---
+_config_cache = {"stamp": None, "config": None}  # parsed config and the file's (mtime_ns, size)
+_config_lock = threading.Lock()
+
+def _config_stamp():
+    try:
+        stat = CONFIG_PATH.stat()
+        return (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return None
+
+def _cached_config():
+    """The parsed config; the file is re-read only when its mtime or size changes."""
+    stamp = _config_stamp()
+    with _config_lock:
+        if _config_cache["config"] is None or _config_cache["stamp"] != stamp:
+            config = {}
+            if stamp is not None:
+                with open(CONFIG_PATH) as f:
+                    config = json.load(f)
+            _config_cache["config"] = _with_config_defaults(config)
+            _config_cache["stamp"] = stamp
+        return _config_cache["config"]
+
 def load_config():
-    if CONFIG_PATH.exists():
-        with open(CONFIG_PATH) as f:
-            config = json.load(f)
-    else:
-        config = {}
+    """The config with defaults filled in, as a new dict the caller may change and save_config()."""
+    return dict(_cached_config())
+
+def config_value(key, default=None):
+    """One config value without copying the config (for per-clip and per-word code)."""
+    return _cached_config().get(key, default)
+
+def _with_config_defaults(config):
     # Ensure default values for all expected keys
     config.setdefault("api_key", None)
     config.setdefault("api_provider", "gemini")  # "gemini" or "openai"
@@ -261,12 +330,29 @@ def load_config():
     config.setdefault("always_use_api", False)
     config.setdefault("use_advanced_cards", False)
     config.setdefault("windows_dark_mode", False)
+    config.setdefault("media_transfer_mode", "path")  # "path" (spool files) or "inline" (base64)
+    config.setdefault("defer_audio", False)
+    config.setdefault("audio_quality", "medium")  # "off", "low", "medium" or "high" (see AUDIO_QUALITY_BITRATES)
+    config.setdefault("prefetch", False)          # prepare typed words before Add is pressed
+    config.setdefault("prefetch_budget", 25)      # words per session that may get speculative AI / TTS work
     return config
 
 def save_config(config):
-    CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with open(CONFIG_PATH, "w") as f:
-        json.dump(config, f)
+    write_json_atomic(CONFIG_PATH, config)
+    with _config_lock:
+        _config_cache["config"] = _with_config_defaults(dict(config))
+        _config_cache["stamp"] = _config_stamp()
+
+def write_json_atomic(path, data, **json_options):
+    """Write JSON to a temp file and os.replace it, so a crash never leaves `path` truncated."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, **json_options)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
 
 
 def get_windows_dark_stylesheet():
@@ -349,9 +435,195 @@ def is_connected():
 # === CONFIG ===
 NOTE_TYPE = "German Auto"  
 NOTE_TYPE_ADVANCED = "German Auto Advanced"
+PHRASE_NOTE_TYPE = "Phrase Auto"
 ANKI_ENDPOINT = "http://localhost:8765"
 UPDATE_JSON_URL = "https://raw.githubusercontent.com/udaysidhu99/danki/main/update.json"
 CURRENT_VERSION = "v2.0.0-beta.1"
+ANKI_TIMEOUT = 10          # seconds for ordinary AnkiConnect calls
+ANKI_ADD_TIMEOUT = 60      # seconds for calls that upload media
+ANKI_MULTI_CHUNK = 500     # max sub-actions per `multi` request
+DECK_CACHE_TTL = 30        # seconds a deck classification stays valid
+
+# === ANKICONNECT CLIENT ===
+class AnkiConnectError(Exception):
+    """AnkiConnect returned an error for an action."""
+
+class AnkiConnectUnavailable(AnkiConnectError):
+    """Anki is not running or AnkiConnect could not be reached."""
+
+class AnkiCall:
+    """Placeholder for a call queued in an AnkiBatch; filled in when the batch is sent."""
+
+    def __init__(self, action, params):
+        self.action = action
+        self.params = params
+        self.result = None
+        self.error = None
+
+class AnkiBatch:
+    """Collects independent AnkiConnect calls and sends them as one `multi` request.
+
+        with ANKI.batch() as batch:
+            calls = [batch.call("findNotes", query=q) for q in queries]
+        counts = [len(c.result or []) for c in calls]
+    """
+
+    def __init__(self, client, timeout=None):
+        self.client = client
+        self.timeout = timeout
+        self.calls = []
+
+    def call(self, action, **params):
+        call = AnkiCall(action, params)
+        self.calls.append(call)
+        return call
+
+    def send(self):
+        pending, self.calls = self.calls, []
+        if not pending:
+            return
+        results = self.client.multi([(c.action, c.params) for c in pending], timeout=self.timeout)
+        for call, result in zip(pending, results):
+            if isinstance(result, AnkiConnectError):
+                call.error = str(result)
+            else:
+                call.result = result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.send()
+        return False
+
+class AnkiConnectClient:
+    """Thin AnkiConnect client with a keep-alive session, timeouts and `multi` batching."""
+
+    def __init__(self, endpoint=ANKI_ENDPOINT, timeout=ANKI_TIMEOUT):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self._session = None
+        self.request_count = 0
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = requests.Session()
+        return self._session
+
+    def _post(self, payload, timeout=None):
+        self.request_count += 1
+        try:
+            response = self.session.post(self.endpoint, json=payload, timeout=timeout or self.timeout)
+            return response.json()
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise AnkiConnectUnavailable(str(e)) from e
+        except ValueError as e:
+            raise AnkiConnectError(f"Invalid response from AnkiConnect: {e}") from e
+
+    def invoke(self, action, timeout=None, **params):
+        """Run a single action and return its result, raising AnkiConnectError on failure."""
+        payload = {"action": action, "version": 6}
+        if params:
+            payload["params"] = params
+        reply = self._post(payload, timeout)
+        if reply.get("error") is not None:
+            raise AnkiConnectError(reply["error"])
+        return reply.get("result")
+
+    def multi(self, calls, timeout=None):
+        """Run independent (action, params) calls in as few `multi` requests as possible.
+
+        Returns one entry per call: the result, or an AnkiConnectError instance.
+        """
+        results = []
+        for start in range(0, len(calls), ANKI_MULTI_CHUNK):
+            chunk = calls[start:start + ANKI_MULTI_CHUNK]
+            actions = [
+                {"action": action, "version": 6, "params": params or {}}
+                for action, params in chunk
+            ]
+            for reply in self.invoke("multi", timeout=timeout, actions=actions):
+                if isinstance(reply, dict) and reply.get("error") is not None:
+                    results.append(AnkiConnectError(reply["error"]))
+                elif isinstance(reply, dict) and "result" in reply:
+                    results.append(reply["result"])
+                else:
+                    results.append(reply)
+        return results
+
+    def batch(self, timeout=None):
+        return AnkiBatch(self, timeout)
+
+ANKI = AnkiConnectClient()
+
+# --- Deck classification cache ---
+_deck_cache = {"time": 0.0, "value": None}
+
+def invalidate_deck_cache():
+    """Forget the cached deck classification (e.g. on Refresh or after adding decks)."""
+    _deck_cache["time"] = 0.0
+    _deck_cache["value"] = None
+
+def _deck_and_parents(deck):
+    parts = deck.split("::")
+    return ["::".join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+def classify_decks():
+    """Classify all decks for WordMaster/PhraseMaster in two requests, however many decks there are.
+
+    A deck (including its subdecks) qualifies when it is empty or already holds notes
+    of the tab's note types. Returns {"decks", "wordmaster", "phrasemaster"}; raises
+    AnkiConnectUnavailable if Anki is not running. Cached for DECK_CACHE_TTL seconds.
+    """
+    cached = _deck_cache["value"]
+    if cached is not None and time.monotonic() - _deck_cache["time"] < DECK_CACHE_TTL:
+        return cached
+
+    # Only Danki's own cards are fetched by id; other decks are judged by their card counts,
+    # so the payload grows with the number of decks, not with the collection
+    with ANKI.batch() as batch:
+        names_call = batch.call("deckNamesAndIds")
+        word_cards_call = batch.call("findCards", query=f'note:"{NOTE_TYPE}" OR note:"{NOTE_TYPE_ADVANCED}"')
+        phrase_cards_call = batch.call("findCards", query=f'note:"{PHRASE_NOTE_TYPE}"')
+    for call in (names_call, word_cards_call, phrase_cards_call):
+        if call.error:
+            raise AnkiConnectError(call.error)
+    deck_ids = names_call.result or {}
+    decks = list(deck_ids)
+    deck_names = {deck_id: name for name, deck_id in deck_ids.items()}
+    # A second round-trip: getDeckStats needs the deck names and getDecks the card ids
+    # from the first, and actions inside one multi cannot use each other's results
+    with ANKI.batch() as batch:
+        stats_call = batch.call("getDeckStats", decks=decks)
+        word_decks_call = batch.call("getDecks", cards=word_cards_call.result) if word_cards_call.result else None
+        phrase_decks_call = batch.call("getDecks", cards=phrase_cards_call.result) if phrase_cards_call.result else None
+    for call in (stats_call, word_decks_call, phrase_decks_call):
+        if call is not None and call.error:
+            raise AnkiConnectError(call.error)
+
+    non_empty, has_word, has_phrase = set(), set(), set()
+    # total_in_deck counts the deck's own cards ("name" is only the last path part, so map the id)
+    for stats in (stats_call.result or {}).values():
+        name = deck_names.get(stats.get("deck_id"))
+        if name and stats.get("total_in_deck"):
+            non_empty.update(_deck_and_parents(name))
+    for call, found in ((word_decks_call, has_word), (phrase_decks_call, has_phrase)):
+        for deck, cards in ((call.result or {}) if call is not None else {}).items():
+            if cards:
+                found.update(_deck_and_parents(deck))
+                non_empty.update(_deck_and_parents(deck))
+
+    candidates = [d for d in decks if d.strip().lower() != "default"]
+    value = {
+        "decks": decks,
+        "wordmaster": [d for d in candidates if d not in non_empty or d in has_word],
+        "phrasemaster": [d for d in candidates if d not in non_empty or d in has_phrase],
+    }
+    _deck_cache["value"] = value
+    _deck_cache["time"] = time.monotonic()
+    return value
 
 # === AI QUERY (supports Gemini and OpenAI) ===
 GEMINI_MODEL = "gemini-2.5-flash-lite"
@@ -371,6 +643,34 @@ def get_provider_display_name():
     """Get human-readable name for current provider."""
     return "OpenAI" if API_PROVIDER == "openai" else "Gemini"
 
+class RateLimiter:
+    """Spaces calls evenly so at most `per_minute` go out per minute (0 = unlimited)."""
+
+    def __init__(self, per_minute=0):
+        self.per_minute = per_minute
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.per_minute <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_at - now
+            self.next_at = max(now, self.next_at) + 60.0 / self.per_minute
+        if wait > 0:
+            time.sleep(wait)
+
+AI_RATE_LIMITER = RateLimiter()  # shared by every AI request (the daemon sets a rate)
+_ai_session = None
+
+def ai_session():
+    """Keep-alive HTTP session for the AI providers (reused across requests)."""
+    global _ai_session
+    if _ai_session is None:
+        _ai_session = requests.Session()
+    return _ai_session
+
 def _query_gemini_raw(prompt):
     """Send a prompt to Gemini and return the raw text response."""
     endpoint = (
@@ -379,7 +679,7 @@ def _query_gemini_raw(prompt):
     )
     headers = {'Content-Type': 'application/json'}
     body = {"contents": [{"parts": [{"text": prompt}]}]}
-    response = requests.post(endpoint, headers=headers, json=body)
+    response = ai_session().post(endpoint, headers=headers, json=body, timeout=30)
     result = response.json()
     if "candidates" not in result:
         raise ValueError(f"API error: {result.get('error', 'No candidates returned')}")
@@ -400,7 +700,7 @@ def _query_openai_raw(prompt):
         ],
         "temperature": 0.3
     }
-    response = requests.post(endpoint, headers=headers, json=body, timeout=30)
+    response = ai_session().post(endpoint, headers=headers, json=body, timeout=30)
     result = response.json()
     if "choices" not in result:
         raise ValueError(f"API error: {result.get('error', 'No choices returned')}")
@@ -408,6 +708,7 @@ def _query_openai_raw(prompt):
 
 def query_ai_raw(prompt):
     """Route prompt to the configured AI provider and return raw text."""
+    AI_RATE_LIMITER.acquire()
     if API_PROVIDER == "openai":
         return _query_openai_raw(prompt)
     else:
@@ -507,8 +808,286 @@ def query_gemini(word, translation_language="English"):
     except Exception as e:
         return {"error": str(e)}
 
+# === AI RESULT CACHE (WordMaster) ===
+AI_CACHE_PATH = Path(os.path.expanduser("~/.danki/ai_cache.json"))
+_ai_cache = None
+_ai_cache_lock = threading.Lock()
+_ai_in_flight = {}  # cache key -> Event set when that word's AI lookup finishes
+
+def _ai_cache_key(word, translation_language):
+    return f"{translation_language}\x1f{word.strip()}"
+
+def _load_ai_cache():
+    global _ai_cache
+    if _ai_cache is None:
+        _ai_cache = {}
+        try:
+            if AI_CACHE_PATH.exists():
+                with open(AI_CACHE_PATH, encoding="utf-8") as f:
+                    _ai_cache = json.load(f)
+        except Exception as e:
+            print(f"[AI CACHE] Failed to read cache: {e}")
+    return _ai_cache
+
+def get_cached_ai_result(word, translation_language="English"):
+    """Return a previous successful AI result for this word/language, or None."""
+    with _ai_cache_lock:
+        cached = _load_ai_cache().get(_ai_cache_key(word, translation_language))
+        return dict(cached) if cached else None
+
+def store_ai_result(word, translation_language, parsed):
+    with _ai_cache_lock:
+        _load_ai_cache()[_ai_cache_key(word, translation_language)] = parsed
+
+def save_ai_cache():
+    with _ai_cache_lock:
+        if _ai_cache is None:
+            return
+        try:
+            write_json_atomic(AI_CACHE_PATH, _ai_cache, ensure_ascii=False)
+        except Exception as e:
+            print(f"[AI CACHE] Failed to write cache: {e}")
+
+# === TRANSLATION MEMORY (PhraseMaster) ===
+TM_PATH = Path(os.path.expanduser("~/.danki/translation_memory.jsonl"))
+TM_NGRAM = 3
+TM_NUM_BINS = 32        # MinHash signature length
+TM_BANDS = 8            # LSH bands (4 rows each)
+TM_FUZZY_THRESHOLD = 0.75
+TM_MAX_CANDIDATES = 200
+
+def _tm_normalize(text):
+    """Normalize a phrase for exact matching (case, whitespace, outer punctuation)."""
+    text = re.sub(r"\s+", " ", (text or "").casefold()).strip()
+    return text.strip(" .!?;:,\"'«»„“”")
+
+def _tm_shingles(normalized):
+    padded = f" {normalized} "
+    if len(padded) <= TM_NGRAM:
+        return {padded}
+    return {padded[i:i + TM_NGRAM] for i in range(len(padded) - TM_NGRAM + 1)}
+
+def _tm_signature(shingles):
+    """One-permutation MinHash: one crc32 per shingle, binned into TM_NUM_BINS minima."""
+    sig = [None] * TM_NUM_BINS
+    for shingle in shingles:
+        h = zlib.crc32(shingle.encode("utf-8"))
+        b = h % TM_NUM_BINS
+        v = h // TM_NUM_BINS
+        if sig[b] is None or v < sig[b]:
+            sig[b] = v
+    # Densify empty bins by borrowing from the next filled bin (rotation)
+    for b in range(TM_NUM_BINS):
+        if sig[b] is None:
+            for offset in range(1, TM_NUM_BINS):
+                donor = sig[(b + offset) % TM_NUM_BINS]
+                if donor is not None:
+                    sig[b] = donor + offset * (1 << 28)
+                    break
+    return sig
+
+def _tm_jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class TranslationMemory:
+    """Local memory of processed phrases with a MinHash/LSH similarity index.
+
+    Entries are appended to a JSONL journal; the index is built lazily on first use.
+    """
+
+    def __init__(self, path=TM_PATH):
+        self.path = Path(path)
+        self.entries = []       # list of entry dicts, index = entry id
+        self.exact = {}         # (normalized source, language, normalized context) -> entry id
+        self.buckets = {}       # (band, band values) -> [entry ids]
+        self.loaded = False
+        self.lookups = 0
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.lookup_seconds = 0.0
+
+    def _ensure_loaded(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        self._index(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+            print(f"[TM] Loaded {len(self.exact)} phrases from translation memory")
+        except Exception as e:
+            print(f"[TM] Failed to load translation memory: {e}")
+
+    def _index(self, entry):
+        normalized = _tm_normalize(entry.get("source", ""))
+        if not normalized:
+            return
+        key = (normalized, entry.get("language", "English"), _tm_normalize(entry.get("context", "")))
+        entry_id = len(self.entries)
+        self.entries.append(entry)
+        previous = self.exact.get(key)
+        self.exact[key] = entry_id
+        if previous is not None:
+            # Newer translation replaces the old one; drop the old entry from fuzzy results
+            self.entries[previous] = None
+        sig = _tm_signature(_tm_shingles(normalized))
+        rows = TM_NUM_BINS // TM_BANDS
+        for band in range(TM_BANDS):
+            band_key = (band, tuple(sig[band * rows:(band + 1) * rows]))
+            self.buckets.setdefault(band_key, []).append(entry_id)
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self.exact)
+
+    def lookup(self, sentence, language="English", context=""):
+        """Return (kind, entry, similarity) where kind is "exact", "fuzzy" or None."""
+        self._ensure_loaded()
+        start = time.perf_counter()
+        self.lookups += 1
+        try:
+            normalized = _tm_normalize(sentence)
+            entry_id = self.exact.get((normalized, language, _tm_normalize(context)))
+            if entry_id is not None:
+                self.exact_hits += 1
+                return "exact", self.entries[entry_id], 1.0
+
+            shingles = _tm_shingles(normalized)
+            sig = _tm_signature(shingles)
+            rows = TM_NUM_BINS // TM_BANDS
+            votes = {}
+            for band in range(TM_BANDS):
+                for candidate in self.buckets.get((band, tuple(sig[band * rows:(band + 1) * rows])), ()):
+                    votes[candidate] = votes.get(candidate, 0) + 1
+            best, best_score = None, 0.0
+            for candidate in sorted(votes, key=votes.get, reverse=True)[:TM_MAX_CANDIDATES]:
+                entry = self.entries[candidate]
+                if entry is None or entry.get("language", "English") != language:
+                    continue
+                score = _tm_jaccard(shingles, _tm_shingles(_tm_normalize(entry.get("source", ""))))
+                if score > best_score:
+                    best, best_score = entry, score
+            if best is not None and best_score >= TM_FUZZY_THRESHOLD:
+                self.fuzzy_hits += 1
+                return "fuzzy", best, best_score
+            return None, None, 0.0
+        finally:
+            self.lookup_seconds += time.perf_counter() - start
+
+    def add(self, source, german, translation, note="", context="", language="English"):
+        """Record a processed phrase in memory and append it to the journal."""
+        self._ensure_loaded()
+        entry = {
+            "source": source,
+            "german": german,
+            "translation": translation,
+            "note": note or "",
+            "context": context or "",
+            "language": language,
+        }
+        self._index(entry)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except Exception as e:
+            print(f"[TM] Failed to persist phrase: {e}")
+
+    def stats(self):
+        """Hit rate and average lookup latency for this session."""
+        hits = self.exact_hits + self.fuzzy_hits
+        return {
+            "lookups": self.lookups,
+            "exact_hits": self.exact_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "hit_rate": hits / self.lookups if self.lookups else 0.0,
+            "avg_lookup_ms": 1000 * self.lookup_seconds / self.lookups if self.lookups else 0.0,
+        }
+
+TRANSLATION_MEMORY = TranslationMemory()
+
+def query_phrase(sentence, context_text, translation_language="English"):
+    """Ask the AI to translate/correct a single phrase.
+
+    Returns the parsed dict (german, translation, note) or a dict with `error`.
+    """
+    prompt = (
+        "INSTRUCTIONS: Return ONLY a JSON code block with the following fields.\n"
+        "- german: corrected or original German sentence\n"
+        f"- translation: {translation_language} translation of the sentence\n"
+        "- note: (optional) a short grammar or usage note\n"
+        "- error: (optional) only include if input is invalid\n\n"
+        f"Context: {context_text if context_text else 'General'}\n"
+        f"Sentence: {sentence}\n\n"
+        "Respond ONLY with a JSON code block like:\n"
+        "```json\n"
+        "{\n"
+        "  \"german\": \"Ich gehe jeden Tag zur Arbeit.\",\n"
+        "  \"translation\": \"I go to work every day.\",\n"
+        "  \"note\": \"'zur' is a contraction of 'zu der'.\"\n"
+        "}\n"
+        "```"
+    )
+    content = query_ai_raw(prompt)
+    print(f"[DEBUG] {get_provider_display_name()} raw content:\n{content}")
+    match = re.search(r"```json\s*(\{.*?\})\s*```", content, re.DOTALL)
+    if not match:
+        return {"error": "❌ JSON block not found in AI response."}
+    try:
+        parsed = json.loads(match.group(1))
+        print(f"[DEBUG] Parsed JSON keys: {list(parsed.keys())}")
+    except json.JSONDecodeError as e:
+        return {"error": f"❌ JSON decoding error: {str(e)}"}
+    if "error" in parsed:
+        return {"error": f"⚠️ {get_provider_display_name()} error: {parsed['error']}"}
+    required_keys = ["german", "translation"]
+    if not all(str(parsed.get(k, "") or "").strip() for k in required_keys):
+        return {"error": f"❌ Incomplete AI response. Missing 'german' or 'translation'. Parsed keys: {list(parsed.keys())}"}
+    return parsed
+
+def translate_phrase(sentence, context_text="", translation_language="English", on_draft=None):
+    """Translate a phrase, consulting the translation memory before the AI.
+
+    Exact memory hits skip the AI entirely. For close matches `on_draft(entry, similarity)`
+    is called with the stored phrase so the caller can show it while the AI runs.
+    Returns (parsed, source) where parsed may contain `error`.
+    """
+    kind, entry, similarity = TRANSLATION_MEMORY.lookup(sentence, translation_language, context_text)
+    if kind == "exact":
+        return {"german": entry["german"], "translation": entry["translation"], "note": entry.get("note", "")}, "Memory"
+    if kind == "fuzzy" and on_draft:
+        on_draft(entry, similarity)
+
+    parsed = query_phrase(sentence, context_text, translation_language)
+    if "error" not in parsed:
+        TRANSLATION_MEMORY.add(
+            sentence,
+            parsed["german"].strip(),
+            parsed["translation"].strip(),
+            parsed.get("note", ""),
+            context_text,
+            translation_language,
+        )
+    return parsed, f"AI ({get_provider_display_name()})"
+
 # === ANKI ADD ===
-def add_to_anki(parsed_word, deck_name, allow_duplicates, note_type=None):
+COMMIT_CHUNK_SIZE = 25  # notes per canAddNotes/addNotes round
+
+def word_note_fields(parsed_word, note_type=None):
+    """Compute the text fields and audio texts for a word note.
+
+    Returns (fields, {audio field: text to speak}) or (None, error message).
+    """
     if note_type is None:
         note_type = NOTE_TYPE
     
@@ -519,13 +1098,13 @@ def add_to_anki(parsed_word, deck_name, allow_duplicates, note_type=None):
         any(not str(parsed_word.get(field, "")).strip() for field in required_fields)
     ):
         print(f"[DEBUG] Incomplete AI response for word. Full content:\n{json.dumps(parsed_word, indent=2, ensure_ascii=False)}")
-        return False, "Cannot create note: required fields missing or AI query failed."
+        return None, "Cannot create note: required fields missing or AI query failed."
 
     # === Fallback for full_d ===
     if not parsed_word.get("full_d"):
-        praesens = parsed_word.get("praesens", "").strip()
-        praeteritum = parsed_word.get("praeteritum", "").strip()
-        perfekt = parsed_word.get("perfekt", "").strip()
+        praesens = (parsed_word.get("praesens") or "").strip()
+        praeteritum = (parsed_word.get("praeteritum") or "").strip()
+        perfekt = (parsed_word.get("perfekt") or "").strip()
 
         if praesens or praeteritum or perfekt:
             parsed_word["full_d"] = ", ".join(filter(None, [praesens, praeteritum, perfekt]))
@@ -534,55 +1113,17 @@ def add_to_anki(parsed_word, deck_name, allow_duplicates, note_type=None):
         else:
             parsed_word["full_d"] = parsed_word.get("base_d", "")
 
-    audio_fields = []
-    artikel = parsed_word.get("artikel_d", "").strip()
-    base_d = parsed_word.get("base_d", "").strip()
+    artikel = (parsed_word.get("artikel_d") or "").strip()
+    base_d = (parsed_word.get("base_d") or "").strip()
     if artikel:
         base_for_audio = f"{artikel} {base_d}"
     else:
         base_for_audio = base_d
-    base_audio = generate_tts_audio(base_for_audio, os.urandom(8).hex())
-    s1 = parsed_word.get("s1", "").strip()
-    s2 = parsed_word.get("s2", "").strip()
-    s3 = parsed_word.get("s3", "").strip()
-    print(base_d)
-    if base_audio:
-        audio_fields.append({
-            "url": None,
-            "filename": base_audio["filename"],
-            "data": base_audio["data"],
-            "fields": ["base_a"]
-        })
-
-    if s1:
-        s1_audio = generate_tts_audio(s1, os.urandom(8).hex())
-        if s1_audio:
-            audio_fields.append({
-                "url": None,
-                "filename": s1_audio["filename"],
-                "data": s1_audio["data"],
-                "fields": ["s1a"]
-            })
-
-    if s2:
-        s2_audio = generate_tts_audio(s2, os.urandom(8).hex())
-        if s2_audio:
-            audio_fields.append({
-                "url": None,
-                "filename": s2_audio["filename"],
-                "data": s2_audio["data"],
-                "fields": ["s2a"]
-            })
-
-    if s3:
-        s3_audio = generate_tts_audio(s3, os.urandom(8).hex())
-        if s3_audio:
-            audio_fields.append({
-                "url": None,
-                "filename": s3_audio["filename"],
-                "data": s3_audio["data"],
-                "fields": ["s3a"]
-            })
+    audio_texts = {"base_a": base_for_audio}
+    for key in ("s1", "s2", "s3"):
+        text = (parsed_word.get(key) or "").strip()
+        if text:
+            audio_texts[f"{key}a"] = text
 
     fields = {
         "base_d": str(parsed_word.get("base_d", "") or ""),
@@ -610,53 +1151,546 @@ def add_to_anki(parsed_word, deck_name, allow_duplicates, note_type=None):
             "er_sie_es_past": str(parsed_word.get("er_sie_es_past", "") or ""),
             "perfect": str(parsed_word.get("perfect", "") or "")
         })
+    return fields, audio_texts
 
-    print("[ANKI addNote] fields:", json.dumps(fields, ensure_ascii=False))
-
-    payload = {
-        "action": "addNote",
-        "version": 6,
-        "params": {
-            "note": {
-                "deckName": deck_name,
-                "modelName": note_type,
-                "fields": fields,
-                "options": {"allowDuplicate": allow_duplicates},
-                "tags": ["auto-added"],
-                "audio": audio_fields
-            }
-        }
+def build_word_note(parsed_word, deck_name, allow_duplicates, note_type=None, translation_language=None):
+    """Build an AnkiConnect note (fields + audio) for a word.
+
+    Returns (note, None) on success or (None, error message).
+    """
+    if note_type is None:
+        note_type = NOTE_TYPE
+    return build_word_notes([parsed_word], deck_name, allow_duplicates, note_type, translation_language=translation_language)[0]
+
+def build_word_notes(parsed_words, deck_name, allow_duplicates, note_type=None, on_wait=None, translation_language=None):
+    """Build notes for several words, synthesizing all their clips concurrently.
+
+    Notes are tagged with `translation_language` (see language_tag) when given.
+    Returns a list aligned with `parsed_words` of (note, None) or (None, error).
+    """
+    if note_type is None:
+        note_type = NOTE_TYPE
+    computed = [word_note_fields(parsed_word, note_type) for parsed_word in parsed_words]
+    clips_by_text = synthesize_clips(
+        [text for fields, audio_texts in computed if fields is not None for text in audio_texts.values()],
+        on_wait=on_wait,
+    )
+    return [
+        (None, audio_texts) if fields is None else (_word_note(fields, audio_texts, clips_by_text, deck_name, allow_duplicates, note_type, translation_language), None)
+        for fields, audio_texts in computed
+    ]
+
+LANGUAGE_TAG_PREFIX = "danki-lang-"
+
+def language_tag(translation_language):
+    """Tag recording which translation language a word note was made with."""
+    return LANGUAGE_TAG_PREFIX + translation_language.replace(" ", "_")
+
+def _word_note(fields, audio_texts, clips_by_text, deck_name, allow_duplicates, note_type, translation_language=None):
+    audio_fields = attach_audio(fields, {field: clips_by_text.get(text) for field, text in audio_texts.items()})
+    if DEBUG_DUMPS:
+        print("[ANKI addNote] fields:", json.dumps(fields, ensure_ascii=False))
+
+    note = {
+        "deckName": deck_name,
+        "modelName": note_type,
+        "fields": fields,
+        "options": {"allowDuplicate": allow_duplicates},
+        "tags": ["auto-added"],
+        "audio": audio_fields
+    }
+    if translation_language:
+        note["tags"].append(language_tag(translation_language))
+    return note
+
+def build_phrase_note(german_text, translation_text, note_text, deck_name, allow_duplicates, on_wait=None):
+    """Build an AnkiConnect "Phrase Auto" note with phrase audio (synthesized on the TTS pool)."""
+    fields = {
+        "Phrase(German)": german_text,
+        "Translation": translation_text,
+        "note": note_text,
+        "audio_text_d": german_text,
+        "audio_d": "",  # Will be filled by audio field
+    }
+    audio_fields = attach_audio(fields, {"audio_d": synthesize_clips([german_text], on_wait=on_wait).get(german_text)})
+    return {
+        "deckName": deck_name,
+        "modelName": PHRASE_NOTE_TYPE,
+        "fields": fields,
+        "options": {"allowDuplicate": allow_duplicates},
+        "tags": ["auto-added"],
+        "audio": audio_fields
     }
 
+def attach_audio(fields, clips):
+    """Turn generated clips ({field: clip}) into AnkiConnect `audio` entries.
+
+    Clips that are already in Anki's media folder are linked with a [sound:] tag
+    instead of being uploaded again.
+    """
+    audio_fields = []
+    for field, clip in clips.items():
+        if not clip:
+            continue
+        if clip.get("existing"):
+            fields[field] = f"[sound:{clip['filename']}]"
+            continue
+        entry = {"url": None, "filename": clip["filename"], "fields": [field]}
+        if clip.get("path"):
+            entry["path"] = clip["path"]
+        else:
+            entry["data"] = clip["data"]
+        audio_fields.append(entry)
+    return audio_fields
+
+def link_known_media(note):
+    """Replace uploads of clips Anki already stored (e.g. earlier in this batch) with [sound:] links."""
+    remaining = []
+    for audio in note.get("audio", []):
+        if MEDIA_REGISTRY.has(audio["filename"]):
+            for field in audio["fields"]:
+                note["fields"][field] = f"[sound:{audio['filename']}]"
+            if audio.get("path"):
+                release_spooled_audio({"audio": [audio]})
+        else:
+            remaining.append(audio)
+    note["audio"] = remaining
+
+_can_add_detail_supported = True
+
+def can_add_notes(notes):
+    """[(can_add, reason)] for `notes`: Anki's real reason (duplicate, empty first field,
+    missing deck or note type), via canAddNotesWithErrorDetail where AnkiConnect has it."""
+    global _can_add_detail_supported
+    if _can_add_detail_supported:
+        try:
+            details = ANKI.invoke("canAddNotesWithErrorDetail", notes=notes) or []
+            return [(bool(d.get("canAdd")), d.get("error") or "Anki cannot add this note") for d in details]
+        except AnkiConnectUnavailable:
+            raise
+        except AnkiConnectError as e:
+            print(f"[ANKI] canAddNotesWithErrorDetail unavailable ({e}), using canAddNotes")
+            _can_add_detail_supported = False
+    # Older AnkiConnect only says yes/no; a duplicate is by far the most common reason
+    return [(bool(ok), "cannot create note because it is a duplicate") for ok in ANKI.invoke("canAddNotes", notes=notes) or []]
+
+def commit_notes(notes, chunk_size=COMMIT_CHUNK_SIZE, offline_queue=False):
+    """Add many notes using canAddNotes + addNotes per chunk.
+
+    Returns a list aligned with `notes` of (success, note id or error message).
+    If Anki cannot be reached, raises AnkiConnectUnavailable, or with
+    `offline_queue` stores the uncommitted notes in the outbox and reports them
+    as QUEUED_OFFLINE.
+    """
+    results = []
+    for start in range(0, len(notes), chunk_size):
+        chunk = notes[start:start + chunk_size]
+        for note in chunk:
+            link_known_media(note)
+        chunk_results = [None] * len(chunk)
+        try:
+            addable = can_add_notes(chunk)
+        except AnkiConnectUnavailable:
+            if not offline_queue:
+                raise
+            OUTBOX.enqueue(notes[start:])
+            results.extend([(False, QUEUED_OFFLINE)] * (len(notes) - start))
+            return results
+        to_add = []
+        for i, note in enumerate(chunk):
+            can_add, reason = addable[i] if i < len(addable) else (False, "No result returned by AnkiConnect")
+            if can_add:
+                to_add.append(i)
+            else:
+                chunk_results[i] = (False, reason)
+        if to_add:
+            try:
+                note_ids = ANKI.invoke("addNotes", timeout=ANKI_ADD_TIMEOUT, notes=[chunk[i] for i in to_add]) or []
+            except AnkiConnectUnavailable:
+                if not offline_queue:
+                    raise
+                # The request may or may not have reached Anki; the outbox checks
+                # for already-added copies before replaying.
+                OUTBOX.enqueue(notes[start:])
+                results.extend([(False, QUEUED_OFFLINE)] * (len(notes) - start))
+                return results
+            except AnkiConnectError as e:
+                # Newer AnkiConnect fails the whole call if any note fails; retry per note
+                # (still one request) to recover the individual errors.
+                print(f"[ANKI addNotes] batch failed, retrying per note: {e}")
+                note_ids = ANKI.multi([("addNote", {"note": chunk[i]}) for i in to_add], timeout=ANKI_ADD_TIMEOUT)
+            for i, note_id in zip(to_add, note_ids):
+                if isinstance(note_id, AnkiConnectError):
+                    chunk_results[i] = (False, str(note_id))
+                elif note_id is None:
+                    chunk_results[i] = (False, "Anki rejected the note")
+                else:
+                    chunk_results[i] = (True, note_id)
+            for i in to_add[len(note_ids):]:
+                chunk_results[i] = (False, "No result returned by AnkiConnect")
+            for i in to_add:
+                if chunk_results[i][0]:
+                    DUPLICATE_INDEX.add_note(chunk[i], chunk_results[i][1])
+                    MEDIA_REGISTRY.record_note(chunk[i])
+                    release_spooled_audio(chunk[i])
+        results.extend(chunk_results)
+    return results
+
+# === OFFLINE OUTBOX ===
+OUTBOX_PATH = Path(os.path.expanduser("~/.danki/outbox.jsonl"))
+OUTBOX_MEDIA_DIR = Path(os.path.expanduser("~/.danki/outbox_media"))
+OUTBOX_REJECTED_PATH = Path(os.path.expanduser("~/.danki/outbox_rejected.jsonl"))
+OUTBOX_REJECTED_MEDIA_DIR = Path(os.path.expanduser("~/.danki/outbox_rejected_media"))
+OUTBOX_FLUSH_INTERVAL_MS = 30000
+QUEUED_OFFLINE = "queued offline (will be added when Anki is running)"
+
+def note_idempotency_key(note):
+    """Stable key for a built note, so replaying the outbox never adds it twice."""
+    identity = {
+        "deckName": note.get("deckName"),
+        "modelName": note.get("modelName"),
+        "fields": note.get("fields"),
+    }
+    return hashlib.sha1(json.dumps(identity, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def _anki_search_value(value):
+    """Escape a field value for use inside a quoted Anki search term."""
+    value = normalize_duplicate_key(value)
+    for ch in ("\\", '"', "*", "_"):
+        value = value.replace(ch, "\\" + ch)
+    return value
+
+def _note_search_query(note):
+    """Search matching an already-added copy of `note` (deck, type and two text fields)."""
+    key_field = DUPLICATE_KEY_FIELDS.get(note["modelName"], next(iter(note["fields"])))
+    second_field = "Translation" if note["modelName"] == PHRASE_NOTE_TYPE else "s1"
+    terms = [f'deck:"{_anki_search_value(note["deckName"])}"', f'note:"{note["modelName"]}"']
+    for field in (key_field, second_field):
+        value = note["fields"].get(field, "")
+        if value:
+            terms.append(f'"{field}:{_anki_search_value(value)}"')
+    return " ".join(terms)
+
+class Outbox:
+    """Durable append-only journal of fully built notes waiting for Anki.
+
+    Records are {"op": "put", "key", "note"} and {"op": "done", "key"}; spooled
+    media is copied to OUTBOX_MEDIA_DIR so it survives restarts (spool files are
+    content-addressed and may be shared with other notes). Notes Anki rejects on
+    replay are moved to a dead-letter file, `rejected_path`, with the reason.
+    """
+
+    def __init__(self, path=OUTBOX_PATH, media_dir=OUTBOX_MEDIA_DIR,
+                 rejected_path=OUTBOX_REJECTED_PATH, rejected_media_dir=OUTBOX_REJECTED_MEDIA_DIR):
+        self.path = Path(path)
+        self.media_dir = Path(media_dir)
+        self.rejected_path = Path(rejected_path)
+        self.rejected_media_dir = Path(rejected_media_dir)
+        self.pending = None     # key -> note, in insertion order
+        self.done_records = 0
+        self.lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self.pending is not None:
+            return
+        self.pending = {}
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn final write
+                    if record.get("op") == "put":
+                        self.pending[record["key"]] = record["note"]
+                    elif record.get("op") == "done":
+                        self.pending.pop(record["key"], None)
+                        self.done_records += 1
+        except Exception as e:
+            print(f"[OUTBOX] Failed to read outbox: {e}")
+
+    def _append(self, records):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __len__(self):
+        with self.lock:
+            self._ensure_loaded()
+            return len(self.pending)
+
+    def enqueue(self, notes):
+        """Persist notes (and their spooled media) until Anki is reachable."""
+        with self.lock:
+            self._ensure_loaded()
+            records = []
+            for note in notes:
+                key = note_idempotency_key(note)
+                if key in self.pending:
+                    continue
+                for audio in note.get("audio", []):
+                    path = audio.get("path")
+                    if path and Path(path).parent != self.media_dir and os.path.exists(path):
+                        self.media_dir.mkdir(parents=True, exist_ok=True)
+                        target = self.media_dir / audio["filename"]
+                        if not target.exists():
+                            shutil.copyfile(path, target)
+                        audio["path"] = str(target)
+                self.pending[key] = note
+                records.append({"op": "put", "key": key, "note": note})
+            if records:
+                self._append(records)
+            print(f"[OUTBOX] Queued {len(records)} notes ({len(self.pending)} pending)")
+
+    def _mark_done(self, keys):
+        if not keys:
+            return
+        self._append([{"op": "done", "key": key} for key in keys])
+        released = [self.pending.pop(key) for key in keys if key in self.pending]
+        # Outbox clips are shared by notes with the same audio; keep those still referenced
+        in_use = {audio.get("path") for note in self.pending.values() for audio in note.get("audio", [])}
+        for path in {audio.get("path") for note in released for audio in note.get("audio", [])} - in_use:
+            if path and Path(path).parent == self.media_dir and os.path.exists(path):
+                try:
+                    os.unlink(path)
+                except OSError as e:
+                    print(f"[OUTBOX] Could not remove queued clip {path}: {e}")
+        self.done_records += len(keys)
+        if not self.pending or self.done_records > 500:
+            self._compact()
+
+    def _dead_letter(self, failed):
+        """Move rejected notes (with a copy of their media) to the dead-letter file."""
+        if not failed:
+            return
+        self.rejected_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.rejected_path, "a", encoding="utf-8") as f:
+            for key, msg in failed:
+                note = json.loads(json.dumps(self.pending[key]))
+                for audio in note.get("audio", []):
+                    path = audio.get("path")
+                    if path and os.path.exists(path):
+                        self.rejected_media_dir.mkdir(parents=True, exist_ok=True)
+                        target = self.rejected_media_dir / audio["filename"]
+                        if not target.exists():
+                            shutil.copyfile(path, target)
+                        audio["path"] = str(target)
+                f.write(json.dumps({"key": key, "error": msg, "time": time.time(), "note": note}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._mark_done([key for key, _ in failed])
+
+    def _compact(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for key, note in self.pending.items():
+                f.write(json.dumps({"op": "put", "key": key, "note": note}, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        self.done_records = 0
+
+    def flush(self):
+        """Send pending notes to Anki in bulk. Returns (added, already_present, failed) counts.
+
+        Notes whose exact copy is already in Anki (e.g. the app crashed right after
+        adding them) are marked done instead of being added again. Notes Anki
+        rejects are kept in the dead-letter file rather than retried forever. Raises
+        AnkiConnectUnavailable if Anki is still not reachable.
+        """
+        with self.lock:
+            self._ensure_loaded()
+            if not self.pending:
+                return 0, 0, 0
+            keys = list(self.pending)
+            notes = [self.pending[key] for key in keys]
+            existing = ANKI.multi([("findNotes", {"query": _note_search_query(note)}) for note in notes])
+            present = [key for key, found in zip(keys, existing) if found and not isinstance(found, AnkiConnectError)]
+            self._mark_done(present)
+            remaining = [key for key in keys if key in self.pending]
+            results = commit_notes([self.pending[key] for key in remaining])
+            added = [key for key, (success, _) in zip(remaining, results) if success]
+            failed = [(key, msg) for key, (success, msg) in zip(remaining, results) if not success]
+            for key, msg in failed:
+                print(f"[OUTBOX] Note rejected by Anki ({msg}), moved to {self.rejected_path}")
+            self._dead_letter(failed)
+            self._mark_done(added)
+            print(f"[OUTBOX] Flushed: {len(added)} added, {len(present)} already present, {len(failed)} rejected")
+            return len(added), len(present), len(failed)
+
+OUTBOX = Outbox()
+
+def flush_outbox_if_reachable():
+    """Flush the outbox if anything is queued and Anki answers. Returns counts or None."""
+    if not len(OUTBOX):
+        return None
+    try:
+        ANKI.invoke("version", timeout=2)
+        return OUTBOX.flush()
+    except AnkiConnectUnavailable:
+        return None
+    except Exception as e:
+        print(f"[OUTBOX] Flush failed: {e}")
+        return None
+
+def describe_outbox_flush(flushed):
+    """Log lines for the result of flush_outbox_if_reachable() (none if nothing happened)."""
+    if not flushed:
+        return []
+    added, _, rejected = flushed
+    lines = []
+    if added:
+        lines.append(f"📤 Added {added} queued notes from the offline outbox\n")
+    if rejected:
+        lines.append(f"⚠️ Anki rejected {rejected} queued notes; they were kept in {OUTBOX_REJECTED_PATH}\n")
+    return lines
+
+def add_to_anki(parsed_word, deck_name, allow_duplicates, note_type=None, translation_language=None):
+    """Build and add a single word note. Returns (success, message)."""
+    note, error = build_word_note(parsed_word, deck_name, allow_duplicates, note_type, translation_language)
+    if note is None:
+        return False, error
     try:
-        response = requests.post(ANKI_ENDPOINT, json=payload)
-        result = response.json()
+        result = ANKI.invoke("addNote", timeout=ANKI_ADD_TIMEOUT, note=note)
         print("[ANKI addNote] result:", json.dumps(result, ensure_ascii=False))
-        if result.get("error") is None:
-            return True, f"Added: {fields['base_d']}"
-        else:
-            return False, result["error"]
+        DUPLICATE_INDEX.add_note(note, result)
+        MEDIA_REGISTRY.record_note(note)
+        release_spooled_audio(note)
+        return True, f"Added: {note['fields']['base_d']}"
     except Exception as e:
         return False, str(e)
 
+# === AUDIO CLIPS ===
+SPOOL_DIR = Path(os.path.expanduser("~/.danki/spool"))
+SPOOL_MAX_AGE = 7 * 24 * 3600  # seconds before an orphaned spool file is removed
+
+def media_transfer_mode():
+    """"path" hands AnkiConnect a file in the spool directory; "inline" embeds base64."""
+    return config_value("media_transfer_mode", "path")
+
+_private_clips = threading.local()  # .active: this thread's clips bypass the shared spool
+
+def spools_clips():
+    """True if new clips on this thread go to the spool (path mode, not warm_audio_cache)."""
+    return media_transfer_mode() == "path" and not getattr(_private_clips, "active", False)
+
+def clip_output_path(filename):
+    """Where a backend should write a new clip: the spool in path mode, else a temp file."""
+    if spools_clips():
+        SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+        return str(SPOOL_DIR / filename)
+    suffix = os.path.splitext(filename)[1]
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        return tmp.name
+
+def clip_from_file(path, filename):
+    """Package a synthesized file as a clip dict.
+
+    Spooled files are passed by `path` (AnkiConnect reads them from disk); anything
+    else is read, base64-encoded into `data` and deleted. Returns None if empty.
+    """
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if size == 0:
+        if os.path.exists(path):
+            os.unlink(path)
+        return None
+    if Path(path).parent == SPOOL_DIR:
+        return {"filename": filename, "path": str(path), "bytes": size}
+    with open(path, "rb") as f:
+        audio_bytes = f.read()
+    os.unlink(path)
+    return {"filename": filename, "data": base64.b64encode(audio_bytes).decode("ascii"), "bytes": size}
+
+def clip_from_bytes(audio_bytes, filename):
+    """Package in-memory audio as a clip dict: spooled to disk in path mode, else base64."""
+    if not audio_bytes:
+        return None
+    if spools_clips():
+        out_path = clip_output_path(filename)
+        with open(out_path, "wb") as f:
+            f.write(audio_bytes)
+        return {"filename": filename, "path": out_path, "bytes": len(audio_bytes)}
+    return {"filename": filename, "data": base64.b64encode(audio_bytes).decode("ascii"), "bytes": len(audio_bytes)}
+
+def release_spooled_audio(note):
+    """Delete a note's spooled clips once Anki has stored them (outbox media is the Outbox's to remove)."""
+    for audio in note.get("audio", []):
+        path = audio.get("path")
+        if path and Path(path).parent == SPOOL_DIR and os.path.exists(path):
+            try:
+                os.unlink(path)
+            except OSError as e:
+                print(f"[MEDIA] Could not remove spooled clip {path}: {e}")
+
+def purge_stale_spool():
+    """Remove spooled clips left behind by interrupted sessions."""
+    if not SPOOL_DIR.exists():
+        return
+    cutoff = time.time() - SPOOL_MAX_AGE
+    for entry in SPOOL_DIR.iterdir():
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                entry.unlink()
+        except OSError:
+            pass
+
+EDGE_TTS_TIMEOUT = 30  # seconds per clip
+
+class EdgeTTSWorker:
+    """One background thread running an asyncio loop that owns all Edge TTS work.
+
+    Jobs are handed over with run_coroutine_threadsafe (the loop's thread-safe
+    queue), so callers on any thread block only on their own clip and no event
+    loop is created per clip.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self._run, name="edge-tts", daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _stream(self, text, voice):
+        chunks = []
+        communicate = edge_tts.Communicate(text, voice)
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                chunks.append(chunk["data"])
+        return b"".join(chunks)
+
+    def synthesize(self, text, voice=EDGE_TTS_VOICE, timeout=EDGE_TTS_TIMEOUT):
+        """Return the MP3 bytes for `text` (collected in memory from stream())."""
+        self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(self._stream(text, voice), self.loop)
+        try:
+            return future.result(timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+EDGE_TTS_WORKER = EdgeTTSWorker()
+
 def test_edge_tts_available():
     """Test if Edge TTS is available and working."""
     if not EDGE_TTS_AVAILABLE:
         return False
     try:
         # Quick test with minimal text
-        async def test():
-            communicate = edge_tts.Communicate("test", "de-DE-KatjaNeural")
-            async for chunk in communicate.stream():
-                if chunk["type"] == "audio":
-                    return True
-            return False
-        
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(test())
-        loop.close()
-        return result
+        return bool(EDGE_TTS_WORKER.synthesize("test", timeout=10))
     except Exception as e:
         print(f"[TTS] Edge TTS test failed: {e}")
         return False
@@ -664,7 +1698,7 @@ def test_edge_tts_available():
 def generate_edge_tts_audio(text, filename_hint):
     """Generate TTS audio using Edge TTS (requires internet).
     
-    Returns a dict with `filename` and base64 `data`, or None on failure.
+    Returns a clip dict (see clip_from_bytes), or None on failure.
     """
     global EDGE_TTS_FAILURE_COUNT, EDGE_TTS_SESSION_DISABLED
     
@@ -672,207 +1706,2755 @@ def generate_edge_tts_audio(text, filename_hint):
         return None
     
     try:
-        async def generate():
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp:
-                tmp_path = tmp.name
-            
-            # Use German neural voice
-            communicate = edge_tts.Communicate(text, "de-DE-KatjaNeural")
-            await communicate.save(tmp_path)
-            
-            with open(tmp_path, "rb") as f:
-                audio_bytes = f.read()
-            
-            os.unlink(tmp_path)
-            return audio_bytes
-        
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        audio_bytes = loop.run_until_complete(generate())
-        loop.close()
-        
-        if not audio_bytes:
-            raise Exception("Edge TTS produced empty audio")
-        
-        audio_b64 = base64.b64encode(audio_bytes).decode("ascii")
         filename = f"edge-tts-{filename_hint}.mp3"
-        print(f"[TTS] Edge TTS generated {len(audio_bytes)} bytes -> {filename}")
+        # Use German neural voice
+        clip = clip_from_bytes(EDGE_TTS_WORKER.synthesize(text, EDGE_TTS_VOICE), filename)
+        if not clip:
+            raise Exception("Edge TTS produced empty audio")
+        print(f"[TTS] Edge TTS generated {clip['bytes']} bytes -> {filename}")
         
         # Reset failure count on success
-        EDGE_TTS_FAILURE_COUNT = 0
+        with EDGE_TTS_STATE_LOCK:
+            EDGE_TTS_FAILURE_COUNT = 0
         
-        return {
-            "filename": filename,
-            "data": audio_b64
-        }
+        return clip
     except Exception as e:
         print(f"[TTS] Edge TTS failed: {e}")
-        EDGE_TTS_FAILURE_COUNT += 1
-        
-        # Disable Edge TTS for session after 3 consecutive failures
-        if EDGE_TTS_FAILURE_COUNT >= 3:
-            EDGE_TTS_SESSION_DISABLED = True
-            print("[TTS] Edge TTS disabled for this session after 3 failures")
+        with EDGE_TTS_STATE_LOCK:
+            EDGE_TTS_FAILURE_COUNT += 1
+            
+            # Disable Edge TTS for session after 3 consecutive failures
+            if EDGE_TTS_FAILURE_COUNT >= 3 and not EDGE_TTS_SESSION_DISABLED:
+                EDGE_TTS_SESSION_DISABLED = True
+                print("[TTS] Edge TTS disabled for this session after 3 failures")
         
         return None
 
-def generate_macos_say_audio(text, filename_hint):
-    """Generate TTS audio using macOS say (offline, always available on macOS).
-    
-    Returns a dict with `filename` and base64 `data`, or None on failure.
+def generate_macos_say_audio(text, filename_hint):
+    """Generate TTS audio using macOS say (offline, always available on macOS).
+    
+    Returns a clip dict (see clip_from_file), or None on failure.
+    """
+    if sys.platform != "darwin":
+        print("[TTS] macOS say TTS is only available on macOS (darwin). Skipping.")
+        return None
+
+    try:
+        filename = f"macos-say-{filename_hint}.aiff"
+        out_path = clip_output_path(filename)
+
+        # Use Anna voice for German
+        cmd = ["say", "-v", MACOS_SAY_VOICE, "-o", out_path, text]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"[TTS] macOS say failed (code {result.returncode}): {result.stderr.strip()}")
+            if os.path.exists(out_path):
+                os.unlink(out_path)
+            return None
+
+        clip = clip_from_file(out_path, filename)
+        if not clip:
+            print("[TTS] macOS say produced empty audio.")
+            return None
+        print(f"[TTS] macOS say generated {clip['bytes']} bytes -> {filename}")
+
+        return clip
+    except Exception as e:
+        print(f"[TTS] macOS say TTS request failed: {e}")
+        return None
+
+class EspeakEngine:
+    """espeak-ng loaded once in-process via ctypes (libespeak-ng), for Linux/Windows/headless use.
+
+    The library is initialised a single time and every clip is synthesized in
+    the same process (PCM collected through the synth callback, wrapped as WAV
+    in memory). libespeak-ng is not thread-safe, so clips are serialized with a
+    lock. If only the `espeak-ng` binary is installed, each clip falls back to
+    one subprocess call.
+    """
+
+    AUDIO_OUTPUT_SYNCHRONOUS = 2
+    POS_CHARACTER = 1
+    espeakCHARS_UTF8 = 1
+    CALLBACK = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(ctypes.c_short), ctypes.c_int, ctypes.c_void_p)
+
+    def __init__(self, voice=ESPEAK_VOICE):
+        self.voice = voice
+        self.lib = None
+        self.sample_rate = 0
+        self.binary = None
+        self.probed = False
+        self.lock = threading.Lock()
+        self._pcm = []
+        self._callback = self.CALLBACK(self._on_samples)  # keep a reference for the C side
+
+    def _on_samples(self, wav, numsamples, events):
+        if numsamples > 0:
+            self._pcm.append(ctypes.string_at(wav, numsamples * 2))
+        return 0
+
+    def _probe(self):
+        if self.probed:
+            return
+        self.probed = True
+        for name in (ctypes.util.find_library("espeak-ng"), "libespeak-ng.so.1", "libespeak-ng.dylib", "libespeak-ng.dll"):
+            if not name:
+                continue
+            try:
+                lib = ctypes.CDLL(name)
+            except OSError:
+                continue
+            lib.espeak_Initialize.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+            lib.espeak_SetVoiceByName.argtypes = [ctypes.c_char_p]
+            lib.espeak_SetSynthCallback.argtypes = [self.CALLBACK]
+            lib.espeak_Synth.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_uint, ctypes.c_int, ctypes.c_uint,
+                                         ctypes.c_uint, ctypes.c_void_p, ctypes.c_void_p]
+            sample_rate = lib.espeak_Initialize(self.AUDIO_OUTPUT_SYNCHRONOUS, 0, None, 0)
+            if sample_rate <= 0:
+                continue
+            lib.espeak_SetSynthCallback(self._callback)
+            lib.espeak_SetVoiceByName(self.voice.encode("ascii"))
+            self.lib, self.sample_rate = lib, sample_rate
+            print(f"[TTS] Loaded {name} ({sample_rate} Hz)")
+            return
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+
+    def available(self):
+        with self.lock:
+            self._probe()
+            return bool(self.lib or self.binary)
+
+    def synthesize(self, text):
+        """Return WAV bytes for `text`, or None."""
+        with self.lock:
+            self._probe()
+            if self.lib:
+                self._pcm = []
+                data = text.encode("utf-8") + b"\0"
+                self.lib.espeak_Synth(data, len(data), 0, self.POS_CHARACTER, 0, self.espeakCHARS_UTF8, None, None)
+                self.lib.espeak_Synchronize()
+                pcm, self._pcm = b"".join(self._pcm), []
+                if not pcm:
+                    return None
+                buffer = io.BytesIO()
+                with wave.open(buffer, "wb") as wav:
+                    wav.setnchannels(1)
+                    wav.setsampwidth(2)
+                    wav.setframerate(self.sample_rate)
+                    wav.writeframes(pcm)
+                return buffer.getvalue()
+        if self.binary:
+            result = subprocess.run([self.binary, "-v", self.voice, "--stdout", text], capture_output=True)
+            if result.returncode == 0 and result.stdout:
+                return result.stdout
+            print(f"[TTS] espeak-ng failed (code {result.returncode}): {result.stderr.decode(errors='replace').strip()}")
+        return None
+
+ESPEAK = EspeakEngine()
+
+def generate_espeak_audio(text, filename_hint):
+    """Generate TTS audio with espeak-ng (offline; Linux, Windows and headless machines).
+    
+    Returns a clip dict (see clip_from_bytes), or None on failure.
+    """
+    try:
+        filename = f"espeak-ng-{filename_hint}.wav"
+        clip = clip_from_bytes(ESPEAK.synthesize(text), filename)
+        if not clip:
+            print("[TTS] espeak-ng produced no audio.")
+            return None
+        print(f"[TTS] espeak-ng generated {clip['bytes']} bytes -> {filename}")
+        return clip
+    except Exception as e:
+        print(f"[TTS] espeak-ng request failed: {e}")
+        return None
+
+def benchmark_tts_engines(texts=None):
+    """Synthesize the same texts with each available engine and print clips/second.
+
+    Run with: python -c "import danki_app; danki_app.benchmark_tts_engines()"
+    """
+    texts = texts or [f"Das ist Beispielsatz Nummer {i} für die Sprachausgabe." for i in range(20)]
+    def edge_without_kill_switch(text, filename_hint):
+        try:
+            return clip_from_bytes(EDGE_TTS_WORKER.synthesize(text), f"edge-tts-{filename_hint}.mp3")
+        except Exception as e:
+            print(f"[TTS BENCH] Edge TTS failed: {e}")
+            return None
+
+    engines = []
+    if EDGE_TTS_AVAILABLE:
+        engines.append(("edge-tts", edge_without_kill_switch))
+    if sys.platform == "darwin":
+        engines.append(("macos-say", generate_macos_say_audio))
+    if ESPEAK.available():
+        engines.append(("espeak-ng", generate_espeak_audio))
+    results = {}
+    for name, generator in engines:
+        started = time.monotonic()
+        clips = [generator(text, media_hash("benchmark", name, text)) for text in texts]
+        elapsed = time.monotonic() - started
+        for clip in clips:
+            if clip:
+                release_spooled_audio({"audio": [clip]})
+        ok = sum(1 for clip in clips if clip)
+        total_bytes = sum(clip["bytes"] for clip in clips if clip)
+        results[name] = {"clips": ok, "seconds": elapsed, "clips_per_s": ok / elapsed if elapsed else 0.0,
+                         "kb_per_clip": total_bytes / 1024 / ok if ok else 0.0}
+        print(f"[TTS BENCH] {name}: {ok}/{len(texts)} clips in {elapsed:.2f}s "
+              f"({results[name]['clips_per_s']:.1f} clips/s, {results[name]['kb_per_clip']:.0f} KB/clip)")
+    return results
+
+def media_hash(engine, voice, text):
+    """Content address for a clip: identical (engine, voice, text) always maps to the same file."""
+    return hashlib.sha1(f"{engine}\x1f{voice}\x1f{text}".encode("utf-8")).hexdigest()[:16]
+
+MEDIA_MANIFEST_PATH = Path(os.path.expanduser("~/.danki/media_manifest.json"))
+MEDIA_PREFIXES = ("edge-tts-", "macos-say-", "espeak-ng-")
+
+class MediaRegistry:
+    """Tracks which Danki clips already exist in Anki's media folder.
+
+    Backed by a local manifest (filename -> bytes) and refreshed from
+    AnkiConnect `getMediaFilesNames` at the start of each batch. Used from the
+    pipeline, TTS and audio backfill threads, so access goes through `lock`.
+    """
+
+    def __init__(self, path=MEDIA_MANIFEST_PATH):
+        self.path = Path(path)
+        self.files = None
+        self.reused_clips = 0
+        self.saved_bytes = 0
+        self.lock = threading.RLock()
+
+    def _ensure_loaded(self):
+        if self.files is not None:
+            return
+        self.files = {}
+        try:
+            if self.path.exists():
+                with open(self.path) as f:
+                    self.files = json.load(f)
+        except Exception as e:
+            print(f"[MEDIA] Failed to read media manifest: {e}")
+
+    def save(self):
+        with self.lock:
+            if self.files is None:
+                return
+            try:
+                write_json_atomic(self.path, self.files)
+            except Exception as e:
+                print(f"[MEDIA] Failed to write media manifest: {e}")
+
+    def sync_from_anki(self):
+        """Reconcile the manifest with the files Anki actually has."""
+        try:
+            results = ANKI.multi([("getMediaFilesNames", {"pattern": f"{prefix}*"}) for prefix in MEDIA_PREFIXES])
+        except Exception as e:
+            print(f"[MEDIA] Could not list Anki media, using local manifest: {e}")
+            return
+        names = set()
+        for result in results:
+            if isinstance(result, AnkiConnectError):
+                return
+            names.update(result or [])
+        with self.lock:
+            self._ensure_loaded()
+            self.files = {name: self.files.get(name, 0) for name in names}
+            self.save()
+
+    def has(self, filename):
+        with self.lock:
+            self._ensure_loaded()
+            return filename in self.files
+
+    def record(self, filename, size):
+        with self.lock:
+            self._ensure_loaded()
+            self.files[filename] = size
+
+    def record_note(self, note):
+        """Remember the clips of a note that Anki accepted."""
+        for audio in note.get("audio", []):
+            size = os.path.getsize(audio["path"]) if audio.get("path") and os.path.exists(audio["path"]) else len(audio.get("data") or "") * 3 // 4
+            self.record(audio["filename"], size)
+
+    def reuse(self, filename):
+        with self.lock:
+            self.reused_clips += 1
+            self.saved_bytes += self.files.get(filename, 0)
+        return {"filename": filename, "existing": True}
+
+    def reset_stats(self):
+        self.reused_clips = 0
+        self.saved_bytes = 0
+
+    def report(self):
+        return f"Reused {self.reused_clips} audio clips already in Anki ({self.saved_bytes / 1024:.0f} KB not re-synthesized or uploaded)"
+
+MEDIA_REGISTRY = MediaRegistry()
+
+def tts_engine_plan():
+    """TTS engines to try, in order: (media prefix, voice, file extension, generator)."""
+    plan = []
+    if config_value("use_edge_tts", False) and EDGE_TTS_AVAILABLE and not EDGE_TTS_SESSION_DISABLED:
+        plan.append(("edge-tts", EDGE_TTS_VOICE, "mp3", generate_edge_tts_audio))
+    # Offline fallback: macOS say on macOS, espeak-ng elsewhere
+    if sys.platform == "darwin":
+        plan.append(("macos-say", MACOS_SAY_VOICE, "aiff", generate_macos_say_audio))
+    elif ESPEAK.available():
+        plan.append(("espeak-ng", ESPEAK_VOICE, "wav", generate_espeak_audio))
+    else:
+        plan.append(("macos-say", MACOS_SAY_VOICE, "aiff", generate_macos_say_audio))
+    return plan
+
+AUDIO_CACHE_DIR = Path(os.path.expanduser("~/.danki/audio_cache"))
+AUDIO_CACHE_MAX_MB = 200
+AUDIO_CACHE_ORPHAN_AGE = 24 * 3600  # seconds before a clip missing from the index is removed
+
+def _audio_cache_text(text):
+    return " ".join(text.split())
+
+class AudioCache:
+    """On-disk LRU cache of synthesized clips, keyed by (engine, voice, normalized text).
+
+    Files live in AUDIO_CACHE_DIR as <key>.<ext>; an index (index.json) keeps
+    size, last use and how long synthesis took, so hits can report time saved.
+    Total size is capped by the "audio_cache_mb" config value.
+    """
+
+    def __init__(self, directory=AUDIO_CACHE_DIR):
+        self.directory = Path(directory)
+        self.index_path = self.directory / "index.json"
+        self.entries = None     # key -> {"file", "bytes", "synth_s", "used"}
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.reset_stats()
+
+    def _ensure_loaded(self):
+        if self.entries is not None:
+            return
+        self.entries = {}
+        try:
+            if self.index_path.exists():
+                with open(self.index_path) as f:
+                    self.entries = json.load(f)
+        except Exception as e:
+            print(f"[AUDIO CACHE] Failed to read index: {e}")
+        # Drop index entries whose file is gone (e.g. cleaned by hand)
+        self.entries = {k: v for k, v in self.entries.items() if (self.directory / v["file"]).exists()}
+        # Clips stored by a process that died before saving the index would never be evicted
+        known = {entry["file"] for entry in self.entries.values()}
+        cutoff = time.time() - AUDIO_CACHE_ORPHAN_AGE
+        try:
+            for path in self.directory.iterdir():
+                if path.name not in known and path != self.index_path and path.stat().st_mtime < cutoff:
+                    path.unlink()
+        except OSError:
+            pass
+
+    def key(self, engine, voice, text):
+        return hashlib.sha1(f"{engine}\x1f{voice}\x1f{_audio_cache_text(text)}".encode("utf-8")).hexdigest()
+
+    def has(self, engine, voice, text):
+        """True if the cache holds a clip for `text` (not counted as a hit or miss)."""
+        with self.lock:
+            self._ensure_loaded()
+            return self.key(engine, voice, text) in self.entries
+
+    def get(self, engine, voice, text, filename):
+        """Return a fresh clip for `filename` from the cache, or None on a miss."""
+        with self.lock:
+            self._ensure_loaded()
+            entry = self.entries.get(self.key(engine, voice, text))
+            if entry is None:
+                self.misses += 1
+                return None
+            entry["used"] = time.time()
+            self.dirty = True
+            self.hits += 1
+            self.saved_seconds += entry.get("synth_s", 0)
+            cached_path = self.directory / entry["file"]
+        try:
+            if spools_clips():
+                out_path = clip_output_path(filename)
+                shutil.copyfile(cached_path, out_path)
+                return clip_from_file(out_path, filename)
+            with open(cached_path, "rb") as f:
+                return clip_from_bytes(f.read(), filename)
+        except OSError as e:
+            print(f"[AUDIO CACHE] Could not read cached clip: {e}")
+            return None
+
+    def put(self, engine, voice, text, clip, synth_seconds):
+        """Store a freshly synthesized clip and evict least recently used entries over the cap."""
+        key = self.key(engine, voice, text)
+        name = f"{key}{os.path.splitext(clip['filename'])[1]}"
+        target = self.directory / name
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = target.with_suffix(target.suffix + ".tmp")
+            if clip.get("path"):
+                shutil.copyfile(clip["path"], tmp_path)
+            else:
+                with open(tmp_path, "wb") as f:
+                    f.write(base64.b64decode(clip["data"]))
+            os.replace(tmp_path, target)
+        except Exception as e:
+            print(f"[AUDIO CACHE] Could not store clip: {e}")
+            return
+        with self.lock:
+            self._ensure_loaded()
+            self.entries[key] = {"file": name, "bytes": clip.get("bytes", 0), "synth_s": round(synth_seconds, 3), "used": time.time()}
+            self.dirty = True
+            self._evict()
+
+    def _evict(self):
+        limit = int(config_value("audio_cache_mb", AUDIO_CACHE_MAX_MB)) * 1024 * 1024
+        total = sum(entry["bytes"] for entry in self.entries.values())
+        if total <= limit:
+            return
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1]["used"]):
+            try:
+                (self.directory / entry["file"]).unlink()
+            except OSError:
+                pass
+            del self.entries[key]
+            total -= entry["bytes"]
+            if total <= limit:
+                break
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            try:
+                write_json_atomic(self.index_path, self.entries)
+                self.dirty = False
+            except Exception as e:
+                print(f"[AUDIO CACHE] Failed to write index: {e}")
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return f"Audio cache: {self.hits}/{lookups} hits ({rate:.0%}), ~{self.saved_seconds:.1f}s of synthesis saved"
+
+AUDIO_CACHE = AudioCache()
+
+def save_caches():
+    """Persist the media manifest, the audio cache index and the AI cache."""
+    MEDIA_REGISTRY.save()
+    AUDIO_CACHE.save()
+    save_ai_cache()
+
+AUDIO_PACK_DIRS = [Path(os.path.expanduser("~/.danki/audio_pack"))]  # bundled pack added at lookup time
+AUDIO_PACK_INDEX = "index.json"
+AUDIO_PACK_BLOB = "clips.bin"
+
+def audio_pack_key(engine, voice, text):
+    """Pack index key for a clip, by (engine, voice, normalized text) like AudioCache."""
+    return hashlib.sha1(f"{engine}\x1f{voice}\x1f{_audio_cache_text(text)}".encode("utf-8")).hexdigest()[:16]
+
+class AudioPack:
+    """Pre-generated clips for dictionary entries (built by dictionary/build_audio_pack.py).
+
+    A pack is index.json ({"clips": {clip key: [media filename, offset, length]}})
+    plus clips.bin with the concatenated audio. Keys include the engine and voice
+    (see audio_pack_key), so a pack only answers for the voice it was built with.
+    It is optional: it is looked for in ~/.danki/audio_pack (downloaded) and
+    dictionary/audio_pack (bundled) and only loaded on the first lookup.
+    """
+
+    def __init__(self):
+        self.clips = None
+        self.blob_path = None
+        self.hits = 0
+        self.lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        with self.lock:
+            if self.clips is not None:
+                return
+            self.clips = {}
+            for directory in AUDIO_PACK_DIRS + [Path(resource_path("dictionary/audio_pack"))]:
+                index_path = directory / AUDIO_PACK_INDEX
+                if not index_path.exists() or not (directory / AUDIO_PACK_BLOB).exists():
+                    continue
+                try:
+                    with open(index_path, encoding="utf-8") as f:
+                        index = json.load(f)
+                    self.clips = index.get("clips", {})
+                    self.blob_path = directory / AUDIO_PACK_BLOB
+                    print(f"[AUDIO PACK] Loaded {len(self.clips)} clips ({index.get('engine')}/{index.get('voice')}) from {directory}")
+                    return
+                except Exception as e:
+                    print(f"[AUDIO PACK] Failed to read {index_path}: {e}")
+
+    def reload(self):
+        with self.lock:
+            self.clips = None
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self.clips)
+
+    def lookup(self, engine, voice, text):
+        """Media filename of the pre-generated clip for `text` in this voice, or None."""
+        self._ensure_loaded()
+        entry = self.clips.get(audio_pack_key(engine, voice, text))
+        return entry[0] if entry else None
+
+    def get(self, engine, voice, text):
+        """Clip dict for `text` in this voice read from the pack, or None."""
+        self._ensure_loaded()
+        entry = self.clips.get(audio_pack_key(engine, voice, text))
+        if not entry:
+            return None
+        filename, offset, length = entry
+        try:
+            with open(self.blob_path, "rb") as f:
+                f.seek(offset)
+                audio_bytes = f.read(length)
+        except OSError as e:
+            print(f"[AUDIO PACK] Could not read clip: {e}")
+            return None
+        if len(audio_bytes) != length:
+            return None
+        self.hits += 1
+        return clip_from_bytes(audio_bytes, filename)
+
+AUDIO_PACK = AudioPack()
+
+def download_audio_pack(url, progress=None):
+    """Download a zipped audio pack into ~/.danki/audio_pack and activate it."""
+    target = AUDIO_PACK_DIRS[0]
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".zip", dir=target.parent) as tmp:
+        with requests.get(url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            total = int(response.headers.get("Content-Length", 0))
+            received = 0
+            for chunk in response.iter_content(1 << 20):
+                tmp.write(chunk)
+                received += len(chunk)
+                if progress:
+                    progress(received, total)
+        zip_path = tmp.name
+    try:
+        staging = target.with_name(target.name + ".new")
+        shutil.rmtree(staging, ignore_errors=True)
+        with zipfile.ZipFile(zip_path) as package:
+            for name in (AUDIO_PACK_INDEX, AUDIO_PACK_BLOB):
+                package.extract(name, staging)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(staging, target)
+    finally:
+        os.unlink(zip_path)
+    AUDIO_PACK.reload()
+    print(f"[AUDIO PACK] Installed pack from {url}")
+
+TTS_CONCURRENCY = 6  # clips synthesized at once across all notes
+_tts_pool = None
+_tts_pool_lock = threading.Lock()
+
+def tts_pool():
+    """Shared, bounded pool for TTS synthesis (created on first use)."""
+    global _tts_pool
+    with _tts_pool_lock:
+        if _tts_pool is None:
+            workers = max(1, int(config_value("tts_concurrency", TTS_CONCURRENCY)))
+            _tts_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts")
+        return _tts_pool
+
+def set_tts_concurrency(workers):
+    """Resize the shared TTS pool (headless --tts-workers)."""
+    global _tts_pool
+    with _tts_pool_lock:
+        if _tts_pool is not None:
+            _tts_pool.shutdown(wait=False)
+        _tts_pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="tts")
+
+def synthesize_clips(texts, on_wait=None):
+    """Synthesize many texts concurrently on the shared TTS pool.
+
+    Identical texts are synthesized once. `on_wait` is called periodically while
+    waiting (the GUI passes QApplication.processEvents). Returns {text: clip or None}.
+    """
+    unique = [text for text in dict.fromkeys(texts) if text]
+    futures = {text: tts_pool().submit(generate_tts_audio, text) for text in unique}
+    pending = set(futures.values())
+    while pending:
+        _, pending = wait_futures(pending, timeout=0.05)
+        if on_wait:
+            on_wait()
+    clips = {}
+    for text, future in futures.items():
+        try:
+            clips[text] = future.result()
+        except Exception as e:
+            print(f"[TTS] Synthesis failed for '{text}': {e}")
+            clips[text] = None
+    return clips
+
+AUDIO_QUALITY_BITRATES = {"low": 24, "medium": 32, "high": 64}  # kbit/s, mono
+UNCOMPRESSED_AUDIO = ("aiff", "wav")
+
+_tool_paths = {}
+
+def _find_tool(name):
+    if name not in _tool_paths:
+        _tool_paths[name] = shutil.which(name)
+    return _tool_paths[name]
+
+def audio_encoder():
+    """(tool, file extension, quality) for the compression stage, or None when off or unavailable.
+
+    macOS uses afconvert (AAC in .m4a); elsewhere ffmpeg (MP3), which can also be
+    pointed to with the "ffmpeg_path" config value.
+    """
+    quality = config_value("audio_quality", "medium")
+    if quality not in AUDIO_QUALITY_BITRATES:
+        return None
+    if sys.platform == "darwin" and _find_tool("afconvert"):
+        return ("afconvert", "m4a", quality)
+    ffmpeg = config_value("ffmpeg_path") or _find_tool("ffmpeg")
+    if ffmpeg:
+        return (ffmpeg, "mp3", quality)
+    return None
+
+def encode_clip(clip, filename, encoder):
+    """Re-encode an uncompressed clip as mono, low-bitrate speech audio.
+
+    Runs on the TTS worker threads. Returns the encoded clip, or the original
+    one if the encoder fails.
+    """
+    tool, _, quality = encoder
+    bitrate = AUDIO_QUALITY_BITRATES[quality]
+    source = clip.get("path")
+    temp_source = None
+    try:
+        if not source:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(clip["filename"])[1]) as tmp:
+                tmp.write(base64.b64decode(clip["data"]))
+                temp_source = source = tmp.name
+        out_path = clip_output_path(filename)
+        if tool == "afconvert":
+            cmd = [tool, "-f", "m4af", "-d", "aac", "-c", "1", "-b", str(bitrate * 1000), source, out_path]
+        else:
+            cmd = [tool, "-y", "-loglevel", "error", "-i", source, "-ac", "1", "-codec:a", "libmp3lame",
+                   "-b:a", f"{bitrate}k", out_path]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"[TTS] Audio encoding failed (code {result.returncode}): {result.stderr.strip()}")
+            if os.path.exists(out_path):
+                os.unlink(out_path)
+            return clip
+        encoded = clip_from_file(out_path, filename)
+        if not encoded:
+            return clip
+        if not temp_source:
+            release_spooled_audio({"audio": [clip]})
+        print(f"[TTS] Encoded {clip['bytes']} -> {encoded['bytes']} bytes ({filename})")
+        return encoded
+    except Exception as e:
+        print(f"[TTS] Audio encoding failed: {e}")
+        return clip
+    finally:
+        if temp_source and os.path.exists(temp_source):
+            os.unlink(temp_source)
+
+def clip_name(prefix, voice, ext, text):
+    """(hash, media filename, cache voice tag, encoder) for a clip of `text` from one engine.
+
+    Clips that go through the compression stage get the encoder's extension and
+    the quality in their content address.
+    """
+    encoder = audio_encoder() if ext in UNCOMPRESSED_AUDIO else None
+    voice_tag = f"{voice}@{encoder[2]}" if encoder else voice
+    clip_hash = media_hash(prefix, voice_tag, text)
+    return clip_hash, f"{prefix}-{clip_hash}.{encoder[1] if encoder else ext}", voice_tag, encoder
+
+def expected_clip_filename(text):
+    """Filename the preferred engine would give `text` (used to detect voice/text changes).
+
+    Audio pack clips are named the same way, so this also covers them.
+    """
+    prefix, voice, ext, _ = tts_engine_plan()[0]
+    return clip_name(prefix, voice, ext, text)[1]
+
+def generate_tts_audio(text, filename_hint=None):
+    """Generate TTS audio using Edge TTS (if enabled) with macOS say fallback.
+
+    Clip names are content-addressed by (engine, voice, text); if Anki already has
+    the clip, synthesis and upload are skipped and `{"filename", "existing": True}`
+    is returned. Texts in the offline audio pack (built for the same engine and
+    voice) and clips synthesized in earlier sessions (AUDIO_CACHE) need no TTS at all.
+    Otherwise returns a clip dict (see clip_from_file), or None.
+    """
+    plan = tts_engine_plan()
+    for i, (prefix, voice, ext, generator) in enumerate(plan):
+        clip_hash, filename, voice_tag, encoder = clip_name(prefix, voice, ext, text)
+        if MEDIA_REGISTRY.has(filename):
+            return MEDIA_REGISTRY.reuse(filename)
+        clip = AUDIO_PACK.get(prefix, voice_tag, text) or AUDIO_CACHE.get(prefix, voice_tag, text, filename)
+        if clip:
+            return clip
+        started = time.monotonic()
+        clip = generator(text, clip_hash)
+        if clip and encoder:
+            clip = encode_clip(clip, filename, encoder)
+        if clip:
+            AUDIO_CACHE.put(prefix, voice_tag, text, clip, time.monotonic() - started)
+            return clip
+        if i + 1 < len(plan):
+            print(f"[TTS] {prefix} failed, falling back to {plan[i + 1][0]}")
+    return None
+
+def warm_audio_cache(text):
+    """Make sure a clip for `text` exists without producing one for a note (typing prefetch).
+
+    Nothing is synthesized if Anki, the audio pack or AUDIO_CACHE already has it in
+    the preferred voice. Otherwise the clip is generated into private temp files
+    (never the shared spool, whose content-addressed names a batch may be using)
+    and kept by AUDIO_CACHE. Returns True if a clip is available.
+    """
+    prefix, voice, ext, _ = tts_engine_plan()[0]
+    _, filename, voice_tag, _ = clip_name(prefix, voice, ext, text)
+    if MEDIA_REGISTRY.has(filename) or AUDIO_PACK.lookup(prefix, voice_tag, text) or AUDIO_CACHE.has(prefix, voice_tag, text):
+        return True
+    _private_clips.active = True
+    try:
+        return generate_tts_audio(text) is not None
+    finally:
+        _private_clips.active = False
+
+# === FETCH DECKS FROM ANKI ===
+def get_anki_decks():
+    """All deck names, or [] if Anki is not reachable (callers show any warning)."""
+    try:
+        return ANKI.invoke("deckNames", timeout=5) or []
+    except Exception as e:
+        print(f"[ANKI] Could not list decks: {e}")
+        return []
+
+def find_note_count(query):
+    try:
+        return len(ANKI.invoke("findNotes", query=query) or [])
+    except Exception:
+        return 0
+
+def last_known_decks():
+    """Deck classification remembered from the last successful discovery ({} if none)."""
+    cached = WARM_SNAPSHOT.get("decks")
+    if cached and cached.get("endpoint") == ANKI.endpoint:
+        return cached["classified"]
+    return {}
+
+def fetch_classified_decks():
+    """Classified decks from Anki, or the last known ones. Returns (classified, reachable); no GUI."""
+    try:
+        classified = classify_decks()
+        WARM_SNAPSHOT.put("decks", {"endpoint": ANKI.endpoint, "classified": classified})
+        return classified, True
+    except Exception as e:
+        print(f"[ANKI] Deck discovery failed: {e}")
+        return last_known_decks(), False
+
+def _get_classified_decks(key):
+    """(decks, reachable) for one tab; the GUI warns when Anki was not reachable."""
+    classified, reachable = fetch_classified_decks()
+    return classified.get(key, []), reachable
+
+def get_wordmaster_decks():
+    return _get_classified_decks("wordmaster")
+
+def get_phrasemaster_decks():
+    return _get_classified_decks("phrasemaster")
+
+# === Check for duplicates ===
+DUPLICATE_KEY_FIELDS = {
+    NOTE_TYPE: "base_d",
+    NOTE_TYPE_ADVANCED: "base_d",
+    PHRASE_NOTE_TYPE: "Phrase(German)",
+}
+DUPLICATE_RESYNC_INTERVAL = 60  # seconds between note-count checks
+DUPLICATE_INDEX_MAX_AGE = 7 * 24 * 3600  # a restored index older than this is rebuilt from scratch
+NOTES_INFO_CHUNK = 1000
+
+def normalize_duplicate_key(value):
+    """Normalize a field value for duplicate comparison (HTML and spacing ignored)."""
+    value = re.sub(r"<[^>]+>", " ", str(value or ""))
+    value = html.unescape(value).replace("\xa0", " ")
+    return re.sub(r"\s+", " ", value).strip()
+
+def _duplicate_group(model_name):
+    return "phrase" if model_name == PHRASE_NOTE_TYPE else "word"
+
+class DuplicateIndex:
+    """In-process set of existing Danki note keys, synced from Anki in bulk.
+
+    Word notes are keyed by base_d (both German note types share one group) and
+    phrase notes by their German phrase. Every Danki note id is tracked, including
+    notes with an empty key, so the note id check matches Anki's.
+
+    Limitation: known notes are not re-read on every check, so a key field edited
+    in Anki during a session is only picked up at the next start. A restored
+    index re-reads the notes edited since it was saved, and is rebuilt from
+    scratch once its last full read is older than DUPLICATE_INDEX_MAX_AGE.
+    """
+
+    def __init__(self):
+        self.note_keys = {}     # note id -> (group, key); key is "" for notes with an empty field
+        self.counts = {}        # (group, key) -> number of notes
+        self.synced = False
+        self.sync_error = None  # last sync failure, shown to the user while the index is stale
+        self.last_check = 0.0
+        self.built_at = 0.0     # wall time of the last full read of every note
+        self.checked_day = 0    # day (since the epoch) the index was last checked against Anki
+        self.restored = False   # restored from the snapshot and not yet revalidated
+        self.lock = threading.Lock()
+
+    def _query(self):
+        return " OR ".join(f'note:"{model}"' for model in DUPLICATE_KEY_FIELDS)
+
+    def _add_key(self, note_id, group, key):
+        if note_id is not None:
+            if note_id in self.note_keys:
+                return
+            self.note_keys[note_id] = (group, key)
+        if key:
+            self.counts[(group, key)] = self.counts.get((group, key), 0) + 1
+
+    def _remove_id(self, note_id):
+        old = self.note_keys.pop(note_id, None)
+        if old and old[1]:
+            self.counts[old] -= 1
+            if self.counts[old] <= 0:
+                del self.counts[old]
+
+    def _read_keys(self, note_ids):
+        """(Re)key `note_ids` from one batched notesInfo."""
+        calls = [
+            ("notesInfo", {"notes": note_ids[i:i + NOTES_INFO_CHUNK]})
+            for i in range(0, len(note_ids), NOTES_INFO_CHUNK)
+        ]
+        infos = []
+        for result in ANKI.multi(calls):
+            if isinstance(result, AnkiConnectError):
+                raise result
+            infos.extend(result or [])
+        with self.lock:
+            for info in infos:
+                field = DUPLICATE_KEY_FIELDS.get(info.get("modelName"))
+                if not field:
+                    continue
+                value = info.get("fields", {}).get(field, {}).get("value", "")
+                self._remove_id(info.get("noteId"))
+                self._add_key(info.get("noteId"), _duplicate_group(info.get("modelName")), normalize_duplicate_key(value))
+
+    def sync(self, full=False):
+        """Pull keys for all Danki notes: one findNotes plus one batched notesInfo for new ids
+        (for every id with `full`)."""
+        note_ids = ANKI.invoke("findNotes", query=self._query()) or []
+        with self.lock:
+            if full:
+                self.note_keys, self.counts = {}, {}
+            current = set(note_ids)
+            for note_id in [n for n in self.note_keys if n not in current]:
+                self._remove_id(note_id)
+            new_ids = [n for n in note_ids if n not in self.note_keys]
+        if new_ids:
+            self._read_keys(new_ids)
+        if full or not self.synced:
+            self.built_at = time.time()
+        self.checked_day = int(time.time() // 86400)
+        self.synced = True
+        self.last_check = time.monotonic()
+        print(f"[DUP] Duplicate index synced: {len(self.note_keys)} notes ({len(new_ids)} fetched)")
+
+    def _revalidate_restored(self):
+        """First check after restore(): re-read notes edited since the save, or rebuild if too old."""
+        if time.time() - self.built_at > DUPLICATE_INDEX_MAX_AGE:
+            print("[DUP] Saved duplicate index is too old, rebuilding")
+            self.sync(full=True)
+            return
+        # edited:N counts today as day 1; the notes checked on checked_day are re-read too
+        days = max(1, int(time.time() // 86400) - self.checked_day + 1)
+        try:
+            edited = ANKI.invoke("findNotes", query=f"({self._query()}) edited:{days}") or []
+        except AnkiConnectUnavailable:
+            raise
+        except AnkiConnectError as e:
+            print(f"[DUP] Cannot search edited notes ({e}), rebuilding")
+            self.sync(full=True)
+            return
+        with self.lock:
+            edited = [n for n in edited if n in self.note_keys]
+        if edited:
+            self._read_keys(edited)
+        self.sync()
+        print(f"[DUP] Re-read {len(edited)} notes edited since the index was saved")
+
+    def snapshot(self):
+        """{"note_keys", "built_at", "checked_day"} for the warm-start snapshot, or None before the first sync."""
+        with self.lock:
+            if not self.synced or self.restored:
+                return None  # a restored index is saved again only once it has been revalidated
+            return {"note_keys": dict(self.note_keys), "built_at": self.built_at, "checked_day": self.checked_day}
+
+    def restore(self, saved):
+        """Start from a saved index; the next maybe_resync() revalidates it (see _revalidate_restored)."""
+        with self.lock:
+            self.note_keys, self.counts = {}, {}
+            for note_id, (group, key) in saved["note_keys"].items():
+                self._add_key(note_id, group, key)
+            self.built_at = saved.get("built_at", 0.0)
+            self.checked_day = saved.get("checked_day", 0)
+            self.restored = True
+            self.synced = True
+            self.last_check = 0.0
+
+    def update_note(self, note_id, model_name, value):
+        """Re-key a note whose duplicate field was edited in place."""
+        with self.lock:
+            self._remove_id(note_id)
+            self._add_key(note_id, _duplicate_group(model_name), normalize_duplicate_key(value))
+
+    def maybe_resync(self, force=False):
+        """Resync when Anki's Danki note ids have changed (checked at most once per interval).
+
+        Returns False if the index could not be brought up to date; the reason is kept
+        in sync_error. Callers should tell the user, since contains() then only knows
+        about the notes seen so far (Anki still rejects duplicates when notes are added).
+        """
+        if not force and self.synced and self.sync_error is None and time.monotonic() - self.last_check < DUPLICATE_RESYNC_INTERVAL:
+            return True
+        try:
+            if self.restored:
+                self._revalidate_restored()
+                self.restored = False
+            elif force or not self.synced:
+                self.sync()
+            else:
+                # Compare the ids, not just their number: one deleted plus one added keeps the count
+                note_ids = ANKI.invoke("findNotes", query=self._query()) or []
+                self.last_check = time.monotonic()
+                self.checked_day = int(time.time() // 86400)
+                with self.lock:
+                    changed = set(note_ids) != set(self.note_keys)
+                if changed:
+                    self.sync()
+            self.sync_error = None
+            return True
+        except Exception as e:
+            print(f"[DUP] Duplicate index sync failed: {e}")
+            self.sync_error = str(e)
+            return False
+
+    def contains(self, value, note_type=NOTE_TYPE):
+        key = normalize_duplicate_key(value)
+        with self.lock:
+            return self.counts.get((_duplicate_group(note_type), key), 0) > 0
+
+    def add_note(self, note, note_id=None):
+        """Record a note that was just added to Anki."""
+        field = DUPLICATE_KEY_FIELDS.get(note.get("modelName"))
+        if not field:
+            return
+        with self.lock:
+            self._add_key(note_id, _duplicate_group(note["modelName"]), normalize_duplicate_key(note["fields"].get(field, "")))
+
+DUPLICATE_INDEX = DuplicateIndex()
+
+# === WARM-START SNAPSHOT ===
+SNAPSHOT_PATH = Path(os.path.expanduser("~/.danki/snapshot.bin"))
+DICTIONARY_CACHE_PATH = Path(os.path.expanduser("~/.danki/dictionary_cache.bin"))
+SNAPSHOT_VERSION = 2
+SNAPSHOT_PICKLE_PROTOCOL = 4  # fixed, so a Python upgrade can still read the files
+
+def read_pickle_file(path, header):
+    """The payload of a file written by write_pickle_file with an equal `header`, else None."""
+    try:
+        with open(path, "rb") as f:
+            if pickle.load(f) != header:
+                return None
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[SNAPSHOT] Ignoring unreadable {Path(path).name}: {e}")
+        return None
+
+def write_pickle_file(path, header, payload):
+    """Pickle `header` then `payload` via a temp file and os.replace (the header is checked before the payload is read)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump(header, f, protocol=SNAPSHOT_PICKLE_PROTOCOL)
+        pickle.dump(payload, f, protocol=SNAPSHOT_PICKLE_PROTOCOL)
+    os.replace(tmp_path, path)
+
+class WarmSnapshot:
+    """Derived startup state saved between launches, so it is restored instead of rebuilt.
+
+    Sections (each carries what it must be revalidated against):
+      decks       {"endpoint", "classified"}  — shown at once, rediscovered in the background
+      duplicates  {"endpoint", "index"}       — revalidated by note ids and edited:N (DuplicateIndex)
+    The parsed dictionary is cached separately (load_offline_dictionary). Stored with
+    pickle at a fixed protocol behind a format-version header; a mismatch discards it.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = Path(path)
+        self.sections = None
+        self.dirty = set()
+        self.lock = threading.Lock()
+
+    def _header(self):
+        return {"version": SNAPSHOT_VERSION}
+
+    def _ensure_loaded(self):
+        if self.sections is not None:
+            return
+        self.sections = read_pickle_file(self.path, self._header()) or {}
+
+    def get(self, name):
+        with self.lock:
+            self._ensure_loaded()
+            return self.sections.get(name)
+
+    def put(self, name, value):
+        with self.lock:
+            self._ensure_loaded()
+            if self.sections.get(name) != value:
+                self.sections[name] = value
+                self.dirty.add(name)
+
+    def save(self):
+        """Write the snapshot if anything changed since it was loaded (atomic replace)."""
+        index = DUPLICATE_INDEX.snapshot()
+        if index is not None:
+            self.put("duplicates", {"endpoint": ANKI.endpoint, "index": index})
+        with self.lock:
+            if not self.dirty:
+                return
+            try:
+                write_pickle_file(self.path, self._header(), self.sections)
+                print(f"[SNAPSHOT] Saved ({', '.join(sorted(self.dirty))} changed)")
+                self.dirty.clear()
+            except Exception as e:
+                print(f"[SNAPSHOT] Failed to save snapshot: {e}")
+
+WARM_SNAPSHOT = WarmSnapshot()
+
+def restore_warm_snapshot():
+    """Restore the duplicate index saved by the last run (the dictionary and decks restore on load)."""
+    cached = WARM_SNAPSHOT.get("duplicates")
+    if cached and cached.get("endpoint") == ANKI.endpoint and "index" in cached:
+        DUPLICATE_INDEX.restore(cached["index"])
+        print(f"[SNAPSHOT] Restored duplicate index: {len(cached['index']['note_keys'])} notes")
+
+def is_duplicate(base_d_value, note_type=NOTE_TYPE):
+    return DUPLICATE_INDEX.contains(base_d_value, note_type)
+
+def find_duplicates(values, note_type=NOTE_TYPE):
+    """Return the subset of values that already exist in Anki."""
+    return {value for value in values if value and is_duplicate(value, note_type)}
+
+# === BULK NOTE REFRESH ===
+REFRESH_STATE_PATH = Path(os.path.expanduser("~/.danki/refresh_state.json"))
+REFRESH_CHUNK_SIZE = 100
+REFRESH_WORKERS = 4
+WORD_AUDIO_SOURCES = {"base_a": None, "s1a": "s1", "s2a": "s2", "s3a": "s3"}
+
+def _refresh_signature(query, translation_language, regenerate_audio=False):
+    """Settings a finished refresh depends on; a changed signature restarts the job."""
+    prefix, voice, ext, _ = tts_engine_plan()[0]
+    encoder = audio_encoder() if ext in UNCOMPRESSED_AUDIO else None
+    if encoder:
+        voice, ext = f"{voice}@{encoder[2]}", encoder[1]
+    return {"query": query, "language": translation_language, "tts": f"{prefix}/{voice}/{ext}",
+            "dictionary": len(GERMAN_DICT) if GERMAN_DICT else 0, "audio_pack": len(AUDIO_PACK),
+            "regenerate_audio": regenerate_audio}
+
+def note_translation_language(info):
+    """The translation language a word note was made with, or None if it cannot be told.
+
+    Notes carry a language_tag(); for older ones it is the language whose cached
+    AI result the note's translation still matches.
+    """
+    for tag in info.get("tags", []):
+        if tag.startswith(LANGUAGE_TAG_PREFIX):
+            return tag[len(LANGUAGE_TAG_PREFIX):].replace("_", " ")
+    fields = info.get("fields", {})
+    word = _strip_html(fields.get("base_d", {}).get("value", "")).strip()
+    translation = _strip_html(fields.get("base_e", {}).get("value", "")).strip()
+    if not word or not translation:
+        return None
+    for language in TRANSLATION_LANGUAGES:
+        cached = get_cached_ai_result(word, language)
+        if cached and _strip_html(cached.get("base_e", "")).strip() == translation:
+            return language
+    return None
+
+def refreshed_word_fields(info, translation_language):
+    """Recompute a word note's fields from the offline dictionary or the AI cache.
+
+    Returns (fields, audio texts); fields is None when no newer source exists or
+    the note was made for another translation language, in which case only the
+    audio is checked against the current text.
+    """
+    values = {name: field.get("value", "") for name, field in info.get("fields", {}).items()}
+    word = _strip_html(values.get("base_d", "")).strip()
+    parsed = None
+    if note_translation_language(info) not in (None, translation_language):
+        word = ""  # keep the fields; a gloss in another language would overwrite them
+    if word and translation_language == "English" and GERMAN_DICT and not config_value("always_use_api", False):
+        entry = lookup_word_in_dictionary(word)
+        if entry:
+            parsed = convert_dict_to_anki_format(entry, word)
+    if parsed is None and word:
+        parsed = get_cached_ai_result(word, translation_language)
+    if parsed:
+        fields, audio_texts = word_note_fields(parsed, info.get("modelName"))
+        if fields is not None:
+            return fields, audio_texts
+    audio_texts = {}
+    word = _strip_html(values.get("base_d", "")).strip()
+    for audio_field, text_field in WORD_AUDIO_SOURCES.items():
+        if text_field is None:
+            text = " ".join(filter(None, [_strip_html(values.get("artikel_d", "")).strip(), word]))
+        else:
+            text = _strip_html(values.get(text_field, "")).strip()
+        if text:
+            audio_texts[audio_field] = text
+    return None, audio_texts
+
+def plan_note_refresh(info, translation_language, clip_cache=None, regenerate_audio=False):
+    """Diff one note against freshly computed content.
+
+    Returns an updateNoteFields payload ({"id", "fields", "audio"?}) or None if
+    nothing changed. Only non-empty new values are written, so fields the source
+    lacks (the dictionary has no plurals, few examples) or that were filled by hand
+    or by the AI keep their content. Audio is added where a field has no clip; with
+    `regenerate_audio`, also where the linked clip is not the one for the current
+    text and voice (this includes every clip named before content-addressed
+    filenames, so it re-synthesizes most older notes). A field keeps its link if
+    synthesis fails. `clip_cache` shares clips generated earlier in the same run.
+    """
+    current = {name: field.get("value", "") for name, field in info.get("fields", {}).items()}
+    if info.get("modelName") == PHRASE_NOTE_TYPE:
+        fields = None
+        text = _strip_html(current.get("Phrase(German)", "")).strip()
+        audio_texts = {"audio_d": text} if text else {}
+    else:
+        fields, audio_texts = refreshed_word_fields(info, translation_language)
+    changed = {}
+    for name, value in (fields or {}).items():
+        if value and name in current and name not in WORD_AUDIO_SOURCES and current[name] != value:
+            changed[name] = value
+    clips = {}
+    for field, text in audio_texts.items():
+        filename = expected_clip_filename(text)
+        if field not in current or current[field] == f"[sound:{filename}]":
+            continue
+        if not regenerate_audio and "[sound:" in current[field]:
+            continue
+        clip = clip_cache.get(filename) if clip_cache is not None else None
+        if clip is None:
+            clip = generate_tts_audio(text)
+            if not clip:
+                continue
+            if clip_cache is not None:
+                clip_cache[filename] = clip
+        clips[field] = clip
+        # AnkiConnect appends uploaded audio to the field, so clear the old link first
+        changed[field] = ""
+    audio = attach_audio(changed, clips)
+    if not changed and not audio:
+        return None
+    update = {"id": info["noteId"], "fields": changed}
+    if audio:
+        update["audio"] = audio
+    return update
+
+def refresh_existing_notes(query=None, translation_language=None, workers=REFRESH_WORKERS,
+                           chunk_size=REFRESH_CHUNK_SIZE, progress=None, stop_event=None,
+                           regenerate_audio=False):
+    """Bring existing Danki notes up to date with the dictionary, AI cache and TTS voice.
+
+    Notes are fetched with notesInfo in chunks processed by a bounded thread
+    pool; each chunk sends one multi of updateNoteFields for changed notes only.
+    Finished note ids are journaled so an interrupted run resumes where it
+    stopped. `progress(done, total)` is called from worker threads.
+
+    Returns stats {"total", "checked", "updated", "unchanged", "failed", "cancelled"}.
+    """
+    if query is None:
+        query = " OR ".join(f'note:"{model}"' for model in DUPLICATE_KEY_FIELDS)
+    if translation_language is None:
+        translation_language = load_config().get("translation_language", "English")
+    signature = _refresh_signature(query, translation_language, regenerate_audio)
+    done_ids = set()
+    try:
+        if REFRESH_STATE_PATH.exists():
+            with open(REFRESH_STATE_PATH) as f:
+                state = json.load(f)
+            if state.get("signature") == signature:
+                done_ids = set(state.get("done", []))
+                print(f"[REFRESH] Resuming: {len(done_ids)} notes already refreshed")
+    except Exception as e:
+        print(f"[REFRESH] Ignoring unreadable refresh state: {e}")
+
+    MEDIA_REGISTRY.sync_from_anki()
+    note_ids = ANKI.invoke("findNotes", query=query) or []
+    pending = [n for n in note_ids if n not in done_ids]
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    stats = {"total": len(note_ids), "checked": len(note_ids) - len(pending), "updated": 0,
+             "unchanged": 0, "failed": 0, "cancelled": False}
+    lock = threading.Lock()
+    clip_cache = {}
+
+    def save_state():
+        REFRESH_STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = REFRESH_STATE_PATH.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"signature": signature, "done": sorted(done_ids)}, f)
+        os.replace(tmp_path, REFRESH_STATE_PATH)
+
+    def refresh_chunk(chunk):
+        if stop_event is not None and stop_event.is_set():
+            return
+        infos = ANKI.invoke("notesInfo", notes=chunk) or []
+        updates = []
+        for info in infos:
+            if not info.get("noteId"):
+                continue
+            update = plan_note_refresh(info, translation_language, clip_cache, regenerate_audio)
+            if update:
+                updates.append((info, update))
+        results = ANKI.multi([("updateNoteFields", {"note": update}) for _, update in updates]) if updates else []
+        finished = set(chunk)
+        updated = failed = 0
+        for (info, update), result in zip(updates, results):
+            if isinstance(result, AnkiConnectError):
+                print(f"[REFRESH] Failed to update note {info['noteId']}: {result}")
+                finished.discard(info["noteId"])
+                failed += 1
+                continue
+            updated += 1
+            MEDIA_REGISTRY.record_note(update)
+            key_field = DUPLICATE_KEY_FIELDS.get(info.get("modelName"))
+            if key_field in update["fields"]:
+                DUPLICATE_INDEX.update_note(info["noteId"], info["modelName"], update["fields"][key_field])
+        with lock:
+            done_ids.update(finished)
+            stats["checked"] += len(chunk)
+            stats["updated"] += updated
+            stats["failed"] += failed
+            stats["unchanged"] += len(chunk) - updated - failed
+            save_state()
+            if progress:
+                progress(stats["checked"], stats["total"])
+
+    print(f"[REFRESH] Checking {len(pending)} of {len(note_ids)} notes with {workers} workers")
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(refresh_chunk, chunk) for chunk in chunks]
+        for future in futures:
+            try:
+                future.result()
+            except AnkiConnectError as e:
+                print(f"[REFRESH] Chunk failed, will retry on next run: {e}")
+                if stop_event is not None:
+                    stop_event.set()
+    for clip in clip_cache.values():
+        if clip.get("path"):
+            release_spooled_audio({"audio": [clip]})
+    MEDIA_REGISTRY.save()
+    AUDIO_CACHE.save()
+
+    stats["cancelled"] = stats["checked"] < stats["total"]
+    if not stats["cancelled"] and not stats["failed"]:
+        try:
+            REFRESH_STATE_PATH.unlink()
+        except FileNotFoundError:
+            pass
+    print(f"[REFRESH] Done: {stats}")
+    return stats
+
+# === DEFERRED AUDIO BACKFILL ===
+AUDIO_BACKFILL_PATH = Path(os.path.expanduser("~/.danki/audio_backfill.jsonl"))
+AUDIO_BACKFILL_BATCH = 8           # notes whose clips are synthesized and attached together
+AUDIO_BACKFILL_RETRY_SECONDS = 30  # wait before retrying when Anki is unreachable
+
+def build_word_note_deferred(parsed_word, deck_name, allow_duplicates, note_type=None, translation_language=None):
+    """Build a word note without audio. Returns (note, audio texts) or (None, error message)."""
+    if note_type is None:
+        note_type = NOTE_TYPE
+    fields, audio_texts = word_note_fields(parsed_word, note_type)
+    if fields is None:
+        return None, audio_texts
+    return _word_note(fields, {}, {}, deck_name, allow_duplicates, note_type, translation_language), audio_texts
+
+class AudioBackfill:
+    """Persistent queue of audio still owed to notes that were added text-first.
+
+    Records in AUDIO_BACKFILL_PATH are {"op": "put", "key": note id, "audio": {field: text}}
+    and {"op": "done", "key"}. A background thread synthesizes the clips, stores
+    them with storeMediaFile and links them with updateNoteFields, so cards are
+    reviewable immediately and gain audio progressively (also after a restart).
+    Fields whose synthesis failed stay queued and are retried the next time the
+    worker is started.
+    """
+
+    def __init__(self, path=AUDIO_BACKFILL_PATH):
+        self.path = Path(path)
+        self.pending = None     # note id (str) -> {field: text}
+        self.deferred = set()   # keys whose synthesis failed during the current run
+        self.done_records = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        self.completed = 0
+
+    def _ensure_loaded(self):
+        if self.pending is not None:
+            return
+        self.pending = {}
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn final write
+                    if record.get("op") == "put":
+                        self.pending[record["key"]] = record["audio"]
+                    elif record.get("op") == "done":
+                        self.pending.pop(record["key"], None)
+                        self.done_records += 1
+        except Exception as e:
+            print(f"[BACKFILL] Failed to read audio queue: {e}")
+
+    def _append(self, records):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _compact(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for key, audio in self.pending.items():
+                f.write(json.dumps({"op": "put", "key": key, "audio": audio}, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        self.done_records = 0
+
+    def __len__(self):
+        with self.lock:
+            self._ensure_loaded()
+            return len(self.pending)
+
+    def enqueue(self, items):
+        """Queue [(note id, {field: text})] and make sure the worker is running."""
+        with self.lock:
+            self._ensure_loaded()
+            records = []
+            for note_id, audio_texts in items:
+                if audio_texts and str(note_id) not in self.pending:
+                    self.pending[str(note_id)] = audio_texts
+                    records.append({"op": "put", "key": str(note_id), "audio": audio_texts})
+            if records:
+                self._append(records)
+        self.start()
+
+    def _mark_done(self, keys):
+        with self.lock:
+            self._append([{"op": "done", "key": key} for key in keys])
+            for key in keys:
+                self.pending.pop(key, None)
+            self.done_records += len(keys)
+            self.completed += len(keys)
+            if self.done_records > 500 and self.done_records > 2 * len(self.pending):
+                self._compact()
+
+    def _defer(self, items):
+        """Keep {key: {field: text}} still owed after a failed synthesis for the next run."""
+        if not items:
+            return
+        with self.lock:
+            self._append([{"op": "put", "key": key, "audio": audio_texts} for key, audio_texts in items.items()])
+            self.pending.update(items)
+            self.deferred.update(items)
+
+    def start(self):
+        """Start the background worker if there is queued audio and it is not running."""
+        with self.lock:
+            self._ensure_loaded()
+            if not self.pending or (self.thread is not None and self.thread.is_alive()):
+                return
+            self.deferred.clear()
+            self.thread = threading.Thread(target=self._run, name="audio-backfill", daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.lock:
+                batch = [(key, audio_texts) for key, audio_texts in self.pending.items()
+                         if key not in self.deferred][:AUDIO_BACKFILL_BATCH]
+            if not batch:
+                return
+            try:
+                self._attach(batch)
+            except AnkiConnectUnavailable:
+                print(f"[BACKFILL] Anki unreachable, retrying in {AUDIO_BACKFILL_RETRY_SECONDS}s")
+                time.sleep(AUDIO_BACKFILL_RETRY_SECONDS)
+            except Exception as e:
+                print(f"[BACKFILL] Audio backfill failed: {e}")
+                time.sleep(AUDIO_BACKFILL_RETRY_SECONDS)
+
+    def _attach(self, batch):
+        clips_by_text = synthesize_clips([text for _, audio_texts in batch for text in audio_texts.values()])
+        calls, owners, stored, missing = [], [], {}, {}
+        for key, audio_texts in batch:
+            fields = {}
+            for field, text in audio_texts.items():
+                clip = clips_by_text.get(text)
+                if not clip:
+                    missing.setdefault(key, {})[field] = text
+                    continue
+                if not clip.get("existing") and clip["filename"] not in stored:
+                    params = {"filename": clip["filename"]}
+                    params.update({"path": clip["path"]} if clip.get("path") else {"data": clip["data"]})
+                    calls.append(("storeMediaFile", params))
+                    owners.append(clip["filename"])
+                    stored[clip["filename"]] = clip
+                fields[field] = f"[sound:{clip['filename']}]"
+            if fields:
+                calls.append(("updateNoteFields", {"note": {"id": int(key), "fields": fields}}))
+                owners.append(key)
+        try:
+            results = ANKI.multi(calls) if calls else []
+            # Register stored clips before their spool files go: a batch sharing the
+            # content-addressed spool must find each clip in one place or the other
+            for owner, result in zip(owners, results):
+                if owner in stored and not isinstance(result, AnkiConnectError):
+                    MEDIA_REGISTRY.record(owner, stored[owner].get("bytes", 0))
+        finally:
+            for clip in stored.values():
+                if clip.get("path"):
+                    release_spooled_audio({"audio": [clip]})
+        done = []
+        for owner, result in zip(owners, results):
+            if owner in stored:
+                continue
+            if isinstance(result, AnkiConnectError):
+                # Typically the note was deleted in Anki meanwhile; nothing left to attach to
+                print(f"[BACKFILL] Dropping audio for note {owner}: {result}")
+                missing.pop(owner, None)
+            if owner not in missing:
+                done.append(owner)
+        self._mark_done(done)
+        self._defer(missing)
+        remaining = len(self)
+        if not remaining:
+            MEDIA_REGISTRY.save()
+            AUDIO_CACHE.save()
+        print(f"[BACKFILL] Attached audio to {len(done)} notes ({len(missing)} failed synthesis, {remaining} waiting)")
+
+AUDIO_BACKFILL = AudioBackfill()
+
+# === APKG EXPORT ===
+NOTE_MODELS_PATH = Path(os.path.expanduser("~/.danki/note_models.json"))
+APKG_SCHEMA = """
+CREATE TABLE col (id integer primary key, crt integer not null, mod integer not null, scm integer not null,
+    ver integer not null, dty integer not null, usn integer not null, ls integer not null, conf text not null,
+    models text not null, decks text not null, dconf text not null, tags text not null);
+CREATE TABLE notes (id integer primary key, guid text not null, mid integer not null, mod integer not null,
+    usn integer not null, tags text not null, flds text not null, sfld integer not null, csum integer not null,
+    flags integer not null, data text not null);
+CREATE TABLE cards (id integer primary key, nid integer not null, did integer not null, ord integer not null,
+    mod integer not null, usn integer not null, type integer not null, queue integer not null, due integer not null,
+    ivl integer not null, factor integer not null, reps integer not null, lapses integer not null, left integer not null,
+    odue integer not null, odid integer not null, flags integer not null, data text not null);
+CREATE TABLE revlog (id integer primary key, cid integer not null, usn integer not null, ivl integer not null,
+    lastIvl integer not null, ease integer not null, taken integer not null, type integer not null);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+CREATE INDEX ix_notes_usn on notes (usn);
+CREATE INDEX ix_cards_usn on cards (usn);
+CREATE INDEX ix_revlog_usn on revlog (usn);
+CREATE INDEX ix_cards_nid on cards (nid);
+CREATE INDEX ix_cards_sched on cards (did, queue, due);
+CREATE INDEX ix_revlog_cid on revlog (cid);
+CREATE INDEX ix_notes_csum on notes (csum);
+"""
+APKG_DECK_CONFIG = {
+    "id": 1, "name": "Default", "mod": 0, "usn": 0, "maxTaken": 60, "autoplay": True, "timer": 0,
+    "replayq": True, "dyn": False,
+    "new": {"bury": True, "delays": [1, 10], "initialFactor": 2500, "ints": [1, 4, 7], "order": 1, "perDay": 20, "separate": True},
+    "lapse": {"delays": [10], "leechAction": 0, "leechFails": 8, "minInt": 1, "mult": 0},
+    "rev": {"bury": True, "ease4": 1.3, "fuzz": 0.05, "ivlFct": 1, "maxIvl": 36500, "minSpace": 1, "perDay": 100},
+}
+
+def fetch_note_models():
+    """Read the Danki note types (ids, fields, templates, CSS) from Anki.
+
+    The result is cached in ~/.danki/note_models.json so exports also work
+    while Anki is closed. These are the note types imported from the
+    template deck, so an exported .apkg merges into them instead of creating copies.
+    """
+    names = list(DUPLICATE_KEY_FIELDS)
+    try:
+        calls = [("modelNamesAndIds", {})]
+        for name in names:
+            calls += [
+                ("modelFieldNames", {"modelName": name}),
+                ("modelTemplates", {"modelName": name}),
+                ("modelStyling", {"modelName": name}),
+            ]
+        results = ANKI.multi(calls)
+        ids = results[0] if not isinstance(results[0], AnkiConnectError) else {}
+        models = {}
+        for i, name in enumerate(names):
+            field_names, templates, styling = results[1 + 3 * i:4 + 3 * i]
+            if name not in ids or any(isinstance(r, AnkiConnectError) for r in (field_names, templates, styling)):
+                continue
+            models[name] = {
+                "id": ids[name],
+                "fields": field_names,
+                "templates": [{"name": t, "qfmt": v.get("Front", ""), "afmt": v.get("Back", "")} for t, v in templates.items()],
+                "css": styling.get("css", ""),
+            }
+        if models:
+            NOTE_MODELS_PATH.parent.mkdir(parents=True, exist_ok=True)
+            with open(NOTE_MODELS_PATH, "w", encoding="utf-8") as f:
+                json.dump(models, f, ensure_ascii=False)
+            return models
+    except AnkiConnectUnavailable:
+        pass
+    if NOTE_MODELS_PATH.exists():
+        with open(NOTE_MODELS_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    raise AnkiConnectError("Note types unknown: open Anki once (with the Danki template deck imported) before exporting.")
+
+def _strip_html(value):
+    return html.unescape(re.sub(r"<[^>]+>", "", value or ""))
+
+def _apkg_guid():
+    chars = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!#$%&()*+,-./:;<=>?@[]^_`{|}~"
+    return "".join(chars[b % len(chars)] for b in os.urandom(10))
+
+def _template_fields(qfmt):
+    refs = set()
+    for ref in re.findall(r"\{\{([^}]+)\}\}", qfmt):
+        ref = ref.strip().lstrip("#^/").strip()
+        refs.add(ref.split(":")[-1].strip())
+    return refs
+
+def _legacy_model(model, deck_id, mod):
+    fields = [
+        {"name": name, "ord": i, "sticky": False, "rtl": False, "font": "Arial", "size": 20, "media": []}
+        for i, name in enumerate(model["fields"])
+    ]
+    templates = [
+        {"name": t["name"], "ord": i, "qfmt": t["qfmt"], "afmt": t["afmt"], "did": None, "bqfmt": "", "bafmt": ""}
+        for i, t in enumerate(model["templates"])
+    ]
+    return {
+        "id": model["id"], "name": model["name"], "type": 0, "mod": mod, "usn": -1, "sortf": 0, "did": deck_id,
+        "tmpls": templates, "flds": fields, "css": model["css"], "tags": [], "vers": [],
+        "latexPre": "\\documentclass[12pt]{article}\n\\special{papersize=3in,5in}\n\\usepackage[utf8]{inputenc}\n"
+                    "\\usepackage{amssymb,amsmath}\n\\pagestyle{empty}\n\\setlength{\\parindent}{0in}\n\\begin{document}\n",
+        "latexPost": "\\end{document}",
+        "req": [[i, "any", [j for j, f in enumerate(model["fields"]) if f in _template_fields(t["qfmt"])]]
+                for i, t in enumerate(model["templates"])],
+    }
+
+def write_apkg(path, notes, models=None):
+    """Write AnkiConnect-style notes (fields + audio) straight into an .apkg file.
+
+    All rows go in with bulk inserts in one transaction and the package is
+    written in a single pass. Returns the number of notes written.
     """
-    if sys.platform != "darwin":
-        print("[TTS] macOS say TTS is only available on macOS (darwin). Skipping.")
-        return None
+    models = models or fetch_note_models()
+    now = int(time.time())
+    now_ms = int(time.time() * 1000)
+    deck_ids = {}
+    for note in notes:
+        deck_ids.setdefault(note["deckName"], now_ms + len(deck_ids) + 1)
+    decks = {
+        "1": {"id": 1, "name": "Default", "conf": 1, "desc": "", "dyn": 0, "collapsed": False, "extendNew": 10,
+              "extendRev": 50, "mod": now, "usn": -1, "newToday": [0, 0], "revToday": [0, 0], "lrnToday": [0, 0],
+              "timeToday": [0, 0]},
+    }
+    for name, deck_id in deck_ids.items():
+        decks[str(deck_id)] = dict(decks["1"], id=deck_id, name=name)
+
+    legacy_models = {}
+    for name, model in models.items():
+        legacy_models[str(model["id"])] = _legacy_model(dict(model, name=name), next(iter(deck_ids.values()), 1), now)
+
+    media_files = {}     # filename -> (path or None, base64 data or None)
+    note_rows, card_rows = [], []
+    note_id = now_ms * 1000
+    card_id = note_id
+    for position, note in enumerate(notes):
+        model = models.get(note["modelName"])
+        if model is None:
+            raise AnkiConnectError(f"Unknown note type: {note['modelName']}")
+        values = dict(note["fields"])
+        for audio in note.get("audio", []):
+            for field in audio["fields"]:
+                values[field] = f"[sound:{audio['filename']}]"
+            media_files[audio["filename"]] = (audio.get("path"), audio.get("data"))
+        field_values = [str(values.get(name, "") or "") for name in model["fields"]]
+        first = _strip_html(field_values[0]) if field_values else ""
+        note_id += 1
+        note_rows.append((
+            note_id, _apkg_guid(), model["id"], now, -1, " " + " ".join(note.get("tags", [])) + " ",
+            "\x1f".join(field_values), first, int(hashlib.sha1(first.encode("utf-8")).hexdigest()[:8], 16), 0, "",
+        ))
+        filled = {name for name, value in zip(model["fields"], field_values) if value.strip()}
+        for ord_, template in enumerate(model["templates"]):
+            if ord_ > 0 and not (_template_fields(template["qfmt"]) & filled):
+                continue
+            card_id += 1
+            card_rows.append((card_id, note_id, deck_ids[note["deckName"]], ord_, now, -1,
+                              0, 0, position + 1, 0, 0, 0, 0, 0, 0, 0, 0, ""))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "collection.anki2")
+        db = sqlite3.connect(db_path)
+        try:
+            db.executescript(APKG_SCHEMA)
+            db.execute(
+                "INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, '{}')",
+                (now, now_ms, now_ms, json.dumps({"nextPos": len(notes) + 1, "curModel": None}),
+                 json.dumps(legacy_models), json.dumps(decks), json.dumps({"1": APKG_DECK_CONFIG})),
+            )
+            db.executemany("INSERT INTO notes VALUES (?,?,?,?,?,?,?,?,?,?,?)", note_rows)
+            db.executemany("INSERT INTO cards VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", card_rows)
+            db.commit()
+        finally:
+            db.close()
+
+        media_index = {}
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as package:
+            package.write(db_path, "collection.anki2")
+            for i, (filename, (media_path, data)) in enumerate(media_files.items()):
+                if media_path and os.path.exists(media_path):
+                    package.write(media_path, str(i), compress_type=zipfile.ZIP_STORED)
+                elif data:
+                    package.writestr(str(i), base64.b64decode(data), compress_type=zipfile.ZIP_STORED)
+                else:
+                    continue
+                media_index[str(i)] = filename
+            package.writestr("media", json.dumps(media_index))
+
+    for note in notes:
+        release_spooled_audio(note)
+    print(f"[APKG] Wrote {len(note_rows)} notes, {len(card_rows)} cards, {len(media_index)} media files -> {path}")
+    return len(note_rows)
+
+# === BULK IMPORT ===
+IMPORT_HEADER_WORDS = {"word", "words", "german", "front", "term", "expression"}  # CSV header cells, not vocabulary
+ANKI_EXPORT_SEPARATORS = {"tab": "\t", "comma": ",", "semicolon": ";", "pipe": "|", "space": " ", "colon": ":"}
+KINDLE_WORDS_QUERY = """
+    SELECT COALESCE(NULLIF(w.stem, ''), w.word),
+           (SELECT l.usage FROM LOOKUPS l WHERE l.word_key = w.id ORDER BY l.timestamp DESC LIMIT 1)
+    FROM WORDS w WHERE w.lang LIKE ? ORDER BY w.timestamp
+"""
 
+def import_kind(path):
+    """'kindle', 'anki-package', 'csv' or 'text' for a vocabulary file."""
+    suffix = Path(path).suffix.lower()
+    if suffix in (".apkg", ".colpkg"):
+        return "anki-package"
+    if suffix in (".csv", ".tsv"):
+        return "csv"
+    with open(path, "rb") as f:
+        if f.read(16) == b"SQLite format 3\x00":
+            return "kindle"
+    return "text"
+
+def _import_field(value):
+    return normalize_duplicate_key(re.sub(r"\[sound:[^\]]*\]", "", value or ""))
+
+def _import_encoding(path):
+    """"utf-8-sig" if the whole file is valid UTF-8, else cp1252 (Excel/Notepad exports on Windows)."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as f:
+        try:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                decoder.decode(chunk)
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            print(f"[IMPORT] {path.name} is not UTF-8, reading it as cp1252")
+            return "cp1252"
+    return "utf-8-sig"
+
+def _open_import(path):
+    # errors="replace": the few bytes cp1252 leaves undefined must not stop an import
+    return open(path, encoding=_import_encoding(path), errors="replace", newline="")
+
+def _iter_text_import(path):
+    """Plain word lists, or Anki "Notes in Plain Text" exports (first note field)."""
+    with _open_import(path) as f:
+        first = f.readline()
+        if not first.startswith("#") and "\t" not in first:
+            yield from ((word, None) for word in iter_words(_prepend(first, f)))
+            return
+        # Anki export: "#key:value" header lines name the separator and the non-field columns
+        separator, meta_columns = "\t", set()
+        while first.startswith("#"):
+            key, _, value = first[1:].strip().partition(":")
+            if key == "separator":
+                separator = ANKI_EXPORT_SEPARATORS.get(value.strip().lower(), value.strip() or "\t")
+            elif key.endswith(" column") and value.strip().isdigit():
+                meta_columns.add(int(value) - 1)
+            first = f.readline()
+        field = next(i for i in range(len(meta_columns) + 1) if i not in meta_columns)
+        for row in csv.reader(_prepend(first, f), delimiter=separator):
+            if len(row) > field:
+                yield row[field], None
+
+def _iter_csv_import(path):
+    """First column of a CSV/TSV file (a header row like "word,..." is skipped)."""
+    with _open_import(path) as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel_tab if path.suffix.lower() == ".tsv" else csv.excel
+        for line_number, row in enumerate(csv.reader(f, dialect)):
+            if not row or (line_number == 0 and row[0].strip().lower() in IMPORT_HEADER_WORDS):
+                continue
+            yield row[0], None
+
+def _iter_anki_package(path):
+    """First field of every note in an .apkg/.colpkg (the legacy collection formats)."""
+    with zipfile.ZipFile(path) as package, tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(package.extract(_anki_package_collection(package), tmp))
+        try:
+            for (fields,) in conn.execute("SELECT flds FROM notes ORDER BY id"):
+                yield fields.split("\x1f")[0], None
+        finally:
+            conn.close()
+
+def _anki_package_collection(package):
+    names = set(package.namelist())
+    if "collection.anki21b" in names and "collection.anki21" not in names:
+        raise ValueError("This package uses the new Anki format. Export it again with "
+                         "'Support older Anki versions' ticked, or as Notes in Plain Text.")
+    for name in ("collection.anki21", "collection.anki2"):
+        if name in names:
+            return name
+    raise ValueError("Not an Anki package: no collection inside")
+
+def _open_kindle_vocab(path):
+    conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+    tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if not {"WORDS", "LOOKUPS"} <= tables:
+        conn.close()
+        raise ValueError("Not a Kindle vocabulary database (vocab.db)")
+    return conn
+
+def _iter_kindle_vocab(path, language):
+    """Looked-up words (their stem where Kindle knows it) with the latest sentence they appeared in."""
+    conn = _open_kindle_vocab(path)
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".aiff") as tmp:
-            tmp_path = tmp.name
+        for word, usage in conn.execute(KINDLE_WORDS_QUERY, (f"{language}%",)):
+            yield word, (usage or "").strip() or None
+    finally:
+        conn.close()
+
+def _prepend(line, lines):
+    yield line
+    yield from lines
+
+class WordImport:
+    """Words streamed from a vocabulary file for a WordPipeline, without the input box.
+
+    Sources: plain text (comma or newline separated), CSV/TSV (first column), Anki
+    exports (Notes in Plain Text, .apkg/.colpkg) and Kindle vocab.db, whose lookup
+    sentence is kept in `contexts`. Iterating reads the file lazily (the pipeline
+    pulls words as its queues drain) and skips words already in Anki according to
+    DUPLICATE_INDEX, as well as repeats within the file.
+    """
 
-        # Use Anna voice for German
-        cmd = ["say", "-v", "Anna", "-o", tmp_path, text]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"[TTS] macOS say failed (code {result.returncode}): {result.stderr.strip()}")
-            os.unlink(tmp_path)
-            return None
+    def __init__(self, path, note_type=NOTE_TYPE, allow_duplicates=False, language="de"):
+        self.path = Path(path)
+        self.kind = import_kind(self.path)
+        self.note_type = note_type
+        self.allow_duplicates = allow_duplicates
+        self.language = language
+        self.read = 0
+        self.in_anki = 0
+        self.repeated = 0
+        self.index_error = None
+        self.contexts = {}
+        # Fail on the wrong kind of file now rather than halfway through a batch
+        if self.kind == "kindle":
+            _open_kindle_vocab(self.path).close()
+        elif self.kind == "anki-package":
+            with zipfile.ZipFile(self.path) as package:
+                _anki_package_collection(package)
+
+    def _entries(self):
+        if self.kind == "kindle":
+            return _iter_kindle_vocab(self.path, self.language)
+        if self.kind == "anki-package":
+            return _iter_anki_package(self.path)
+        if self.kind == "csv":
+            return _iter_csv_import(self.path)
+        return _iter_text_import(self.path)
+
+    def __iter__(self):
+        if not self.allow_duplicates and not DUPLICATE_INDEX.maybe_resync():
+            self.index_error = DUPLICATE_INDEX.sync_error
+        seen = set()
+        for value, context in self._entries():
+            word = _import_field(value)
+            if not word:
+                continue
+            self.read += 1
+            if word in seen:
+                self.repeated += 1
+                continue
+            seen.add(word)
+            if not self.allow_duplicates and DUPLICATE_INDEX.contains(word, self.note_type):
+                self.in_anki += 1
+                continue
+            if context:
+                self.contexts[word] = context
+            yield word
+
+    def describe(self):
+        skipped = [f"{self.in_anki} already in Anki"] if not self.allow_duplicates else []
+        skipped.append(f"{self.repeated} repeated")
+        text = f"{self.read} words read from {self.path.name} ({', '.join(skipped)})"
+        if self.index_error:
+            text += f" — could not check Anki for duplicates ({self.index_error})"
+        return text
+
+# === WORD PIPELINE ===
+PIPELINE_QUEUE_SIZE = 50    # words buffered between stages
+PIPELINE_AI_WORKERS = 4     # words looked up / sent to the AI provider at once
+PIPELINE_CHUNK_WAIT = 0.5   # seconds the build stage waits to fill a chunk before flushing a partial one
+VALID_WORD_PATTERN = re.compile(r"^[a-zA-ZäöüÄÖÜß\s\-]+$")
+_STAGE_DONE = object()
+BATCH_JOURNAL_DIR = Path(os.path.expanduser("~/.danki/batches"))
+BATCH_JOURNAL_KEEP = 20     # finished batch journals kept for reference
+BATCH_DONE_STATUSES = ("added", "queued", "duplicates")   # failed words are retried on resume
+
+AI_RETRIES = 4           # attempts per word
+AI_RETRY_BACKOFF = 1.0   # seconds before the first retry, doubled for each further one
+AI_IN_FLIGHT_WAIT = 150  # seconds to wait for another thread's lookup of the same word (outlasts its retries)
+
+def resolve_word(word, translation_language="English", always_use_api=False):
+    """Get card data for a word: offline dictionary, then AI cache, then the AI provider.
+
+    Returns (data, source, None) or (None, None, error message).
+    """
+    wait_for_dictionary()
+    # Try offline dictionary first (only for German->English, if not disabled)
+    if not always_use_api and translation_language == "English" and GERMAN_DICT:
+        dict_entry = lookup_word_in_dictionary(word)
+        if dict_entry:
+            print(f"[DEBUG] Found '{word}' in dictionary!")
+            return convert_dict_to_anki_format(dict_entry, word), "Dictionary", None
+        print(f"[DEBUG] '{word}' not found in dictionary")
+
+    # Fall back to the AI provider if not found in dictionary (earlier answers work offline too)
+    cached = get_cached_ai_result(word, translation_language)
+    if cached:
+        return cached, "AI cache", None
+    if not API_KEY:
+        return None, None, "Not in dictionary and no API key configured (offline mode)"
+    # One lookup per word at a time (e.g. a batch and the typing prefetch asking for the same word)
+    key = _ai_cache_key(word, translation_language)
+    with _ai_cache_lock:
+        other = _ai_in_flight.get(key)
+        if other is None:
+            _ai_in_flight[key] = threading.Event()
+    if other is not None:
+        if not other.wait(AI_IN_FLIGHT_WAIT):
+            print(f"[AI] Lookup of '{word}' by another thread is taking too long; querying again")
+        cached = get_cached_ai_result(word, translation_language)
+        if cached:
+            return cached, "AI cache", None
+    data = {}
+    try:
+        for attempt in range(AI_RETRIES):
+            if attempt:
+                time.sleep(AI_RETRY_BACKOFF * 2 ** (attempt - 1))
+            data = query_gemini(word, translation_language)
+            if "error" not in data:
+                if DEBUG_DUMPS:
+                    print(f"[DEBUG] {get_provider_display_name()} raw data for '{word}':\n{json.dumps(data, indent=2, ensure_ascii=False)}")
+                store_ai_result(word, translation_language, data)
+                return data, f"AI ({get_provider_display_name()})", None
+    finally:
+        if other is None:
+            with _ai_cache_lock:
+                _ai_in_flight.pop(key).set()
+    error_text = data.get("error", "Unknown error")
+    print(f"[AI ERROR] Word '{word}': {error_text}")
+    return None, None, f"{get_provider_display_name()} failed for: {word}\nDetails: {error_text}"
+
+class BatchJournal:
+    """Per-batch progress journal (one JSONL file in BATCH_JOURNAL_DIR).
+
+    Records are {"op": "start", "words", "settings"}, {"op": "resolved", "i", "data",
+    "source"} once a word's card data is known, {"op": "commit", "i": [...]} just
+    before notes are sent to Anki, {"op": "result", "i": [...], "status", "detail"},
+    and {"op": "cancel"} / {"op": "finish"}. A journal without "finish" belongs to
+    an interrupted batch, which can be resumed without repeating AI calls or adds.
+    """
 
-        with open(tmp_path, "rb") as f:
-            audio_bytes = f.read()
+    def __init__(self, path):
+        self.path = Path(path)
+        self.words = []
+        self.settings = {}
+        self.resolved = {}      # index -> (data, source)
+        self.results = {}       # index -> status
+        self.in_flight = set()  # indices sent to Anki without a recorded result
+        self.cancelled = False
+        self.finished = False
+        self.lock = threading.Lock()
+
+    @classmethod
+    def create(cls, words, settings):
+        BATCH_JOURNAL_DIR.mkdir(parents=True, exist_ok=True)
+        prune_batch_journals()
+        journal = cls(BATCH_JOURNAL_DIR / f"batch-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl")
+        journal.words = list(words)
+        journal.settings = dict(settings)
+        journal._append([{"op": "start", "words": journal.words, "settings": journal.settings}], sync=True)
+        return journal
+
+    @classmethod
+    def load(cls, path):
+        journal = cls(path)
+        with open(journal.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn final write
+                op = record.get("op")
+                if op == "start":
+                    journal.words = record["words"]
+                    journal.settings = record.get("settings", {})
+                elif op == "resolved":
+                    journal.resolved[record["i"]] = (record["data"], record["source"])
+                elif op == "commit":
+                    journal.in_flight.update(record["i"])
+                elif op == "result":
+                    for i in record["i"]:
+                        journal.results[i] = record["status"]
+                        journal.in_flight.discard(i)
+                elif op == "cancel":
+                    journal.cancelled = True
+                elif op == "finish":
+                    journal.finished = True
+        return journal
+
+    def _append(self, records, sync=False):
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                if sync:
+                    os.fsync(f.fileno())
+
+    def done(self):
+        """Indices that need no further work (added, queued offline or duplicate)."""
+        return {i for i, status in self.results.items() if status in BATCH_DONE_STATUSES}
+
+    def record_resolved(self, index, data, source):
+        # Not fsynced: losing it to a power cut only costs one repeated lookup
+        self.resolved[index] = (data, source)
+        self._append([{"op": "resolved", "i": index, "data": data, "source": source}])
+
+    def record_commit(self, indices):
+        self.in_flight.update(indices)
+        self._append([{"op": "commit", "i": list(indices)}], sync=True)
+
+    def record_results(self, indices, status, detail=None):
+        for i in indices:
+            self.results[i] = status
+            self.in_flight.discard(i)
+        self._append([{"op": "result", "i": list(indices), "status": status, "detail": detail}], sync=True)
+
+    def close(self, cancelled=False):
+        self._append([{"op": "cancel" if cancelled else "finish"}], sync=True)
+        self.cancelled, self.finished = cancelled, not cancelled
+
+    def discard(self):
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def describe(self):
+        return f"{len(self.done())} of {len(self.words)} words done (deck '{self.settings.get('deck', '?')}')"
+
+def unfinished_batches():
+    """Journals of batches that were cancelled or interrupted, newest first."""
+    journals = []
+    for path in sorted(BATCH_JOURNAL_DIR.glob("batch-*.jsonl"), reverse=True):
+        try:
+            journal = BatchJournal.load(path)
+        except Exception as e:
+            print(f"[BATCH] Skipping unreadable journal {path.name}: {e}")
+            continue
+        if not journal.finished and journal.words:
+            journals.append(journal)
+    return journals
+
+def prune_batch_journals(keep=BATCH_JOURNAL_KEEP):
+    paths = sorted(BATCH_JOURNAL_DIR.glob("batch-*.jsonl"), reverse=True)
+    for path in paths[keep:]:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+class WordPipeline:
+    """WordMaster batch as a staged pipeline running off the GUI thread.
+
+    resolve (dictionary / AI, PIPELINE_AI_WORKERS threads) → build (duplicate
+    check, notes and concurrent TTS per chunk) → commit (AnkiConnect, outbox or
+    .apkg). Stages are connected by bounded queues, so they overlap across words
+    and throughput approaches the slowest stage rather than the sum of all.
+
+    Qt-independent: progress goes to the `on_message(text)` and `on_progress(count)`
+    callbacks (called from worker threads), per-word outcomes to `on_result(record)`;
+    run() returns the summary dict. `words` may be any iterable (e.g. a stream
+    read from stdin), which is consumed as the resolve stage keeps up.
+    With a BatchJournal every word's progress is recorded, and a pipeline built
+    from an interrupted journal (from_journal) picks up where it stopped.
+    """
 
-        os.unlink(tmp_path)
+    def __init__(self, words, deck_name, note_type=None, translation_language="English",
+                 allow_duplicates=False, always_use_api=False, defer_audio=False, export_path=None,
+                 on_message=None, on_progress=None, stop_event=None, journal=None,
+                 on_result=None, ai_workers=PIPELINE_AI_WORKERS):
+        self.words = words
+        self.deck_name = deck_name
+        self.note_type = note_type or NOTE_TYPE
+        self.translation_language = translation_language
+        self.allow_duplicates = allow_duplicates
+        self.always_use_api = always_use_api
+        self.defer_audio = defer_audio and not export_path
+        self.export_path = export_path
+        self.on_message = on_message or (lambda text: print(text))
+        self.on_progress = on_progress or (lambda count: None)
+        self.on_result = on_result or (lambda record: None)
+        self.stop_event = stop_event or threading.Event()
+        self.ai_workers = max(1, ai_workers)
+        total = len(words) if hasattr(words, "__len__") else 0
+        self.summary = {"total": total, "added": 0, "queued": 0, "failed": 0, "duplicates": 0, "exported": 0}
+        self.exported_notes = []
+        self.lock = threading.Lock()
+        self.pause_event = threading.Event()
+        self.pause_event.set()
+        # Export batches only exist in memory until the .apkg is written, so they are not journaled
+        self.journal = journal if not export_path else None
+        self.flush_outbox = False  # send queued outbox notes first (the GUI; off the GUI thread)
+
+    def settings(self):
+        return {"deck": self.deck_name, "note_type": self.note_type, "language": self.translation_language,
+                "allow_duplicates": self.allow_duplicates, "always_use_api": self.always_use_api,
+                "defer_audio": self.defer_audio}
+
+    @classmethod
+    def from_journal(cls, journal, **callbacks):
+        """Pipeline that resumes the interrupted batch recorded in `journal`."""
+        s = journal.settings
+        return cls(journal.words, s.get("deck"), s.get("note_type"), s.get("language", "English"),
+                   allow_duplicates=s.get("allow_duplicates", False), always_use_api=s.get("always_use_api", False),
+                   defer_audio=s.get("defer_audio", False), journal=journal, **callbacks)
+
+    def _count(self, key, items, detail=None):
+        """Record the outcome `key` (a summary counter) for [(index, word)]."""
+        with self.lock:
+            self.summary[key] += len(items)
+        if self.journal:
+            self.journal.record_results([index for index, _ in items], key, detail)
+        for index, word in items:
+            self.on_result({"index": index, "word": word, "status": key, "detail": detail})
+        self.on_progress(len(items))
+
+    def stopped(self):
+        return self.stop_event.is_set()
+
+    def pause(self):
+        self.pause_event.clear()
+
+    def resume(self):
+        self.pause_event.set()
+
+    def paused(self):
+        return not self.pause_event.is_set()
+
+    def cancel(self):
+        """Stop after the words in flight; unfinished words stay in the journal for a later resume."""
+        self.stop_event.set()
+        self.pause_event.set()
+
+    def _wait_if_paused(self):
+        while not self.pause_event.wait(0.2):
+            if self.stopped():
+                return
 
-        if not audio_bytes:
-            print("[TTS] macOS say produced empty audio.")
-            return None
+    def _feed_words(self, words_out, done, workers):
+        sized = bool(self.summary["total"])
+        try:
+            for index, word in enumerate(self.words):
+                if self.stopped():
+                    break
+                if not sized:
+                    with self.lock:
+                        self.summary["total"] = index + 1
+                if index not in done:
+                    words_out.put((index, word))
+        except Exception as e:
+            # A streamed source (file import, stdin) failed part-way: finish with what was read
+            print(f"[PIPELINE] Reading words failed: {e}")
+            self.summary["error"] = f"Could not read the remaining words: {e}"
+            self.on_message(f"❌ {self.summary['error']}\n")
+        finally:
+            # Always release the resolve stages, or run() never returns
+            for _ in range(workers):
+                words_out.put(_STAGE_DONE)
+
+    # --- stage 1: dictionary / AI lookup ---
+    def _resolve_stage(self, words_in, resolved_out):
+        while True:
+            item = words_in.get()
+            if item is _STAGE_DONE:
+                resolved_out.put(_STAGE_DONE)
+                return
+            index, word = item
+            self._wait_if_paused()
+            if self.stopped():
+                continue
+            if self.journal and index in self.journal.resolved:
+                # Looked up before the interruption: no second dictionary / AI call
+                resolved_out.put((index, word, *self.journal.resolved[index]))
+                continue
+            if not VALID_WORD_PATTERN.match(word):
+                self.on_message(f"'{word}' contains invalid characters. Skipping.\n")
+                self._count("failed", [(index, word)], "invalid characters")
+                continue
+            self.on_message(f"Processing: {word}...")
+            try:
+                data, source, error = resolve_word(word, self.translation_language, self.always_use_api)
+            except Exception as e:
+                data, source, error = None, None, f"Lookup failed for {word}: {e}"
+            if data is None:
+                self.on_message(f"  ✗ {error}\n")
+                self._count("failed", [(index, word)], error)
+                continue
+            if self.journal:
+                self.journal.record_resolved(index, data, source)
+            resolved_out.put((index, word, data, source))
+
+    # --- stage 2: duplicate check + note building (audio synthesized concurrently per chunk) ---
+    def _build_stage(self, resolved_in, built_out, producers):
+        finished = 0
+        chunk = []
+        while finished < producers:
+            try:
+                item = resolved_in.get(timeout=PIPELINE_CHUNK_WAIT)
+            except queue.Empty:
+                item = None
+            if item is _STAGE_DONE:
+                finished += 1
+            elif item is not None:
+                chunk.append(item)
+            if chunk and (len(chunk) >= COMMIT_CHUNK_SIZE or item is None or finished == producers):
+                try:
+                    built_out.put(self._build_chunk(chunk))
+                except Exception as e:
+                    for _, word, _, _ in chunk:
+                        self.on_message(f"✗ {word} — {e}\n")
+                    self._count("failed", [(index, word) for index, word, *_ in chunk], str(e))
+                chunk = []
+        built_out.put(_STAGE_DONE)
+
+    def _build_chunk(self, chunk):
+        self._wait_if_paused()
+        if self.stopped():
+            return []
+        duplicates = set() if self.allow_duplicates else find_duplicates([data.get("base_d", "") for _, _, data, _ in chunk])
+        in_flight = self.journal.in_flight if self.journal else set()
+        candidates = []
+        for index, word, data, source in chunk:
+            # Words sent to Anki before an interruption are checked in the commit stage instead
+            if data.get("base_d", "") in duplicates and index not in in_flight:
+                self.on_message(f"⚠️ Skipped duplicate: {data.get('base_d', '')} (already in Anki — enable 'Allow Duplicate Notes' in Preferences to override)\n")
+                self._count("duplicates", [(index, word)])
+                continue
+            candidates.append((index, word, data, source))
+        if self.defer_audio:
+            # Deferred audio: add text-only notes now, attach audio in the background
+            built = [build_word_note_deferred(data, self.deck_name, self.allow_duplicates, self.note_type,
+                                              self.translation_language)
+                     for _, _, data, _ in candidates]
+        else:
+            built = build_word_notes([data for _, _, data, _ in candidates], self.deck_name,
+                                     self.allow_duplicates, self.note_type,
+                                     translation_language=self.translation_language)
+        ready = []
+        for (index, word, data, source), (note, detail) in zip(candidates, built):
+            if note is None:
+                self.on_message(f"✗ {data.get('base_d', word)} — {detail}\n")
+                self._count("failed", [(index, word)], detail)
+                continue
+            ready.append((index, word, data, source, note, detail if self.defer_audio else None))
+        return ready
+
+    # --- stage 3: commit to Anki (or collect for .apkg export) ---
+    def _commit_stage(self, built_in):
+        while True:
+            ready = built_in.get()
+            if ready is _STAGE_DONE:
+                return
+            if not ready:
+                continue
+            try:
+                self._commit_chunk(ready)
+            except Exception as e:
+                # Keep draining: a dead commit stage would leave the build stage blocked on put()
+                print(f"[PIPELINE] Commit of {len(ready)} words failed: {e}")
+                for _, word, data, *_ in ready:
+                    self.on_message(f"✗ {data.get('base_d', word)} — {e}\n")
+                self._count("failed", [(index, word) for index, word, *_ in ready], str(e))
+
+    def _skip_already_added(self, ready):
+        """Drop words whose add reached Anki before an interruption (found with findNotes)."""
+        in_flight = [item for item in ready if item[0] in self.journal.in_flight]
+        if not in_flight:
+            return ready
+        try:
+            found = ANKI.multi([("findNotes", {"query": _note_search_query(note)}) for *_, note, _ in in_flight])
+        except AnkiConnectError:
+            return ready  # the outbox does the same check before replaying; Anki rejects the rest as duplicates
+        added = set()
+        for (index, word, data, source, note, _), note_ids in zip(in_flight, found):
+            if note_ids and not isinstance(note_ids, AnkiConnectError):
+                self.on_message(f"✓ {data.get('base_d', word)} → {data.get('base_e', '')} [{source}] (added before the interruption)\n")
+                self._count("added", [(index, word)], note_ids[0])
+                release_spooled_audio(note)
+                added.add(index)
+        return [item for item in ready if item[0] not in added]
+
+    def _commit_chunk(self, ready):
+        self._wait_if_paused()
+        if self.journal:
+            ready = self._skip_already_added(ready)
+            if not ready:
+                return
+            self.journal.record_commit([index for index, *_ in ready])
+        notes = [note for *_, note, _ in ready]
+        if self.export_path:
+            # Export mode: notes go into the .apkg written at the end of the batch
+            self.exported_notes.extend(notes)
+            results = [(True, None)] * len(notes)
+        elif self.defer_audio:
+            try:
+                results = commit_notes(notes)
+            except AnkiConnectUnavailable:
+                # The outbox should hold complete notes, so synthesize their audio now
+                try:
+                    built = build_word_notes([data for _, _, data, *_ in ready], self.deck_name, self.allow_duplicates,
+                                             self.note_type, translation_language=self.translation_language)
+                    queued = iter(commit_notes([note for note, _ in built if note is not None], offline_queue=True))
+                    results = [next(queued) if note is not None else (False, detail) for note, detail in built]
+                except Exception as e:
+                    results = [(False, str(e))] * len(notes)
+            except Exception as e:
+                results = [(False, str(e))] * len(notes)
+            else:
+                try:
+                    AUDIO_BACKFILL.enqueue([(note_id, texts) for (success, note_id), (*_, texts) in zip(results, ready) if success])
+                except Exception as e:
+                    self.on_message(f"⚠️ Could not queue audio for {sum(1 for ok, _ in results if ok)} added notes: {e}\n")
+        else:
+            try:
+                results = commit_notes(notes, offline_queue=True)
+            except Exception as e:
+                results = [(False, str(e))] * len(notes)
+        for (index, word, data, source, *_), (success, msg) in zip(ready, results):
+            if success:
+                self.on_message(f"✓ {data.get('base_d', word)} → {data.get('base_e', '')} [{source}]\n")
+                self._count("added", [(index, word)], msg)
+            elif msg == QUEUED_OFFLINE:
+                self.on_message(f"📥 {data.get('base_d', word)} → {data.get('base_e', '')} [{source}] — {msg}\n")
+                self._count("queued", [(index, word)])
+            elif "duplicate" in str(msg).lower():
+                self.on_message(f"✗ {data.get('base_d', word)} — duplicate already in Anki (enable 'Allow Duplicate Notes' in Preferences to override)\n")
+                self._count("duplicates", [(index, word)])
+            else:
+                self.on_message(f"✗ {data.get('base_d', word)} — {msg}\n")
+                self._count("failed", [(index, word)], str(msg))
+
+    def run(self):
+        """Run the whole batch (blocking; call from a worker thread). Returns the summary."""
+        started = time.perf_counter()
+        if self.flush_outbox:
+            for line in describe_outbox_flush(flush_outbox_if_reachable()):
+                self.on_message(line)
+        if not self.allow_duplicates and not DUPLICATE_INDEX.maybe_resync():
+            self.on_message(f"⚠️ Could not check Anki for duplicates ({DUPLICATE_INDEX.sync_error}); "
+                            "duplicates will be caught when the notes are added\n")
+        MEDIA_REGISTRY.sync_from_anki()
+        MEDIA_REGISTRY.reset_stats()
+        AUDIO_CACHE.reset_stats()
+
+        done = set()
+        if self.journal:
+            done = self.journal.done()
+            if done:
+                for index in done:
+                    self.summary[self.journal.results[index]] += 1
+                self.on_message(f"↩️ Resuming batch: {len(done)} of {len(self.words)} words were already done\n")
+                self.on_progress(len(done))
+        workers = self.ai_workers
+        if self.summary["total"]:
+            workers = max(1, min(workers, self.summary["total"] - len(done)))
+
+        words_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        resolved_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        built_q = queue.Queue(maxsize=2)
+        threads = [threading.Thread(target=self._feed_words, args=(words_q, done, workers), name="feed", daemon=True)]
+        threads += [threading.Thread(target=self._resolve_stage, args=(words_q, resolved_q), name=f"resolve-{i}", daemon=True)
+                    for i in range(workers)]
+        threads.append(threading.Thread(target=self._build_stage, args=(resolved_q, built_q, workers), name="build", daemon=True))
+        threads.append(threading.Thread(target=self._commit_stage, args=(built_q,), name="commit", daemon=True))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self.export_path and self.exported_notes:
+            try:
+                export_started = time.perf_counter()
+                written = write_apkg(self.export_path, self.exported_notes)
+                self.summary["exported"] = written
+                self.on_message(f"📦 Exported {written} notes to {self.export_path} in {time.perf_counter() - export_started:.1f}s — import it via File → Import in Anki\n")
+            except Exception as e:
+                self.summary["added"] = 0
+                self.on_message(f"❌ Export failed: {e}\n")
+
+        save_caches()
+        self.summary["cancelled"] = self.stopped()
+        self.summary["seconds"] = time.perf_counter() - started
+        if self.journal:
+            self.journal.close(cancelled=self.stopped())
+        print(f"[MEDIA] {MEDIA_REGISTRY.report()}")
+        print(f"[AUDIO CACHE] {AUDIO_CACHE.report()}")
+        return self.summary
+
+# === SPECULATIVE PREFETCH ===
+PREFETCH_DEBOUNCE_MS = 700  # idle time after the last keystroke before typed words are prepared
+
+class WordPrefetcher:
+    """Prepares the words typed into WordMaster before Add is pressed.
+
+    update() hands over the current text; a background thread tokenizes it like
+    process_words and, for every finished word (not the one still being typed),
+    resolves it — dictionary hits are free, misses go to the AI provider and land
+    in the AI cache — and warms AUDIO_CACHE with its clips (warm_audio_cache), up to
+    PIPELINE_AI_WORKERS words at once. The batch then finds both in the caches,
+    which are saved whenever the prefetcher goes idle. AI calls and TTS are spent on
+    at most `budget` words per session; a newer update() replaces the words not
+    started yet.
+    """
 
-        audio_b64 = base64.b64encode(audio_bytes).decode("ascii")
-        filename = f"macos-say-{filename_hint}.aiff"
-        print(f"[TTS] macOS say generated {len(audio_bytes)} bytes -> {filename}")
+    def __init__(self, budget):
+        self.budget = budget
+        self.spent = 0
+        self.text = None
+        self.settings = ("English", False)
+        self.done = set()       # (word, language) already prepared or skipped
+        self.ai_calls = 0
+        self.clips = 0
+        self.active = 0         # words being prepared
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.slots = threading.Semaphore(PIPELINE_AI_WORKERS)
+        self.pool = ThreadPoolExecutor(max_workers=PIPELINE_AI_WORKERS, thread_name_prefix="prefetch")
+
+    def update(self, text, translation_language="English", always_use_api=False):
+        with self.lock:
+            self.text = text
+            self.settings = (translation_language, always_use_api)
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+            self.thread.start()
+        self.wake.set()
+
+    def cancel(self):
+        """Drop the words not started yet (a batch is about to do the work itself)."""
+        with self.lock:
+            self.text = None
+
+    def _run(self):
+        while True:
+            self.wake.wait()
+            self.wake.clear()
+            with self.lock:
+                text, (language, always_use_api) = self.text, self.settings
+            if text is None:
+                continue
+            tokens = re.split(r"[,\n]", text)
+            if not text.endswith((",", "\n")):
+                tokens = tokens[:-1]  # still being typed
+            for token in tokens:
+                if self.spent >= self.budget or self.text is not text:
+                    break  # out of budget, or superseded by newer text (which has set `wake`)
+                word = token.strip()
+                if not word or (word, language) in self.done:
+                    continue
+                if not VALID_WORD_PATTERN.match(word):
+                    self.done.add((word, language))
+                    continue
+                wait_for_dictionary()
+                in_dictionary = (not always_use_api and language == "English" and GERMAN_DICT
+                                 and lookup_word_in_dictionary(word))
+                needs_ai = not in_dictionary and not get_cached_ai_result(word, language)
+                if needs_ai and not API_KEY:
+                    continue  # not done: prepared once an API key is configured
+                self.done.add((word, language))
+                self.spent += 1
+                self.slots.acquire()
+                with self.lock:
+                    self.active += 1
+                self.pool.submit(self._prepare, word, language, always_use_api, needs_ai)
+
+    def _prepare(self, word, translation_language, always_use_api, needs_ai):
+        try:
+            data, _, _ = resolve_word(word, translation_language, always_use_api)
+            if data is None:
+                return
+            with self.lock:
+                self.ai_calls += needs_ai
+            fields, audio_texts = word_note_fields(dict(data))
+            if fields is None:
+                return
+            texts = [text for text in dict.fromkeys(audio_texts.values()) if text]
+            ready = sum(tts_pool().map(warm_audio_cache, texts))
+            with self.lock:
+                self.clips += ready
+        except Exception as e:
+            print(f"[PREFETCH] '{word}' failed: {e}")
+        finally:
+            with self.lock:
+                self.active -= 1
+                idle = not self.active
+            if idle:
+                save_ai_cache()
+                AUDIO_CACHE.save()
+            self.slots.release()
+
+    def report(self):
+        return (f"Prefetch: {self.spent}/{self.budget} words prepared while typing "
+                f"({self.ai_calls} AI lookups, {self.clips} clips)")
+
+# === QT ===
+LOG_FLUSH_MS = 100          # batch log: append buffered lines at most 10 times a second
+LOG_MAX_LINES = 2000        # lines kept in the log widget; the full log goes to BATCH_LOG_PATH
+PROGRESS_UPDATE_MS = 250    # progress bar repaints at most 4 times a second
+BATCH_LOG_PATH = Path(os.path.expanduser("~/.danki/last_batch.log"))
+
+def load_qt():
+    """Import PyQt5 and define the Qt classes (on demand, so headless use needs no Qt or display)."""
+    global Qt, QTimer, QUrl, QObject, pyqtSignal, QSize, QPixmap, QCursor, QDesktopServices, QtWidgets, QtGui
+    global QApplication, QWidget, QLabel, QPushButton, QTextEdit, QVBoxLayout, QComboBox, QHBoxLayout
+    global QMessageBox, QInputDialog, QProgressBar, QLineEdit, QCheckBox, QToolButton, QDialog
+    global ShortcutAwareTextEdit, WordPipelineSignals, BackgroundTask, PaintWatcher, LogBuffer, ProgressThrottle
+    if "WordPipelineSignals" in globals():
+        return
+    from PyQt5.QtCore import Qt, QTimer, QUrl, QObject, pyqtSignal, QSize
+    from PyQt5.QtGui import QPixmap, QCursor, QDesktopServices
+    from PyQt5 import QtWidgets
+    from PyQt5 import QtGui
+    from PyQt5.QtWidgets import (
+        QApplication, QWidget, QLabel, QPushButton, QTextEdit, QVBoxLayout,
+        QComboBox, QHBoxLayout, QMessageBox, QInputDialog, QProgressBar, QLineEdit, QCheckBox, QToolButton, QDialog
+    )
 
-        return {
-            "filename": filename,
-            "data": audio_b64
-        }
-    except Exception as e:
-        print(f"[TTS] macOS say TTS request failed: {e}")
-        return None
+    # --- Shortcut-aware QTextEdit ---
+    class ShortcutAwareTextEdit(QTextEdit):
+        def __init__(self, callback=None, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.callback = callback
+
+        def keyPressEvent(self, event):
+            if ((event.modifiers() & Qt.ShiftModifier) and
+                    event.key() in (Qt.Key_Return, Qt.Key_Enter)):
+                if self.callback and callable(self.callback) and self.toPlainText().strip():
+                    self.setDisabled(True)  # Prevent further input
+                    def safe_callback():
+                        if self.callback and callable(self.callback):
+                            self.callback()
+                        QTimer.singleShot(1500, lambda: self.setDisabled(False))
+                    QTimer.singleShot(0, safe_callback)
+                    return
+            super().keyPressEvent(event)
+
+    class WordPipelineSignals(QObject):
+        """Qt adapter: carries WordPipeline callbacks from worker threads to the GUI thread."""
+        message = pyqtSignal(str)
+        progress = pyqtSignal(int)
+        finished = pyqtSignal(dict)
+
+        def start(self, pipeline, on_message=None, on_progress=None):
+            """Thread-safe callbacks (LogBuffer.append, ProgressThrottle.advance) may be passed to
+            run on the worker thread directly instead of one queued signal per message."""
+            pipeline.on_message = on_message or self.message.emit
+            pipeline.on_progress = on_progress or self.progress.emit
+
+            def run():
+                summary = pipeline.summary
+                try:
+                    summary = pipeline.run()
+                except Exception as e:
+                    print(f"[PIPELINE] Batch failed: {e}")
+                    pipeline.on_message(f"❌ Batch failed: {e}\n")
+                finally:
+                    # The GUI re-enables its buttons on `finished`, so it must always arrive
+                    self.finished.emit(summary)
+
+            thread = threading.Thread(target=run, name="word-pipeline", daemon=True)
+            thread.start()
+            return thread
+
+    class BackgroundTask(QObject):
+        """Runs `fn` on a worker thread and hands its result to `on_done` on the GUI thread."""
+        done = pyqtSignal(object)
+
+        def __init__(self, fn, on_done, parent=None, name="background"):
+            super().__init__(parent)
+            self.fn = fn
+            self.done.connect(on_done)
+            self.done.connect(self.deleteLater)  # after on_done: slots run in connection order
+            threading.Thread(target=lambda: self.done.emit(self.fn()), name=name, daemon=True).start()
+
+    class PaintWatcher(QObject):
+        """Calls `callback` once, when the watched window first paints."""
+
+        def __init__(self, widget, callback):
+            super().__init__(widget)
+            self.callback = callback
+            widget.installEventFilter(self)
+
+        def eventFilter(self, obj, event):
+            if event.type() == event.Paint and self.callback:
+                callback, self.callback = self.callback, None
+                callback()
+            return False
 
-def generate_tts_audio(text, filename_hint):
-    """Generate TTS audio using Edge TTS (if enabled) with macOS say fallback.
-    
-    Returns a dict with `filename` and base64 `data`, or None on failure.
-    """
-    config = load_config()
-    
-    # Try Edge TTS first if enabled and available
-    if config.get("use_edge_tts", False):
-        edge_audio = generate_edge_tts_audio(text, filename_hint)
-        if edge_audio:
-            return edge_audio
-        print("[TTS] Edge TTS failed, falling back to macOS say")
-    
-    # Fallback to macOS say (offline, always works)
-    return generate_macos_say_audio(text, filename_hint)
+    class LogBuffer(QObject):
+        """Batch log for a read-only QTextEdit: lines are buffered and appended once per frame.
 
-# === FETCH DECKS FROM ANKI ===
-def get_anki_decks():
-    payload = {"action": "deckNames", "version": 6}
-    try:
-        response = requests.post(ANKI_ENDPOINT, json=payload, timeout=5)
-        decks = response.json().get("result", [])
-        return decks
-    except Exception:
-        QMessageBox.warning(None, "Anki not responding", "Anki is not running or AnkiConnect is not enabled.")
-        return []
+        append() may be called from any thread. The widget keeps the last `max_lines`
+        lines; the whole log since the last clear() is written to `spill_path`, so
+        trimmed lines are not lost.
+        """
+        wake = pyqtSignal()
+
+        def __init__(self, widget, spill_path=None, interval_ms=LOG_FLUSH_MS, max_lines=LOG_MAX_LINES):
+            super().__init__(widget)
+            self.widget = widget
+            self.spill_path = spill_path
+            self.spill = None
+            self.max_lines = max_lines
+            self.lines = 0
+            self.pending = []
+            self.lock = threading.Lock()
+            widget.document().setMaximumBlockCount(max_lines)
+            self.timer = QTimer(self)
+            self.timer.setSingleShot(True)
+            self.timer.setInterval(interval_ms)
+            self.timer.timeout.connect(self.flush)
+            self.wake.connect(self._arm)
+
+        @property
+        def trimmed(self):
+            return self.lines > self.max_lines
+
+        def append(self, text):
+            with self.lock:
+                self.pending.append(text)
+                first = len(self.pending) == 1
+            if first:
+                self.wake.emit()  # one cross-thread event per frame, not per line
+
+        def _arm(self):
+            if not self.timer.isActive():
+                self.timer.start()
+
+        def flush(self):
+            self.timer.stop()
+            with self.lock:
+                pending, self.pending = self.pending, []
+            if not pending:
+                return
+            text = "\n".join(pending)
+            count = text.count("\n") + 1
+            self.lines += count
+            # Lines the widget would trim right away only go to the file
+            self.widget.append(text if count <= self.max_lines else "\n".join(text.split("\n")[-self.max_lines:]))
+            if self.spill_path:
+                try:
+                    if self.spill is None:
+                        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+                        self.spill = open(self.spill_path, "w", encoding="utf-8")
+                    self.spill.write(text + "\n")
+                    self.spill.flush()
+                except OSError as e:
+                    print(f"[LOG] Could not write {self.spill_path}: {e}")
+                    self.spill_path = None
+
+        def clear(self):
+            self.timer.stop()
+            with self.lock:
+                self.pending = []
+            self.lines = 0
+            self.widget.clear()
+            if self.spill is not None:
+                self.spill.close()
+                self.spill = None
+
+    class ProgressThrottle(QObject):
+        """Counts progress at full rate (from any thread) but repaints the QProgressBar at most every `interval_ms`."""
+        wake = pyqtSignal()
+
+        def __init__(self, bar, interval_ms=PROGRESS_UPDATE_MS):
+            super().__init__(bar)
+            self.bar = bar
+            self.value = 0
+            self.armed = False
+            self.lock = threading.Lock()
+            self.timer = QTimer(self)
+            self.timer.setSingleShot(True)
+            self.timer.setInterval(interval_ms)
+            self.timer.timeout.connect(self.flush)
+            self.wake.connect(self.timer.start)
+
+        def reset(self, maximum):
+            self.timer.stop()
+            with self.lock:
+                self.value = 0
+                self.armed = False
+            self.bar.setMaximum(maximum)
+            self.bar.setValue(0)
+
+        def advance(self, count):
+            with self.lock:
+                self.value += count
+                arm, self.armed = not self.armed, True
+            if arm:
+                self.wake.emit()
+
+        def flush(self):
+            self.timer.stop()
+            with self.lock:
+                value = self.value
+                self.armed = False
+            if self.bar.value() != value:
+                self.bar.setValue(value)
+
+# === STARTUP ===
+class StartupTrace:
+    """`--startup-trace`: milestones since the module started importing, printed once interactive."""
+
+    def __init__(self):
+        self.enabled = False
+        self.marks = []
+        self.required = set()
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    def mark(self, label):
+        with self.lock:
+            if any(existing == label for existing, _ in self.marks):
+                return
+            self.marks.append((label, time.perf_counter() - _STARTUP_T0))
+            self.pending.discard(label)
+            report = self.enabled and not self.pending and label in self.required
+        if report:
+            self.mark("interactive")
+            self.report()
 
-def find_note_count(query):
-    payload = {
-        "action": "findNotes",
-        "version": 6,
-        "params": {"query": query}
-    }
-    try:
-        response = requests.post(ANKI_ENDPOINT, json=payload)
-        notes = response.json().get("result", [])
-        return len(notes)
-    except Exception:
-        return 0
+    def expect(self, *labels):
+        """Milestones that must all happen before the app counts as interactive."""
+        self.required = set(labels)
+        self.pending = set(labels) - {label for label, _ in self.marks}
 
-def get_wordmaster_decks():
-    decks = get_anki_decks()
-    wordmaster_decks = []
-    for deck in decks:
-        # Exclude default deck
-        if deck.strip().lower() == "default":
-            continue
-        # Check if deck is empty
-        note_count = find_note_count(f'deck:"{deck}"')
-        if note_count == 0:
-            wordmaster_decks.append(deck)
-        else:
-            # Check for both basic and advanced German note types
-            german_note_count = find_note_count(f'deck:"{deck}" note:"{NOTE_TYPE}"')
-            german_advanced_count = find_note_count(f'deck:"{deck}" note:"{NOTE_TYPE_ADVANCED}"')
-            if german_note_count > 0 or german_advanced_count > 0:
-                wordmaster_decks.append(deck)
-    return wordmaster_decks
+    def report(self):
+        print("[STARTUP] " + ", ".join(f"{label} {seconds * 1000:.0f} ms" for label, seconds in self.marks))
 
-def get_phrasemaster_decks():
-    payload = {"action": "deckNames", "version": 6}
-    try:
-        response = requests.post(ANKI_ENDPOINT, json=payload, timeout=5)
-        decks = response.json().get("result", [])
-    except Exception:
-        QMessageBox.warning(None, "Anki not responding", "Anki is not running or AnkiConnect is not enabled.")
-        return []
+STARTUP_TRACE = StartupTrace()
 
-    valid_decks = []
-    for deck in decks:
-        # Exclude default deck
-        if deck.strip().lower() == "default":
-            continue
-        note_count = find_note_count(f'deck:"{deck}"')
-        if note_count == 0:
-            valid_decks.append(deck)
+def _check_edge_tts():
+    global EDGE_TTS_SESSION_DISABLED
+    print("[TTS] Testing Edge TTS availability...")
+    if not test_edge_tts_available():
+        EDGE_TTS_SESSION_DISABLED = True
+        print("[TTS] Edge TTS unavailable, disabled for this session")
+
+def init_backend(config, background=False):
+    """Startup shared by the GUI and headless mode: TTS probe, dictionary, spool cleanup.
+
+    With `background` (the GUI) the network probe and the dictionary parse run on
+    worker threads so the window can paint first; lookups wait for the dictionary.
+    """
+    global API_KEY, API_PROVIDER, _dictionary_thread
+    API_KEY = config.get("api_key")
+    API_PROVIDER = config.get("api_provider", "gemini")
+    restore_warm_snapshot()
+
+    # Test Edge TTS availability at startup if enabled
+    if config.get("use_edge_tts", False) and EDGE_TTS_AVAILABLE:
+        if background:
+            threading.Thread(target=_check_edge_tts, name="edge-tts-probe", daemon=True).start()
         else:
-            phrase_note_count = find_note_count(f'deck:"{deck}" note:"Phrase Auto"')
-            if phrase_note_count > 0:
-                valid_decks.append(deck)
-    return valid_decks
-# === Check for duplicates ===
-def is_duplicate(base_d_value, base_a_value):
-    query = f'note:"{NOTE_TYPE.strip()}" base_d:"{base_d_value}" base_a:"{base_a_value}"'
-    payload = {
-        "action": "findNotes",
-        "version": 6,
-        "params": {
-            "query": query
-        }
-    }
+            _check_edge_tts()
 
-    try:
-        response = requests.post(ANKI_ENDPOINT, json=payload)
-        result = response.json().get("result", [])
-        return len(result) > 0
-    except Exception:
-        return False
+    # Load offline dictionary
+    if background:
+        _dictionary_thread = threading.Thread(target=load_offline_dictionary, name="dictionary", daemon=True)
+        _dictionary_thread.start()
+    else:
+        load_offline_dictionary()
+    purge_stale_spool()
 
 # === GUI ===
 def run_gui():
-    global EDGE_TTS_SESSION_DISABLED
-    
-    # Test Edge TTS availability at startup if enabled
+    load_qt()
+    STARTUP_TRACE.mark("qt imported")
     config = load_config()
-    if config.get("use_edge_tts", False) and EDGE_TTS_AVAILABLE:
-        print("[TTS] Testing Edge TTS availability...")
-        if not test_edge_tts_available():
-            EDGE_TTS_SESSION_DISABLED = True
-            print("[TTS] Edge TTS unavailable, disabled for this session")
-    
-    # Load offline dictionary
-    load_offline_dictionary()
-    
+    init_backend(config, background=True)
+
     try:
         if sys.platform == "win32":
             import ctypes
@@ -900,6 +4482,14 @@ def run_gui():
         def open_preferences():
             QMessageBox.information(window, "Preferences", "Preferences dialog would open here.")
 
+        def warn_anki_unreachable(has_last_known):
+            if has_last_known:
+                QMessageBox.warning(window, "Anki not responding",
+                    "Anki is not running or AnkiConnect is not enabled.\n\n"
+                    "Showing your last known decks. New cards will be queued and added automatically once Anki is running.")
+            else:
+                QMessageBox.warning(window, "Anki not responding", "Anki is not running or AnkiConnect is not enabled.")
+
         pref_action = QtWidgets.QAction("Open Preferences", window)
         pref_action.triggered.connect(open_preferences)
         preferences_menu.addAction(pref_action)
@@ -993,19 +4583,20 @@ def run_gui():
         deck_layout = QHBoxLayout()
         deck_label = QLabel("Select Anki Deck:")
         deck_combo = QComboBox()
-        deck_list = get_wordmaster_decks()
-        deck_combo.addItems(deck_list)
-        if deck_list:
-            deck_combo.setCurrentIndex(0)
-        else:
-            deck_combo.setCurrentIndex(-1)
+        # Last known decks from the warm-start snapshot; load_decks_in_background() refreshes them
+        deck_combo.setPlaceholderText("Loading decks…")
+        deck_combo.setEnabled(False)
         deck_layout.addWidget(deck_label)
         deck_layout.addWidget(deck_combo)
 
         refresh_btn = QPushButton("Refresh")
         def refresh_decks():
             deck_combo.clear()
-            updated = get_wordmaster_decks()
+            invalidate_deck_cache()
+            updated, reachable = get_wordmaster_decks()
+            if not reachable:
+                warn_anki_unreachable(bool(updated))
+            DUPLICATE_INDEX.maybe_resync(force=True)
             deck_combo.addItems(updated)
             if updated:
                 deck_combo.setCurrentIndex(0)
@@ -1033,11 +4624,12 @@ def run_gui():
         output_box.setTabChangesFocus(True)
         output_box.setFixedHeight(150)
         main_layout.addWidget(output_box)
+        word_log = LogBuffer(output_box, BATCH_LOG_PATH)
 
         # Clear button
         def clear_text_boxes():
             input_box.clear()
-            output_box.clear()
+            word_log.clear()
 
         # Progress bar
         progress_bar = QProgressBar()
@@ -1056,6 +4648,7 @@ def run_gui():
         }
         """)
         main_layout.addWidget(progress_bar)
+        word_progress = ProgressThrottle(progress_bar)
 
         # Process button
         def process_words():
@@ -1077,26 +4670,33 @@ QProgressBar::chunk {
 """)
             is_processing = True
             add_btn.setEnabled(False)
+            prefetch_timer.stop()
+            prefetcher.cancel()
+            if prefetcher.spent:
+                print(f"[PREFETCH] {prefetcher.report()}")
             QApplication.processEvents()
+            started = False
             try:
                 # Only check internet if we have an API key and might need it
                 if API_KEY and not is_connected():
                     QMessageBox.critical(window, "No Internet", f"An internet connection is required to use {get_provider_display_name()} API.\n\nYou can still use offline dictionary mode if available.")
                     return
 
-                words_raw = input_box.toPlainText()
-                selected_deck = deck_combo.currentText()
-                words = re.split(r"[,\n]", words_raw)
-                words = [w.strip() for w in words if w.strip()]
-                valid_word_pattern = re.compile(r"^[a-zA-ZäöüÄÖÜß\s\-]+$")
+                if not deck_combo.isEnabled():
+                    word_log.append("Decks are still loading from Anki — try again in a moment.")
+                    return
 
-                output_box.clear()
-                progress_bar.setMaximum(len(words))
-                progress_bar.setValue(0)
+                selected_deck = deck_combo.currentText()
+                if import_source["importer"] is not None:
+                    # Streamed from the file as the pipeline keeps up; the total is unknown until the end
+                    words = import_source["importer"]
+                else:
+                    words_raw = input_box.toPlainText()
+                    words = re.split(r"[,\n]", words_raw)
+                    words = [w.strip() for w in words if w.strip()]
 
-                # --- Success/total counters for status ---
-                success_count = 0
-                total_count = len(words)
+                word_log.clear()
+                word_progress.reset(len(words) if isinstance(words, list) else 0)
 
                 # Read selected translation language from config
                 translation_language = config.get("translation_language", "English")
@@ -1115,105 +4715,139 @@ QProgressBar::chunk {
                 # Select note type based on preference
                 selected_note_type = NOTE_TYPE_ADVANCED if use_advanced_cards else NOTE_TYPE
 
-                for word in words:
-                    if not valid_word_pattern.match(word):
-                        output_box.append(f"'{word}' contains invalid characters. Skipping.\n")
-                        progress_bar.setValue(progress_bar.value() + 1)
-                        continue
-
-                    output_box.append(f"Processing: {word}...")
-                    QApplication.processEvents()
+                # The batch runs on worker threads; results arrive through Qt signals
+                pipeline = WordPipeline(
+                    words, selected_deck, selected_note_type, translation_language,
+                    allow_duplicates=allow_duplicates, always_use_api=always_use_api,
+                    defer_audio=config.get("defer_audio", False), export_path=export_target["path"],
+                )
+                if isinstance(words, list) and not pipeline.export_path:
+                    pipeline.journal = BatchJournal.create(words, pipeline.settings())
+                start_word_pipeline(pipeline, importer=import_source["importer"])
+                started = True
+            finally:
+                if not started:
+                    is_processing = False
+                    add_btn.setEnabled(True)
+
+        active_batch = {"pipeline": None, "importer": None}
+
+        def start_word_pipeline(pipeline, importer=None):
+            active_batch["pipeline"] = pipeline
+            active_batch["importer"] = importer
+            pipeline.flush_outbox = True
+            pause_btn.setText("Pause")
+            pause_btn.setEnabled(True)
+            cancel_btn.setEnabled(True)
+            signals = WordPipelineSignals(window)
+            signals.finished.connect(on_words_finished)
+            signals.start(pipeline, on_message=word_log.append, on_progress=word_progress.advance)
+
+        def toggle_pause():
+            pipeline = active_batch["pipeline"]
+            if pipeline is None:
+                return
+            if pipeline.paused():
+                pipeline.resume()
+                pause_btn.setText("Pause")
+                word_log.append("▶️ Resumed\n")
+            else:
+                pipeline.pause()
+                pause_btn.setText("Resume")
+                word_log.append("⏸️ Paused — words already in flight will finish first\n")
 
-                    gemini_data = None
-                    source = "Unknown"
-                    
-                    # Try offline dictionary first (only for German->English, if not disabled)
-                    if not always_use_api and translation_language == "English" and GERMAN_DICT:
-                        print(f"[DEBUG] Checking dictionary for: {word}")
-                        dict_entry = lookup_word_in_dictionary(word)
-                        if dict_entry:
-                            print(f"[DEBUG] Found '{word}' in dictionary!")
-                            gemini_data = convert_dict_to_anki_format(dict_entry, word)
-                            source = "Dictionary"
-                            QApplication.processEvents()
-                        else:
-                            print(f"[DEBUG] '{word}' not found in dictionary")
-                    else:
-                        print(f"[DEBUG] Skipping dictionary: always_use_api={always_use_api}, lang={translation_language}, dict_loaded={GERMAN_DICT is not None}")
-                    
-                    # Fall back to Gemini API if not found in dictionary
-                    if gemini_data is None:
-                        # Check if API key is available
-                        if not API_KEY:
-                            output_box.append(f"  ✗ Not in dictionary and no API key configured (offline mode)\n")
-                            progress_bar.setValue(progress_bar.value() + 1)
-                            continue
-                        
-                        for attempt in range(4):
-                            gemini_data = query_gemini(word, translation_language)
-                            if "error" not in gemini_data:
-                                source = f"AI ({get_provider_display_name()})"
-                                print(f"[DEBUG] {get_provider_display_name()} raw data for '{word}':\n{json.dumps(gemini_data, indent=2, ensure_ascii=False)}")
-                                break
-
-                    if "error" in gemini_data:
-                        error_text = gemini_data.get("error", "Unknown error")
-                        output_box.append(f"{get_provider_display_name()} failed for: {word}\nDetails: {error_text}\n")
-                        print(f"[AI ERROR] Word '{word}': {error_text}")
-                        progress_bar.setValue(progress_bar.value() + 1)
-                        continue
+        def cancel_batch():
+            pipeline = active_batch["pipeline"]
+            if pipeline is None:
+                return
+            pipeline.cancel()
+            pause_btn.setEnabled(False)
+            cancel_btn.setEnabled(False)
+            word_log.append("⏹️ Cancelling after the words in flight…\n")
 
-                    if is_duplicate(gemini_data.get("base_d", ""), gemini_data.get("base_a", "")):
-                        output_box.append(f"⚠️ Skipped duplicate: {gemini_data.get('base_d', '')} (already in Anki — enable 'Allow Duplicate Notes' in Preferences to override)\n")
-                        progress_bar.setValue(progress_bar.value() + 1)
-                        continue
+        def offer_batch_resume():
+            global is_processing
+            if is_processing:
+                return
+            journals = unfinished_batches()
+            if not journals:
+                return
+            journal = journals[0]
+            answer = QMessageBox.question(
+                window, "Resume unfinished batch?",
+                f"A WordMaster batch did not finish: {journal.describe()}.\n\n"
+                "Resume it now? Words that were already looked up or added are not repeated.",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+            if answer != QMessageBox.Yes:
+                # Only the batch that was offered; any older ones are offered on the next start
+                journal.discard()
+                return
+            is_processing = True
+            add_btn.setEnabled(False)
+            word_log.clear()
+            word_progress.reset(len(journal.words))
+            start_word_pipeline(WordPipeline.from_journal(journal))
 
-                    success, msg = add_to_anki(gemini_data, selected_deck, allow_duplicates, selected_note_type)
-                    if success:
-                        success_count += 1
-                    status = "✓" if success else "✗"
-                    meaning_display = f"{gemini_data.get('base_e', '')}"
-                    source_display = f"[{source}]" if success else ""
-                    if success:
-                        output_box.append(f"{status} {gemini_data.get('base_d', word)} → {meaning_display} {source_display}\n")
-                    elif "duplicate" in msg.lower():
-                        output_box.append(f"{status} {gemini_data.get('base_d', word)} — duplicate already in Anki (enable 'Allow Duplicate Notes' in Preferences to override)\n")
-                    else:
-                        output_box.append(f"{status} {gemini_data.get('base_d', word)} — {msg}\n")
-                    progress_bar.setValue(progress_bar.value() + 1)
-
-                # Set progress bar style: yellow if some fail, blue if all succeed
-                if success_count < total_count:
-                    progress_bar.setStyleSheet("""
-                    QProgressBar {
-                        border: 1px solid #444;
-                        border-radius: 5px;
-                        text-align: center;
-                        height: 10px;
-                    }
-                    QProgressBar::chunk {
-                        background-color: #f5c542;
-                        border-radius: 5px;
-                    }
-                    """)
-                else:
-                    progress_bar.setStyleSheet("""
-                    QProgressBar {
-                        border: 1px solid #444;
-                        border-radius: 5px;
-                        text-align: center;
-                        height: 10px;
-                    }
-                    QProgressBar::chunk {
-                        background-color: #0078d7;
-                        border-radius: 5px;
-                    }
-                    """)
-
-                output_box.append(f"Done! ({success_count}/{total_count})")
-            finally:
-                is_processing = False
-                add_btn.setEnabled(True)
+        def on_words_finished(summary):
+            global is_processing
+            pipeline, importer = active_batch["pipeline"], active_batch["importer"]
+            active_batch["pipeline"] = active_batch["importer"] = None
+            pause_btn.setText("Pause")
+            pause_btn.setEnabled(False)
+            cancel_btn.setEnabled(False)
+            if progress_bar.maximum() == 0:
+                progress_bar.setMaximum(max(summary["total"], 1))
+            word_progress.flush()
+            success_count = summary["added"] + summary["queued"]
+            # Set progress bar style: yellow if some fail, blue if all succeed
+            if success_count < summary["total"]:
+                progress_bar.setStyleSheet("""
+                QProgressBar {
+                    border: 1px solid #444;
+                    border-radius: 5px;
+                    text-align: center;
+                    height: 10px;
+                }
+                QProgressBar::chunk {
+                    background-color: #f5c542;
+                    border-radius: 5px;
+                }
+                """)
+            else:
+                progress_bar.setStyleSheet("""
+                QProgressBar {
+                    border: 1px solid #444;
+                    border-radius: 5px;
+                    text-align: center;
+                    height: 10px;
+                }
+                QProgressBar::chunk {
+                    background-color: #0078d7;
+                    border-radius: 5px;
+                }
+                """)
+
+            if MEDIA_REGISTRY.reused_clips:
+                word_log.append(f"♻️ {MEDIA_REGISTRY.report()}")
+            if AUDIO_CACHE.hits:
+                word_log.append(f"♻️ {AUDIO_CACHE.report()}")
+            if len(AUDIO_BACKFILL):
+                word_log.append(f"🔊 Audio for {len(AUDIO_BACKFILL)} notes is being added in the background")
+            if importer is not None:
+                word_log.append(f"📂 {importer.describe()}")
+            if word_log.trimmed:
+                word_log.append(f"Showing the last {LOG_MAX_LINES} lines — the full log is in {BATCH_LOG_PATH}")
+            if summary.get("cancelled") and pipeline is not None and pipeline.journal is None:
+                word_log.append(f"Cancelled ({success_count}/{summary['total']})")
+            elif summary.get("cancelled"):
+                word_log.append(f"Cancelled ({success_count}/{summary['total']}) — the rest can be resumed next time Danki starts")
+            elif summary.get("error"):
+                word_log.append(f"Stopped early ({success_count}/{summary['total']}): {summary['error']}")
+            else:
+                word_log.append(f"Done! ({success_count}/{summary['total']})")
+            word_log.flush()
+            is_processing = False
+            add_btn.setEnabled(True)
 
         button_layout = QHBoxLayout()
         
@@ -1235,11 +4869,78 @@ QProgressBar::chunk {
         input_box.textChanged.connect(update_clear_button_state)
         output_box.textChanged.connect(update_clear_button_state)
         update_clear_button_state()
+
+        # Prepare typed words in the background (debounced) so Add mostly hits the caches
+        prefetcher = WordPrefetcher(int(config.get("prefetch_budget", 25)))
+        prefetch_timer = QTimer(window)
+        prefetch_timer.setSingleShot(True)
+        prefetch_timer.setInterval(PREFETCH_DEBOUNCE_MS)
+        def prefetch_typed_words():
+            if is_processing or not config.get("prefetch", False):
+                return
+            prefetcher.update(input_box.toPlainText(), config.get("translation_language", "English"),
+                              config.get("always_use_api", False))
+        prefetch_timer.timeout.connect(prefetch_typed_words)
+        input_box.textChanged.connect(prefetch_timer.start)
         
         add_btn.clicked.connect(process_words)
         input_box.callback = process_words
         button_layout.addWidget(add_btn)
 
+        # Pause / cancel a running batch (progress is journaled, so cancelled batches can be resumed)
+        pause_btn = QPushButton("Pause")
+        pause_btn.setEnabled(False)
+        pause_btn.clicked.connect(toggle_pause)
+        button_layout.addWidget(pause_btn)
+        cancel_btn = QPushButton("Cancel")
+        cancel_btn.setEnabled(False)
+        cancel_btn.clicked.connect(cancel_batch)
+        button_layout.addWidget(cancel_btn)
+
+        # Export to .apkg (faster than AnkiConnect for very large imports)
+        export_target = {"path": None}
+        export_btn = QPushButton("Export .apkg…")
+        export_btn.setToolTip("Build the cards into an Anki package file instead of adding them one by one")
+        def export_words_to_apkg():
+            path, _ = QtWidgets.QFileDialog.getSaveFileName(
+                window, "Export to Anki package", os.path.expanduser("~/danki_export.apkg"), "Anki package (*.apkg)")
+            if not path:
+                return
+            export_target["path"] = path if path.endswith(".apkg") else path + ".apkg"
+            try:
+                process_words()
+            finally:
+                export_target["path"] = None
+        export_btn.clicked.connect(export_words_to_apkg)
+        input_box.textChanged.connect(lambda: export_btn.setEnabled(bool(input_box.toPlainText().strip())))
+        export_btn.setEnabled(False)
+        button_layout.addWidget(export_btn)
+
+        # Import a word list, Anki export or Kindle vocab.db straight into the pipeline
+        import_source = {"importer": None}
+        import_btn = QPushButton("Import…")
+        import_btn.setToolTip("Add the words from a file (text, CSV, Anki export or Kindle vocab.db) without pasting them")
+        def import_words_from_file():
+            if is_processing:
+                return
+            path, _ = QtWidgets.QFileDialog.getOpenFileName(
+                window, "Import words", os.path.expanduser("~"),
+                "Vocabulary files (*.txt *.csv *.tsv *.apkg *.colpkg *.db *.sqlite);;All files (*)")
+            if not path:
+                return
+            note_type = NOTE_TYPE_ADVANCED if config.get("use_advanced_cards", False) else NOTE_TYPE
+            try:
+                import_source["importer"] = WordImport(path, note_type, allow_duplicates=allow_duplicates)
+            except (OSError, ValueError, sqlite3.Error, zipfile.BadZipFile) as e:
+                QMessageBox.warning(window, "Import", f"Cannot import {os.path.basename(path)}:\n{e}")
+                return
+            try:
+                process_words()
+            finally:
+                import_source["importer"] = None
+        import_btn.clicked.connect(import_words_from_file)
+        button_layout.addWidget(import_btn)
+
         # Add keyboard shortcut for Add Words to Deck using QAction
         from PyQt5.QtGui import QKeySequence
         shortcut_action = QtWidgets.QAction(window)
@@ -1296,16 +4997,14 @@ QProgressBar::chunk {
         # "Check for updates now" button
         check_updates_now_btn = QPushButton("Check for updates now")
         def check_updates_now():
-            check_for_update._manual = True
-            check_for_update()
-            check_for_update._manual = False
+            check_for_update(manual=True)
         check_updates_now_btn.clicked.connect(check_updates_now)
 
         # --- Translation language selection dropdown ---
         translation_label = QLabel("Translation language:")
         self = window  # To simulate attribute assignment on the main window
         self.translation_dropdown = QComboBox()
-        self.translation_dropdown.addItems(["English", "Spanish", "Hindi", "French"])
+        self.translation_dropdown.addItems(TRANSLATION_LANGUAGES)
         self.translation_dropdown.setCurrentText(config.get("translation_language", "English"))
         
         # Create "Always use AI" checkbox first (needed for language change handler)
@@ -1422,6 +5121,17 @@ QProgressBar::chunk {
         use_edge_tts_checkbox.stateChanged.connect(lambda state: update_config_value("use_edge_tts", bool(state)))
         preferences_main_layout.addWidget(use_edge_tts_checkbox)
 
+        defer_audio_checkbox = QCheckBox("Add cards first, attach audio in the background")
+        defer_audio_checkbox.setChecked(config.get("defer_audio", False))
+        defer_audio_checkbox.stateChanged.connect(lambda state: update_config_value("defer_audio", bool(state)))
+        preferences_main_layout.addWidget(defer_audio_checkbox)
+
+        prefetch_checkbox = QCheckBox("Prepare words while typing (uses AI lookups before Add is pressed)")
+        prefetch_checkbox.setToolTip(f"At most {config.get('prefetch_budget', 25)} words per session (\"prefetch_budget\" in the config file)")
+        prefetch_checkbox.setChecked(config.get("prefetch", False))
+        prefetch_checkbox.stateChanged.connect(lambda state: update_config_value("prefetch", bool(state)))
+        preferences_main_layout.addWidget(prefetch_checkbox)
+
         if sys.platform == "win32":
             windows_dark_mode_checkbox = QCheckBox("Enable Dark Mode (Windows only)")
             windows_dark_mode_checkbox.setChecked(config.get("windows_dark_mode", False))
@@ -1434,13 +5144,160 @@ QProgressBar::chunk {
             windows_dark_mode_checkbox.stateChanged.connect(on_windows_dark_mode_changed)
             preferences_main_layout.addWidget(windows_dark_mode_checkbox)
         
-        edge_tts_note = QLabel("Note: Falls back to macOS say if Edge TTS fails")
+        edge_tts_note = QLabel("Note: Falls back to macOS say (espeak-ng on Linux/Windows) if Edge TTS fails")
         edge_tts_note.setStyleSheet("color: #888; font-size: 10px; margin-left: 20px;")
         preferences_main_layout.addWidget(edge_tts_note)
 
+        # Compression applied to uncompressed clips (macOS say / espeak-ng) before upload
+        audio_quality_row = QHBoxLayout()
+        audio_quality_row.addWidget(QLabel("Audio quality:"))
+        audio_quality_dropdown = QComboBox()
+        audio_quality_options = [("Low (24 kbps)", "low"), ("Medium (32 kbps)", "medium"), ("High (64 kbps)", "high"), ("Uncompressed", "off")]
+        for label, _ in audio_quality_options:
+            audio_quality_dropdown.addItem(label)
+        audio_quality_dropdown.setCurrentIndex(
+            next((i for i, (_, value) in enumerate(audio_quality_options) if value == config.get("audio_quality", "medium")), 1)
+        )
+        audio_quality_dropdown.currentIndexChanged.connect(lambda i: update_config_value("audio_quality", audio_quality_options[i][1]))
+        audio_quality_row.addWidget(audio_quality_dropdown)
+        audio_quality_row.addStretch()
+        preferences_main_layout.addLayout(audio_quality_row)
+
         # 10. "Check for updates now" button
         preferences_main_layout.addWidget(check_updates_now_btn)
 
+        # 11. Bulk refresh of existing notes (dictionary / AI cache / TTS voice changes)
+        refresh_notes_btn = QPushButton("Refresh existing notes…")
+        def refresh_notes():
+            global is_processing, is_processing_phrase
+            if is_processing or is_processing_phrase:
+                QMessageBox.information(window, "Refresh existing notes", "Wait for the current batch to finish before refreshing notes.")
+                return
+            confirm_box = QMessageBox(window)
+            confirm_box.setWindowTitle("Refresh existing notes")
+            confirm_box.setText(
+                "Update all Danki notes in Anki with the current dictionary and cached AI results?\n\n"
+                "Only changed fields are written and missing audio is added. "
+                "If you cancel, the next run continues where this one stopped."
+            )
+            confirm_box.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
+            # Existing clips are kept unless asked: older notes use random clip names, so
+            # this would re-synthesize nearly all of them
+            regenerate_check_box = QCheckBox("Also regenerate audio made with another voice (slow: redoes most older notes)")
+            confirm_box.setCheckBox(regenerate_check_box)
+            if confirm_box.exec_() != QMessageBox.Yes:
+                return
+            regenerate_audio = regenerate_check_box.isChecked()
+            if is_processing or is_processing_phrase:
+                return
+            # No batches (or background outbox flushes) while notes are being rewritten
+            is_processing = is_processing_phrase = True
+            stop_event = threading.Event()
+            state = {"done": 0, "total": 0, "stats": None, "error": None}
+            dialog = QtWidgets.QProgressDialog("Refreshing notes…", "Cancel", 0, 0, window)
+            dialog.setWindowModality(Qt.WindowModal)
+            dialog.setWindowTitle("Refresh existing notes")
+            dialog.setMinimumDuration(0)
+            dialog.canceled.connect(stop_event.set)
+
+            def on_progress(done, total):
+                state["done"], state["total"] = done, total
+
+            def worker():
+                try:
+                    state["stats"] = refresh_existing_notes(progress=on_progress, stop_event=stop_event,
+                                                            regenerate_audio=regenerate_audio)
+                except Exception as e:
+                    state["error"] = str(e)
+
+            thread = threading.Thread(target=worker, daemon=True)
+            timer = QTimer(window)
+
+            def poll():
+                global is_processing, is_processing_phrase
+                if state["total"]:
+                    dialog.setMaximum(state["total"])
+                    dialog.setValue(state["done"])
+                    dialog.setLabelText(f"Refreshing notes… {state['done']}/{state['total']}")
+                if thread.is_alive():
+                    return
+                timer.stop()
+                is_processing = is_processing_phrase = False
+                dialog.reset()
+                stats = state["stats"]
+                if state["error"]:
+                    QMessageBox.warning(window, "Refresh failed", f"Could not refresh notes:\n{state['error']}")
+                elif stats:
+                    summary = f"Checked {stats['checked']} of {stats['total']} notes: {stats['updated']} updated, {stats['unchanged']} unchanged, {stats['failed']} failed."
+                    if stats["cancelled"]:
+                        summary += "\n\nStopped early — run the refresh again to continue."
+                    QMessageBox.information(window, "Refresh existing notes", summary)
+
+            timer.timeout.connect(poll)
+            thread.start()
+            timer.start(200)
+        refresh_notes_btn.clicked.connect(refresh_notes)
+        preferences_main_layout.addWidget(refresh_notes_btn)
+
+        # 12. Optional offline audio pack for dictionary words (not part of the base install)
+        audio_pack_btn = QPushButton("Download offline audio pack…")
+        def fetch_audio_pack_url():
+            try:
+                return requests.get(UPDATE_JSON_URL, timeout=5).json().get("audio_pack_url")
+            except Exception as e:
+                print(f"[AUDIO PACK] Could not fetch update info: {e}")
+                return None
+
+        def download_pack():
+            url = config.get("audio_pack_url")
+            if url:
+                start_pack_download(url)
+                return
+            # update.json is fetched off the GUI thread
+            audio_pack_btn.setEnabled(False)
+            BackgroundTask(fetch_audio_pack_url, start_pack_download, window, name="audio-pack-info")
+
+        def start_pack_download(url):
+            audio_pack_btn.setEnabled(True)
+            if not url:
+                QMessageBox.information(window, "Offline audio pack", "No offline audio pack is available for download yet.")
+                return
+            state = {"received": 0, "total": 0, "error": None}
+            dialog = QtWidgets.QProgressDialog("Downloading audio pack…", None, 0, 0, window)
+            dialog.setWindowTitle("Offline audio pack")
+            dialog.setMinimumDuration(0)
+
+            def on_progress(received, total):
+                state["received"], state["total"] = received, total
+
+            def worker():
+                try:
+                    download_audio_pack(url, progress=on_progress)
+                except Exception as e:
+                    state["error"] = str(e)
+
+            thread = threading.Thread(target=worker, daemon=True)
+            timer = QTimer(window)
+
+            def poll():
+                if state["total"]:
+                    dialog.setMaximum(state["total"] // 1024)
+                    dialog.setValue(state["received"] // 1024)
+                if thread.is_alive():
+                    return
+                timer.stop()
+                dialog.reset()
+                if state["error"]:
+                    QMessageBox.warning(window, "Offline audio pack", f"Download failed:\n{state['error']}")
+                else:
+                    QMessageBox.information(window, "Offline audio pack", f"Installed {len(AUDIO_PACK)} pre-generated clips.")
+
+            timer.timeout.connect(poll)
+            thread.start()
+            timer.start(200)
+        audio_pack_btn.clicked.connect(download_pack)
+        preferences_main_layout.addWidget(audio_pack_btn)
+
         # -- Donation banner (pinned near bottom) --
         preferences_main_layout.addStretch()
         preferences_main_layout.addSpacing(10)
@@ -1486,19 +5343,18 @@ QProgressBar::chunk {
         phrase_deck_layout = QHBoxLayout()
         phrase_deck_label = QLabel("Select Anki Deck:")
         phrase_deck_combo = QComboBox()
-        phrase_deck_list = get_phrasemaster_decks()
-        phrase_deck_combo.addItems(phrase_deck_list)
-        if phrase_deck_list:
-            phrase_deck_combo.setCurrentIndex(0)
-        else:
-            phrase_deck_combo.setCurrentIndex(-1)
+        phrase_deck_combo.setPlaceholderText("Loading decks…")
+        phrase_deck_combo.setEnabled(False)
         phrase_deck_layout.addWidget(phrase_deck_label)
         phrase_deck_layout.addWidget(phrase_deck_combo)
         
         phrase_refresh_btn = QPushButton("Refresh")
         def refresh_phrase_decks():
             phrase_deck_combo.clear()
-            updated = get_phrasemaster_decks()
+            invalidate_deck_cache()
+            updated, reachable = get_phrasemaster_decks()
+            if not reachable:
+                warn_anki_unreachable(bool(updated))
             phrase_deck_combo.addItems(updated)
             if updated:
                 phrase_deck_combo.setCurrentIndex(0)
@@ -1611,11 +5467,16 @@ QProgressBar::chunk {
                     QMessageBox.critical(None, "No Internet", f"An internet connection is required to use {get_provider_display_name()}.")
                     return
 
+                MEDIA_REGISTRY.sync_from_anki()
+                MEDIA_REGISTRY.reset_stats()
+                AUDIO_CACHE.reset_stats()
+
                 sentences_raw = phrase_input_box.toPlainText()
                 context_text = context_input_box.toPlainText().strip()
                 selected_deck = phrase_deck_combo.currentText()
                 sentences = [s.strip() for s in sentences_raw.split("\n") if s.strip()]
                 phrase_output_box.clear()
+                start_outbox_flush(phrase_output_box)
                 phrase_progress_bar.setMaximum(len(sentences))
                 phrase_progress_bar.setValue(0)
 
@@ -1624,106 +5485,71 @@ QProgressBar::chunk {
                 # If you use build_phrase_prompt, pass translation_language there
                 # Example: prompt = build_phrase_prompt(phrases, include_notes, translation_language)
 
-                for sentence in sentences:
-                    prompt = (
-                        "INSTRUCTIONS: Return ONLY a JSON code block with the following fields.\n"
-                        "- german: corrected or original German sentence\n"
-                        f"- translation: {translation_language} translation of the sentence\n"
-                        "- note: (optional) a short grammar or usage note\n"
-                        "- error: (optional) only include if input is invalid\n\n"
-                        f"Context: {context_text if context_text else 'General'}\n"
-                        f"Sentence: {sentence}\n\n"
-                        "Respond ONLY with a JSON code block like:\n"
-                        "```json\n"
-                        "{\n"
-                        "  \"german\": \"Ich gehe jeden Tag zur Arbeit.\",\n"
-                        "  \"translation\": \"I go to work every day.\",\n"
-                        "  \"note\": \"'zur' is a contraction of 'zu der'.\"\n"
-                        "}\n"
-                        "```"
-                    )
+                def show_draft(entry, similarity):
+                    phrase_output_box.append(f"💡 Draft from memory ({similarity:.0%} similar): {entry['german']} — {entry['translation']}")
+                    QApplication.processEvents()
 
-                    try:
-                        content = query_ai_raw(prompt)
-                        print(f"[DEBUG] {get_provider_display_name()} raw content:\n{content}")
-                        match = re.search(r"```json\s*(\{.*?\})\s*```", content, re.DOTALL)
-                        if not match:
-                            phrase_output_box.append("❌ JSON block not found in AI response.\n")
-                            phrase_progress_bar.setValue(phrase_progress_bar.value() + 1)
-                            continue
+                # Commit stage: phrase notes are sent to Anki in chunks
+                phrase_notes = []
 
-                        try:
-                            parsed = json.loads(match.group(1))
-                            print(f"[DEBUG] Parsed JSON keys: {list(parsed.keys())}")
-                        except json.JSONDecodeError as e:
-                            phrase_output_box.append(f"❌ JSON decoding error: {str(e)}\n")
-                            phrase_progress_bar.setValue(phrase_progress_bar.value() + 1)
-                            continue
+                def commit_phrase_notes():
+                    if not phrase_notes:
+                        return
+                    batch, phrase_notes[:] = list(phrase_notes), []
+                    try:
+                        results = commit_notes(batch, offline_queue=True)
+                    except AnkiConnectUnavailable as e:
+                        results = [(False, f"Failed to send to Anki: {str(e)}")] * len(batch)
+                    except Exception as e:
+                        results = [(False, f"Anki error: {str(e)}")] * len(batch)
+                    for note, (success, msg) in zip(batch, results):
+                        german = note["fields"]["Phrase(German)"]
+                        if success:
+                            phrase_output_box.append(f"Successfully added to Anki: {german}\n")
+                        elif msg == QUEUED_OFFLINE:
+                            phrase_output_box.append(f"📥 {german} — {msg}\n")
+                        else:
+                            phrase_output_box.append(f"❌ {german} — {msg}\n")
+                    QApplication.processEvents()
 
+                for sentence in sentences:
+                    try:
+                        parsed, source = translate_phrase(sentence, context_text, translation_language, on_draft=show_draft)
                         if "error" in parsed:
-                            phrase_output_box.append(f"⚠️ {get_provider_display_name()} error: {parsed['error']}\n")
-                            phrase_progress_bar.setValue(phrase_progress_bar.value() + 1)
-                            continue
-
-                        required_keys = ["german", "translation"]
-                        if not all(parsed.get(k, "").strip() for k in required_keys):
-                            phrase_output_box.append(f"❌ Incomplete AI response. Missing 'german' or 'translation'. Parsed keys: {list(parsed.keys())}\n")
+                            phrase_output_box.append(f"{parsed['error']}\n")
                             phrase_progress_bar.setValue(phrase_progress_bar.value() + 1)
                             continue
+                        if source == "Memory":
+                            phrase_output_box.append("♻️ Found in translation memory (no AI call)")
 
                         phrase_output_box.append(f"{translation_language.upper()}: {parsed['translation']}\nDEU: {parsed['german']}\n")
                         german_text = parsed.get("german", "").strip()
                         translation_text = parsed.get("translation", "").strip()
                         note_text = parsed.get("note", "") if include_notes_checkbox.isChecked() else ""
-                        audio_text_d = german_text
-                        audio_d = ""  # Will be filled by audio field
-                        fields = {
-                            "Phrase(German)": german_text,
-                            "Translation": translation_text,
-                            "note": note_text,
-                            "audio_text_d": audio_text_d,
-                            "audio_d": audio_d,
-                        }
-                        audio_fields = []
-                        base_audio = generate_tts_audio(fields["Phrase(German)"], os.urandom(8).hex())
-                        if base_audio:
-                            audio_fields.append({
-                                "url": None,
-                                "filename": base_audio["filename"],
-                                "data": base_audio["data"],
-                                "fields": ["audio_d"]
-                            })
-                        payload = {
-                            "action": "addNote",
-                            "version": 6,
-                            "params": {
-                                "note": {
-                                    "deckName": selected_deck,
-                                    "modelName": "Phrase Auto",
-                                    "fields": fields,
-                                    "options": {"allowDuplicate": allow_duplicates},
-                                    "tags": ["auto-added"],
-                                    "audio": audio_fields
-                                }
-                            }
-                        }
-                        
-                        try:
-                            res = requests.post(ANKI_ENDPOINT, json=payload)
-                            res_json = res.json()
-                            if res_json.get("error") is None:
-                                phrase_output_box.append("Successfully added to Anki!\n")
-                            else:
-                                phrase_output_box.append(f"❌ Anki error: {res_json['error']}\n")
-                        except Exception as e:
-                            phrase_output_box.append(f"❌ Failed to send to Anki: {str(e)}\n")
+                        phrase_notes.append(build_phrase_note(german_text, translation_text, note_text, selected_deck, allow_duplicates,
+                                                              on_wait=QApplication.processEvents))
+                        if len(phrase_notes) >= COMMIT_CHUNK_SIZE:
+                            commit_phrase_notes()
 
                     except Exception as e:
                         phrase_output_box.append(f"❌ Exception: {str(e)}\n")
 
                     phrase_progress_bar.setValue(phrase_progress_bar.value() + 1)
 
+                commit_phrase_notes()
+                if MEDIA_REGISTRY.reused_clips:
+                    phrase_output_box.append(f"♻️ {MEDIA_REGISTRY.report()}")
+                if AUDIO_CACHE.hits:
+                    phrase_output_box.append(f"♻️ {AUDIO_CACHE.report()}")
+                MEDIA_REGISTRY.save()
+                AUDIO_CACHE.save()
                 phrase_output_box.append("Done.")
+                tm_stats = TRANSLATION_MEMORY.stats()
+                print(
+                    f"[TM] {len(TRANSLATION_MEMORY)} phrases stored, hit rate {tm_stats['hit_rate']:.0%} "
+                    f"({tm_stats['exact_hits']} exact, {tm_stats['fuzzy_hits']} fuzzy), "
+                    f"avg lookup {tm_stats['avg_lookup_ms']:.2f} ms"
+                )
             finally:
                 is_processing_phrase = False
                 phrase_add_btn.setEnabled(True)
@@ -1783,20 +5609,35 @@ QProgressBar::chunk {
         central_widget.setLayout(layout)
         # Slightly shorter default height so it fits on smaller screens
         window.resize(500, 440)
+        STARTUP_TRACE.expect("first paint", "decks loaded", "dictionary loaded")
+        PaintWatcher(window, lambda: STARTUP_TRACE.mark("first paint"))
+        STARTUP_TRACE.mark("window built")
         window.show()
         refresh_window_icon(window, app_icon, icon_path)
         QTimer.singleShot(100, lambda: refresh_window_icon(window, app_icon, icon_path))
         QTimer.singleShot(400, lambda: refresh_window_icon(window, app_icon, icon_path))
         QTimer.singleShot(1000, lambda: refresh_window_icon(window, app_icon, icon_path))
 
-        def check_for_update():
-            # Respect config setting
-            if not config.get("check_updates_on_startup", True) and not getattr(check_for_update, "_manual", False):
-                return
+        def fetch_update_info():
             try:
                 response = requests.get(UPDATE_JSON_URL, timeout=5)
                 response.raise_for_status()
-                data = response.json()
+                return response.json()
+            except Exception as e:
+                print(f"[Update Check] Failed to fetch update info: {e}")
+                return None
+
+        def check_for_update(manual=False):
+            # Respect config setting
+            if not config.get("check_updates_on_startup", True) and not manual:
+                return
+            # Fetched on a worker thread; the dialog is shown when the answer arrives
+            BackgroundTask(fetch_update_info, lambda data: show_update_info(data, manual), window, name="update-check")
+
+        def show_update_info(data, manual):
+            if data is None:
+                return
+            try:
                 remote_version = data.get("version", "").strip()
                 message = data.get("message", "").strip()
                 url = data.get("url", "").strip()
@@ -1821,12 +5662,70 @@ QProgressBar::chunk {
                     config["check_updates_on_startup"] = not dont_check_box.isChecked()
                     save_config(config)
                 else:
-                    if getattr(check_for_update, "_manual", False):
+                    if manual:
                         QMessageBox.information(None, "Up to Date", f"You're already using the latest version ({CURRENT_VERSION}).")
             except Exception as e:
-                print(f"[Update Check] Failed to fetch update info: {e}")
-
+                print(f"[Update Check] Failed to read update info: {e}")
+
+        # Deck discovery and the duplicate index sync run off the GUI thread
+        def fill_deck_combos(classified):
+            for combo, key in ((deck_combo, "wordmaster"), (phrase_deck_combo, "phrasemaster")):
+                decks = classified.get(key, [])
+                selected = combo.currentText()
+                if decks == [combo.itemText(i) for i in range(combo.count())] and combo.isEnabled():
+                    continue
+                combo.clear()
+                combo.addItems(decks)
+                combo.setCurrentIndex(decks.index(selected) if selected in decks else (0 if decks else -1))
+                combo.setEnabled(True)
+
+        def revalidate_in_background():
+            DUPLICATE_INDEX.maybe_resync()
+            WARM_SNAPSHOT.save()
+
+        def show_startup_decks(result):
+            classified, reachable = result
+            fill_deck_combos(classified)
+            STARTUP_TRACE.mark("decks loaded")
+            threading.Thread(target=revalidate_in_background, name="duplicate-sync", daemon=True).start()
+            if not reachable:
+                warn_anki_unreachable(bool(classified.get("wordmaster") or classified.get("phrasemaster")))
+
+        def load_decks_in_background():
+            warm_decks = last_known_decks()
+            if warm_decks:
+                fill_deck_combos(warm_decks)
+                STARTUP_TRACE.mark("decks loaded")
+            BackgroundTask(fetch_classified_decks, show_startup_decks, window, name="deck-discovery")
+
+        # Retry queued notes periodically so they land as soon as Anki is running. The
+        # AnkiConnect round-trips run on a worker thread; one flush at a time.
+        outbox_flush = {"running": False}
+        def start_outbox_flush(log, on_done=None):
+            if outbox_flush["running"]:
+                return
+            outbox_flush["running"] = True
+            def show_outbox_flush(flushed):
+                outbox_flush["running"] = False
+                for line in describe_outbox_flush(flushed):
+                    log.append(line)
+                if on_done:
+                    on_done()
+            BackgroundTask(flush_outbox_if_reachable, show_outbox_flush, window, name="outbox-flush")
+        def flush_outbox_in_background():
+            if is_processing or is_processing_phrase:
+                return
+            start_outbox_flush(word_log, on_done=AUDIO_BACKFILL.start)
+        outbox_timer = QTimer(window)
+        outbox_timer.timeout.connect(flush_outbox_in_background)
+        outbox_timer.start(OUTBOX_FLUSH_INTERVAL_MS)
+        QTimer.singleShot(2000, flush_outbox_in_background)
+        QTimer.singleShot(1500, offer_batch_resume)
+
+        load_decks_in_background()
         check_for_update()
+        app.aboutToQuit.connect(WARM_SNAPSHOT.save)
+        app.aboutToQuit.connect(save_caches)  # e.g. words prepared while typing but never added
         sys.exit(app.exec_())
     except Exception as e:
         import traceback
@@ -1834,6 +5733,627 @@ QProgressBar::chunk {
         traceback.print_exc()
 
 
+# === LOCAL DAEMON ===
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 8767        # AnkiConnect itself listens on 8765
+DAEMON_AI_RATE = 60         # AI requests per minute across all jobs (default for `serve`)
+DAEMON_SLICE = 25           # items a job hands over before the scheduler turns to the next queued job
+DAEMON_MAX_ITEMS = 10000    # words / phrases per submission
+DAEMON_MAX_BODY = 1024 * 1024
+DAEMON_JOB_HISTORY = 200    # finished jobs kept for status queries
+DAEMON_IDLE_WORK_MIN_SECONDS = 60    # idle retries of the outbox and audio backfill...
+DAEMON_IDLE_WORK_MAX_SECONDS = 900   # ...backing off up to this while Anki is unreachable
+DAEMON_TOKEN_PATH = Path(os.path.expanduser("~/.danki/daemon_token"))
+
+def daemon_token():
+    """Shared secret clients send as X-Danki-Token (created on first use, readable only by the user)."""
+    if DAEMON_TOKEN_PATH.exists():
+        return DAEMON_TOKEN_PATH.read_text().strip()
+    DAEMON_TOKEN_PATH.parent.mkdir(parents=True, exist_ok=True)
+    token = secrets.token_urlsafe(24)
+    DAEMON_TOKEN_PATH.write_text(token)
+    os.chmod(DAEMON_TOKEN_PATH, 0o600)
+    return token
+
+def run_phrase_batch(sentences, deck_name, context_text="", translation_language="English", allow_duplicates=False,
+                     include_notes=True, on_result=None, stop_event=None):
+    """Translate phrases and add them as Phrase Auto notes (the PhraseMaster flow without the GUI).
+
+    Calls `on_result({"index", "phrase", "status", "detail"})` per phrase; returns the summary.
+    """
+    on_result = on_result or (lambda record: None)
+    summary = {"total": len(sentences), "added": 0, "queued": 0, "failed": 0, "duplicates": 0}
+    pending = []  # (index, sentence, note)
+
+    def finish(index, sentence, status, detail=None):
+        summary[status] += 1
+        on_result({"index": index, "phrase": sentence, "status": status, "detail": detail})
+
+    def commit_pending():
+        if not pending:
+            return
+        batch, pending[:] = list(pending), []
+        try:
+            results = commit_notes([note for _, _, note in batch], offline_queue=True)
+        except Exception as e:
+            results = [(False, f"Anki error: {e}")] * len(batch)
+        for (index, sentence, _), (success, msg) in zip(batch, results):
+            if success:
+                finish(index, sentence, "added", msg)
+            elif msg == QUEUED_OFFLINE:
+                finish(index, sentence, "queued")
+            elif "duplicate" in str(msg).lower():
+                finish(index, sentence, "duplicates")
+            else:
+                finish(index, sentence, "failed", str(msg))
+
+    for index, sentence in enumerate(sentences):
+        if stop_event is not None and stop_event.is_set():
+            break
+        try:
+            parsed, source = translate_phrase(sentence, context_text, translation_language)
+            if "error" in parsed:
+                finish(index, sentence, "failed", parsed["error"])
+                continue
+            note = build_phrase_note(parsed.get("german", "").strip(), parsed.get("translation", "").strip(),
+                                     parsed.get("note", "") if include_notes else "", deck_name, allow_duplicates)
+            pending.append((index, sentence, note))
+            if len(pending) >= COMMIT_CHUNK_SIZE:
+                commit_pending()
+        except Exception as e:
+            finish(index, sentence, "failed", str(e))
+    commit_pending()
+    return summary
+
+class DaemonJob:
+    """One submission: words or phrases plus their settings, results and status."""
+
+    def __init__(self, job_id, kind, items, settings):
+        self.id = job_id
+        self.kind = kind            # "words" or "phrases"
+        self.items = items
+        self.settings = settings
+        self.status = "queued"      # queued → running → done / cancelled
+        self.position = 0           # items handed to the pipeline so far
+        self.results = []
+        self.summary = {"total": len(items), "added": 0, "queued": 0, "failed": 0, "duplicates": 0}
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.stop_event = threading.Event()
+        self.changed = threading.Condition()
+        self.turn = threading.Event()          # set by the scheduler: hand over the next slice
+        self.slice_fed = threading.Event()     # set once that slice is in the pipeline
+        self.runner = None                     # thread running a words job's pipeline
+
+    def add_result(self, record):
+        with self.changed:
+            self.results.append(record)
+            if record.get("status") in self.summary:
+                self.summary[record["status"]] += 1
+            self.changed.notify_all()
+
+    def words_in_turns(self):
+        """The job's words for its pipeline, a DAEMON_SLICE at a time as the scheduler grants turns."""
+        for offset in range(0, len(self.items), DAEMON_SLICE):
+            while not self.turn.wait(0.2):
+                if self.stop_event.is_set():
+                    return
+            if self.stop_event.is_set():
+                return
+            yield from self.items[offset:offset + DAEMON_SLICE]
+            self.position = min(offset + DAEMON_SLICE, len(self.items))
+            self.turn.clear()
+            self.slice_fed.set()
+
+    def set_status(self, status):
+        with self.changed:
+            self.status = status
+            if status in ("done", "cancelled"):
+                self.finished = time.time()
+            self.changed.notify_all()
+
+    def is_finished(self):
+        return self.status in ("done", "cancelled")
+
+    def to_dict(self):
+        return {"id": self.id, "kind": self.kind, "status": self.status, "summary": dict(self.summary),
+                "results": len(self.results), "settings": self.settings, "created": self.created,
+                "started": self.started, "finished": self.finished}
+
+class DaemonScheduler:
+    """Runs submitted jobs a slice at a time in round-robin order, so a one-word
+    submission is not stuck behind a ten-thousand-word import.
+
+    A words job keeps one WordPipeline for its whole life (its caches are saved
+    once, when it ends); the pipeline's feed waits for the job's turn before each
+    slice. Phrase jobs run a slice per turn.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.queue = deque()
+        self.lock = threading.Condition()
+        self.next_id = 1
+        self.idle_delay = DAEMON_IDLE_WORK_MIN_SECONDS
+        self.next_idle_work = 0.0
+        self.thread = threading.Thread(target=self._run, name="daemon-scheduler", daemon=True)
+        self.thread.start()
+
+    def submit(self, kind, items, settings):
+        with self.lock:
+            job = DaemonJob(str(self.next_id), kind, items, settings)
+            self.next_id += 1
+            self.jobs[job.id] = job
+            self.queue.append(job)
+            self._prune()
+            self.lock.notify()
+        print(f"[DAEMON] Job {job.id}: {len(items)} {kind} for deck '{settings['deck']}'")
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.stop_event.set()
+        with self.lock:
+            if job in self.queue:
+                # Not running right now: no need to wait for the scheduler to get to it
+                self.queue.remove(job)
+                job.set_status("cancelled")
+        return job
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.is_finished()]
+        for job_id in finished[:max(0, len(finished) - DAEMON_JOB_HISTORY)]:
+            del self.jobs[job_id]
+
+    def _run(self):
+        while True:
+            with self.lock:
+                if not self.queue:
+                    self.lock.wait(OUTBOX_FLUSH_INTERVAL_MS / 1000)
+                job = self.queue.popleft() if self.queue else None
+            if job is None:
+                self._idle_work()
+                continue
+            try:
+                self._run_slice(job)
+            except Exception as e:
+                print(f"[DAEMON] Job {job.id} failed: {e}")
+                job.stop_event.set()
+            if job.stop_event.is_set() or job.position >= len(job.items):
+                if job.runner is None:
+                    self._finish(job)
+                # A words job finishes when its pipeline has drained (see _run_words)
+            else:
+                with self.lock:
+                    self.queue.append(job)
+
+    def _finish(self, job):
+        if not job.is_finished():
+            job.set_status("cancelled" if job.stop_event.is_set() else "done")
+        print(f"[DAEMON] Job {job.id} {job.status}: {job.summary}")
+
+    def _idle_work(self):
+        """Retry queued notes and owed audio, backing off while there is nothing Anki will take."""
+        if time.monotonic() < self.next_idle_work or not (len(OUTBOX) or len(AUDIO_BACKFILL)):
+            return
+        flushed = flush_outbox_if_reachable()
+        if flushed is None and len(OUTBOX):
+            # Anki unreachable (or the flush failed): wait longer before the next attempt
+            self.idle_delay = min(self.idle_delay * 2, DAEMON_IDLE_WORK_MAX_SECONDS)
+        else:
+            self.idle_delay = DAEMON_IDLE_WORK_MIN_SECONDS
+            AUDIO_BACKFILL.start()
+        self.next_idle_work = time.monotonic() + self.idle_delay
+
+    def _run_slice(self, job):
+        if job.started is None:
+            job.started = time.time()
+            job.set_status("running")
+        s = job.settings
+        if job.kind == "phrases":
+            offset = job.position
+            items = job.items[offset:offset + DAEMON_SLICE]
+            job.position += len(items)
+            run_phrase_batch(items, s["deck"], s["context"], s["language"], s["allow_duplicates"], s["include_notes"],
+                             on_result=lambda record: job.add_result({**record, "index": record["index"] + offset}),
+                             stop_event=job.stop_event)
+            return
+        if job.runner is None:
+            job.runner = threading.Thread(target=self._run_words, args=(job,), name=f"daemon-job-{job.id}", daemon=True)
+            job.runner.start()
+        # Let the pipeline take one slice; earlier words keep flowing through its later stages
+        job.slice_fed.clear()
+        job.turn.set()
+        while not job.slice_fed.wait(0.2):
+            if not job.runner.is_alive():
+                break
+
+    def _run_words(self, job):
+        s = job.settings
+        pipeline = WordPipeline(job.words_in_turns(), s["deck"], s["note_type"], s["language"],
+                                allow_duplicates=s["allow_duplicates"], always_use_api=s["always_use_api"],
+                                defer_audio=s["defer_audio"], on_message=lambda text: print(f"[DAEMON] Job {job.id}: {text.rstrip()}"),
+                                on_result=job.add_result, stop_event=job.stop_event)
+        try:
+            pipeline.run()
+        except Exception as e:
+            print(f"[DAEMON] Job {job.id} failed: {e}")
+            job.stop_event.set()
+        finally:
+            self._finish(job)
+
+def parse_job_request(payload, config):
+    """Validate a POST /jobs body. Returns (kind, items, settings) or raises ValueError."""
+    if not isinstance(payload, dict):
+        raise ValueError("expected a JSON object")
+    if "phrases" in payload:
+        kind, items = "phrases", payload["phrases"]
+        if isinstance(items, str):
+            items = items.split("\n")
+    else:
+        kind, items = "words", payload.get("words", payload.get("text", ""))
+        if isinstance(items, str):
+            items = list(iter_words(items.splitlines()))
+    if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+        raise ValueError("'words' / 'phrases' must be a list of strings or a string")
+    items = [item.strip() for item in items if item.strip()]
+    if not items:
+        raise ValueError("nothing to add")
+    if len(items) > DAEMON_MAX_ITEMS:
+        raise ValueError(f"at most {DAEMON_MAX_ITEMS} items per job")
+    deck = payload.get("deck")
+    if not deck or not isinstance(deck, str):
+        raise ValueError("'deck' is required")
+    pick = lambda key, config_key, default=False: bool(payload[key]) if key in payload else config.get(config_key, default)
+    settings = {
+        "deck": deck,
+        "language": payload.get("language") or config.get("translation_language", "English"),
+        "allow_duplicates": pick("allow_duplicates", "allow_duplicates", True),
+    }
+    if kind == "phrases":
+        settings["context"] = str(payload.get("context", ""))
+        settings["include_notes"] = pick("include_notes", "include_notes", True)
+    else:
+        settings["note_type"] = NOTE_TYPE_ADVANCED if pick("advanced", "use_advanced_cards") else NOTE_TYPE
+        settings["always_use_api"] = pick("always_use_api", "always_use_api")
+        settings["defer_audio"] = pick("defer_audio", "defer_audio")
+    return kind, items, settings
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    """Localhost JSON API (see run_daemon). Every endpoint except /health needs the daemon token."""
+    server_version = f"Danki/{CURRENT_VERSION}"
+
+    def log_message(self, format, *args):
+        print(f"[DAEMON] {self.command} {self.path.split('?')[0]} → {args[1] if len(args) > 1 else ''}")
+
+    def _cors(self):
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type, X-Danki-Token, Authorization")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, DELETE, OPTIONS")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self._cors()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        token = self.headers.get("X-Danki-Token") or ""
+        auth = self.headers.get("Authorization", "")
+        if auth.startswith("Bearer "):
+            token = auth[len("Bearer "):]
+        if secrets.compare_digest(token.strip(), self.server.token):
+            return True
+        self._send_json(401, {"error": f"missing or wrong X-Danki-Token (see {DAEMON_TOKEN_PATH})"})
+        return False
+
+    def _route(self):
+        """Returns (path parts, query dict)."""
+        url = urlparse(self.path)
+        return [part for part in url.path.split("/") if part], parse_qs(url.query)
+
+    def _job(self, parts):
+        job = self.server.scheduler.get(parts[1]) if len(parts) >= 2 else None
+        if job is None:
+            self._send_json(404, {"error": "no such job"})
+        return job
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self._cors()
+        self.end_headers()
+
+    def do_GET(self):
+        parts, query = self._route()
+        if parts == ["health"]:
+            self._send_json(200, {"status": "ok", "version": CURRENT_VERSION,
+                                  "dictionary": len(GERMAN_DICT) if GERMAN_DICT else 0,
+                                  "jobs_waiting": len(self.server.scheduler.queue)})
+            return
+        if not parts or parts[0] != "jobs":
+            self._send_json(404, {"error": "unknown endpoint"})
+            return
+        if not self._authorized():
+            return
+        if len(parts) == 1:
+            self._send_json(200, {"jobs": self.server.scheduler.list()})
+            return
+        job = self._job(parts)
+        if job is None:
+            return
+        try:
+            after = max(0, int((query.get("after") or ["0"])[0]))
+        except ValueError:
+            self._send_json(400, {"error": "'after' must be a number"})
+            return
+        if len(parts) == 2:
+            self._send_json(200, job.to_dict())
+        elif parts[2] == "results":
+            with job.changed:
+                results = job.results[after:]
+            self._send_json(200, {"status": job.status, "results": results, "next": after + len(results)})
+        elif parts[2] == "stream":
+            self._stream(job, after)
+        else:
+            self._send_json(404, {"error": "unknown endpoint"})
+
+    def _stream(self, job, sent):
+        """NDJSON: one line per result as it happens, then a final {"job": ...} line."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self._cors()
+        self.end_headers()
+        try:
+            while True:
+                with job.changed:
+                    while len(job.results) <= sent and not job.is_finished():
+                        job.changed.wait(15)
+                    batch = job.results[sent:]
+                    finished = job.is_finished()
+                for record in batch:
+                    self.wfile.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+                self.wfile.flush()
+                sent += len(batch)
+                if finished:
+                    self.wfile.write((json.dumps({"job": job.to_dict()}, ensure_ascii=False) + "\n").encode("utf-8"))
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def do_POST(self):
+        parts, _ = self._route()
+        if parts != ["jobs"]:
+            self._send_json(404, {"error": "unknown endpoint"})
+            return
+        if not self._authorized():
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > DAEMON_MAX_BODY:
+            self._send_json(413, {"error": "request too large"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            kind, items, settings = parse_job_request(payload, self.server.config)
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        job = self.server.scheduler.submit(kind, items, settings)
+        self._send_json(202, job.to_dict())
+
+    def do_DELETE(self):
+        parts, _ = self._route()
+        if len(parts) != 2 or parts[0] != "jobs":
+            self._send_json(404, {"error": "unknown endpoint"})
+            return
+        if not self._authorized():
+            return
+        job = self.server.scheduler.cancel(parts[1])
+        if job is None:
+            self._send_json(404, {"error": "no such job"})
+        else:
+            self._send_json(200, job.to_dict())
+
+def run_daemon(host=DAEMON_HOST, port=DAEMON_PORT, ai_rate=DAEMON_AI_RATE):
+    """`danki serve`: keep dictionary, caches and connections warm and take jobs over localhost HTTP.
+
+    GET  /health                      no token needed
+    POST /jobs                        {"words": [...] | "text": "a, b", "deck", ...} or {"phrases": [...], "deck", "context"}
+    GET  /jobs, /jobs/<id>            status and summary
+    GET  /jobs/<id>/results?after=N   results from N on
+    GET  /jobs/<id>/stream?after=N    NDJSON results as they happen
+    DELETE /jobs/<id>                 cancel
+    """
+    config = load_config()
+    init_backend(config)
+    AI_RATE_LIMITER.per_minute = ai_rate
+    DUPLICATE_INDEX.maybe_resync()
+    MEDIA_REGISTRY.sync_from_anki()
+    server = ThreadingHTTPServer((host, port), DaemonRequestHandler)
+    server.daemon_threads = True
+    server.config = config
+    server.token = daemon_token()
+    server.scheduler = DaemonScheduler()
+    print(f"[DAEMON] Listening on http://{host}:{port} (AI rate {ai_rate or 'unlimited'}/min); token in {DAEMON_TOKEN_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("[DAEMON] Shutting down")
+    finally:
+        server.server_close()
+        WARM_SNAPSHOT.save()
+        save_caches()
+
+# === HEADLESS CLI ===
+EXIT_OK = 0             # every word added, queued offline or already in Anki
+EXIT_WORDS_FAILED = 1   # at least one word failed
+EXIT_USAGE = 2          # bad arguments or unreadable input
+EXIT_NO_ANKI = 3        # AnkiConnect unreachable (and not exporting)
+EXIT_INTERRUPTED = 130
+
+def iter_words(stream):
+    """Words from a text stream: comma and/or newline separated, like the WordMaster box."""
+    for line in stream:
+        for word in line.split(","):
+            word = word.strip()
+            if word:
+                yield word
+
+def build_cli_parser():
+    parser = argparse.ArgumentParser(prog="danki", description="Danki — German vocabulary to Anki. Without a command the GUI starts.")
+    commands = parser.add_subparsers(dest="command")
+    add = commands.add_parser("add", help="add words headlessly (no Qt / display needed)",
+                              description="Stream words through dictionary → AI → TTS → Anki and print one JSON result per word.")
+    add.add_argument("input", nargs="?", default="-",
+                     help="word file: text (comma or newline separated), CSV/TSV, Anki export (.txt/.apkg) or "
+                          "Kindle vocab.db; '-' or omitted reads stdin")
+    add.add_argument("--deck", help="target deck (required unless --resume)")
+    add.add_argument("--advanced", action=argparse.BooleanOptionalAction, default=None,
+                     help="use the advanced note type (default: the Preferences setting)")
+    add.add_argument("--language", help="translation language (default: the Preferences setting)")
+    add.add_argument("--allow-duplicates", action=argparse.BooleanOptionalAction, default=None)
+    add.add_argument("--always-use-api", action=argparse.BooleanOptionalAction, default=None)
+    add.add_argument("--defer-audio", action=argparse.BooleanOptionalAction, default=None,
+                     help="add text-only notes first and attach audio afterwards (waits for the audio before exiting)")
+    add.add_argument("--export", metavar="APKG", help="write an .apkg file instead of adding through AnkiConnect")
+    add.add_argument("--workers", type=int, default=PIPELINE_AI_WORKERS, help="words looked up / sent to the AI at once")
+    add.add_argument("--tts-workers", type=int, help="clips synthesized at once")
+    add.add_argument("--output", "-o", default="-", help="JSONL results file ('-' for stdout)")
+    add.add_argument("--resume", action="store_true", help="resume the newest unfinished batch instead of reading input")
+    add.add_argument("--quiet", "-q", action="store_true", help="no progress messages on stderr")
+    serve = commands.add_parser("serve", help="run the local HTTP daemon (JSON API on localhost)",
+                                description="Keep Danki warm and accept words / phrases over a localhost JSON API.")
+    serve.add_argument("--host", default=DAEMON_HOST, help="interface to bind (default: localhost only)")
+    serve.add_argument("--port", type=int, default=DAEMON_PORT)
+    serve.add_argument("--ai-rate", type=int, default=DAEMON_AI_RATE, help="AI requests per minute across all jobs (0 = unlimited)")
+    return parser
+
+def run_headless_add(args, results_out=None):
+    """`danki add`: returns an exit code. JSONL goes to --output (or `results_out`, default
+    stdout); everything else to stderr."""
+    results_out = results_out or sys.stdout
+    # The module's diagnostic prints go to stderr while the command runs, never into the JSONL
+    with contextlib.redirect_stdout(sys.stderr):
+        return _headless_add(args, results_out)
+
+def _headless_add(args, results_out):
+    config = load_config()
+    init_backend(config)
+    if args.tts_workers:
+        set_tts_concurrency(args.tts_workers)
+    if not args.export:
+        try:
+            ANKI.invoke("version", timeout=5)
+        except AnkiConnectUnavailable:
+            print("❌ Anki is not running or AnkiConnect is not enabled (use --export to build an .apkg instead)", file=sys.stderr)
+            return EXIT_NO_ANKI
+
+    if args.output != "-":
+        results_out = open(args.output, "a", encoding="utf-8")
+    write_lock = threading.Lock()
+    importer = None
+    def on_result(record):
+        if importer is not None and record["word"] in importer.contexts:
+            record["context"] = importer.contexts[record["word"]]
+        with write_lock:
+            results_out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            results_out.flush()
+    on_message = (lambda text: None) if args.quiet else (lambda text: print(text.rstrip("\n"), file=sys.stderr))
+    callbacks = {"on_message": on_message, "on_result": on_result, "ai_workers": args.workers}
+
+    if args.resume:
+        journals = unfinished_batches()
+        if not journals:
+            print("Nothing to resume: no unfinished batch", file=sys.stderr)
+            return EXIT_OK
+        print(f"Resuming batch: {journals[0].describe()}", file=sys.stderr)
+        pipeline = WordPipeline.from_journal(journals[0], **callbacks)
+    else:
+        if not args.deck:
+            print("--deck is required", file=sys.stderr)
+            return EXIT_USAGE
+        pick = lambda value, key, default=False: config.get(key, default) if value is None else value
+        note_type = NOTE_TYPE_ADVANCED if pick(args.advanced, "use_advanced_cards") else NOTE_TYPE
+        allow_duplicates = pick(args.allow_duplicates, "allow_duplicates", True)
+        if args.input == "-":
+            words = iter_words(sys.stdin)  # streamed (and so not journaled)
+        else:
+            # A word file is read up front so the batch can be journaled and resumed
+            try:
+                importer = WordImport(args.input, note_type, allow_duplicates=allow_duplicates)
+                words = list(importer)
+            except (OSError, ValueError, sqlite3.Error, zipfile.BadZipFile) as e:
+                print(f"❌ Cannot read {args.input}: {e}", file=sys.stderr)
+                return EXIT_USAGE
+            print(f"📂 {importer.describe()}", file=sys.stderr)
+        pipeline = WordPipeline(
+            words, args.deck, note_type,
+            args.language or config.get("translation_language", "English"),
+            allow_duplicates=allow_duplicates,
+            always_use_api=pick(args.always_use_api, "always_use_api"),
+            defer_audio=pick(args.defer_audio, "defer_audio"), export_path=args.export, **callbacks,
+        )
+        if isinstance(words, list) and not args.export:
+            pipeline.journal = BatchJournal.create(words, pipeline.settings())
+
+    runner = threading.Thread(target=pipeline.run, name="word-pipeline", daemon=True)
+    runner.start()
+    interrupted = False
+    while runner.is_alive():
+        try:
+            runner.join(0.5)
+        except KeyboardInterrupt:
+            if interrupted:
+                raise
+            interrupted = True
+            print("⏹️ Cancelling after the words in flight (Ctrl+C again to quit now)…", file=sys.stderr)
+            pipeline.cancel()
+    if pipeline.defer_audio and AUDIO_BACKFILL.thread is not None and not interrupted:
+        print(f"🔊 Attaching audio to {len(AUDIO_BACKFILL)} notes…", file=sys.stderr)
+        AUDIO_BACKFILL.thread.join()
+
+    WARM_SNAPSHOT.save()
+    summary = pipeline.summary
+    rate = summary["total"] / summary["seconds"] if summary.get("seconds") else 0
+    print(f"Done: {summary['added']} added, {summary['queued']} queued, {summary['duplicates']} duplicates, "
+          f"{summary['failed']} failed of {summary['total']} in {summary.get('seconds', 0):.1f}s ({rate:.1f} words/s)",
+          file=sys.stderr)
+    if args.output != "-":
+        results_out.close()
+    if interrupted:
+        return EXIT_INTERRUPTED
+    return EXIT_WORDS_FAILED if summary["failed"] or summary.get("error") else EXIT_OK
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if "--startup-trace" in argv:
+        STARTUP_TRACE.enabled = True
+        argv = [arg for arg in argv if arg != "--startup-trace"]
+    # Anything that is not a CLI command (e.g. macOS's -psn_ argument) starts the GUI
+    if not argv or argv[0] not in ("add", "serve", "-h", "--help"):
+        run_gui()
+        return
+    args = build_cli_parser().parse_args(argv)
+    if args.command == "add":
+        sys.exit(run_headless_add(args))
+    if args.command == "serve":
+        run_daemon(args.host, args.port, args.ai_rate)
+        return
+    build_cli_parser().print_help()
+
 # === RUN ===
 if __name__ == "__main__":
-    run_gui()   
\ No newline at end of file
+    main()   
\ No newline at end of file
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Build the optional offline audio pack for the German-English dictionary.
+
+Synthesizes the base-word and example-sentence audio for every dictionary entry
+once, and writes a content-addressed pack Danki can load instead of running TTS:
+
+    audio_pack/index.json   {"engine", "voice", "clips": {clip key: [media filename, offset, length]}}
+    audio_pack/clips.bin    all clips concatenated (each distinct clip stored once)
+
+Clip keys and media filenames are the ones Danki uses at runtime for the same
+engine and voice, so the pack is only used by matching installs and clips
+already in a user's Anki collection are recognised. Uncompressed engines go
+through the same compression stage as the app ("audio_quality" in the Danki
+config). Each clip is retried a few times; if any still fail the script exits
+with status 1, and re-running resumes the build. Zip index.json + clips.bin to
+publish the pack as `audio_pack_url` in update.json.
+
+Usage: python build_audio_pack.py [--engine edge-tts|macos-say|espeak-ng] [--workers 8] [--dict FILE ...]
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+import danki_app  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DICTIONARY_FILES = [os.path.join(HERE, name) for name in ("german_english_dict_10k.json", "german_english_dict_next_10k.json")]
+RETRIES = 4          # attempts per clip
+RETRY_BACKOFF = 2.0  # seconds before the first retry, doubled for each further one
+
+
+def edge_tts_clip(text, clip_hash):
+    """Edge TTS without the app's session kill switch (a pack build must not give up after 3 errors)."""
+    try:
+        audio = danki_app.EDGE_TTS_WORKER.synthesize(text, danki_app.EDGE_TTS_VOICE)
+    except Exception as e:
+        print(f"  Edge TTS failed for {text!r}: {e}")
+        return None
+    return danki_app.clip_from_bytes(audio, f"edge-tts-{clip_hash}.mp3")
+
+
+ENGINES = {
+    "edge-tts": (danki_app.EDGE_TTS_VOICE, "mp3", edge_tts_clip),
+    "macos-say": (danki_app.MACOS_SAY_VOICE, "aiff", danki_app.generate_macos_say_audio),
+    "espeak-ng": (danki_app.ESPEAK_VOICE, "wav", danki_app.generate_espeak_audio),
+}
+
+
+def clip_bytes(clip):
+    """Raw audio of a clip dict (spooled files are removed after reading)."""
+    if clip.get("path"):
+        with open(clip["path"], "rb") as f:
+            data = f.read()
+        os.unlink(clip["path"])
+        return data
+    return base64.b64decode(clip["data"])
+
+
+def entry_texts(dictionary, engine, voice):
+    """Every distinct text Danki speaks for the dictionary's notes, by pack key."""
+    texts = {}
+    for word, entry in dictionary.items():
+        fields, audio_texts = danki_app.word_note_fields(danki_app.convert_dict_to_anki_format(entry, word))
+        if fields is None:
+            continue
+        for text in audio_texts.values():
+            texts.setdefault(danki_app.audio_pack_key(engine, voice, text), text)
+    return texts
+
+
+def synthesize(generator, engine, voice, ext, text):
+    """One clip, named and compressed exactly as generate_tts_audio would (retried on failure)."""
+    clip_hash, filename, _, encoder = danki_app.clip_name(engine, voice, ext, text)
+    clip = None
+    for attempt in range(RETRIES):
+        if attempt:
+            time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+        clip = generator(text, clip_hash)
+        if clip:
+            break
+    if clip and encoder:
+        clip = danki_app.encode_clip(clip, filename, encoder)
+    return clip
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline dictionary audio pack")
+    parser.add_argument("--dict", nargs="+", help="dictionary JSON files to read (default: the 10k and next 10k dictionaries)")
+    parser.add_argument("--out", default=os.path.join(HERE, "audio_pack"), help="output directory")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="edge-tts")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"Building offline audio pack ({args.engine})")
+    print("=" * 60)
+
+    paths = args.dict or [p for p in DICTIONARY_FILES if os.path.exists(p)]
+    missing = [p for p in paths if not os.path.exists(p)]
+    if not paths or missing:
+        print(f"❌ Dictionary not found: {', '.join(missing or DICTIONARY_FILES)}")
+        sys.exit(1)
+    dictionary = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            dictionary.update(json.load(f)["dictionary"])
+
+    base_voice, ext, generator = ENGINES[args.engine]
+    if args.engine == "edge-tts" and not danki_app.EDGE_TTS_AVAILABLE:
+        print("❌ edge-tts is not installed (pip install edge-tts)")
+        sys.exit(1)
+    # The app's clip key includes the compression quality for uncompressed engines
+    voice = danki_app.clip_name(args.engine, base_voice, ext, "")[2]
+    texts = entry_texts(dictionary, args.engine, voice)
+    print(f"✓ {len(dictionary)} entries from {len(paths)} files, {len(texts)} distinct texts ({voice})")
+    os.makedirs(args.out, exist_ok=True)
+    index_path = os.path.join(args.out, danki_app.AUDIO_PACK_INDEX)
+    blob_path = os.path.join(args.out, danki_app.AUDIO_PACK_BLOB)
+
+    index = {"engine": args.engine, "voice": voice, "clips": {}}
+    if os.path.exists(index_path) and os.path.exists(blob_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous.get("engine") == args.engine and previous.get("voice") == voice:
+            index = previous
+            print(f"✓ Resuming: {len(index['clips'])} clips already built")
+    if not index["clips"]:
+        open(blob_path, "wb").close()
+    offsets = {entry[0]: entry for entry in index["clips"].values()}
+
+    todo = {key: text for key, text in texts.items() if key not in index["clips"]}
+    started = time.time()
+    failed = 0
+    with open(blob_path, "r+b") as blob, ThreadPoolExecutor(max_workers=args.workers) as pool:
+        blob.seek(0, os.SEEK_END)
+        futures = {
+            pool.submit(synthesize, generator, args.engine, base_voice, ext, text): key
+            for key, text in todo.items()
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            key = futures[future]
+            clip = future.result()
+            if not clip:
+                failed += 1
+                continue
+            filename = clip["filename"]
+            if filename not in offsets:
+                data = clip_bytes(clip)
+                offsets[filename] = [filename, blob.tell(), len(data)]
+                blob.write(data)
+            elif clip.get("path"):
+                os.unlink(clip["path"])
+            index["clips"][key] = offsets[filename]
+            if done % 500 == 0:
+                blob.flush()
+                danki_app.write_json_atomic(index_path, index)
+                print(f"  {done}/{len(todo)} clips ({time.time() - started:.0f}s)")
+
+    danki_app.write_json_atomic(index_path, index)
+    size_mb = os.path.getsize(blob_path) / (1024 * 1024)
+    print()
+    print(f"✓ Pack: {len(index['clips'])} texts, {len(offsets)} clips, {size_mb:.1f} MB in {args.out}")
+    if failed:
+        print(f"❌ {failed} of {len(texts)} clips are missing after {RETRIES} attempts each — run again to retry them")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
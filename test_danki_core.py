@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Tests for the batch machinery in danki_app.py (no network, no Anki, no Qt).
+
+AnkiConnect is replaced by FakeAnki, which answers the actions danki_app sends.
+Run from the repository root:  python -m pytest -q test_danki_core.py
+"""
+import base64
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import zipfile
+
+import pytest
+
+# danki_app keeps its state in ~/.danki; point it at a scratch home before importing
+os.environ["HOME"] = tempfile.mkdtemp(prefix="danki-test-home-")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import danki_app as d
+
+
+class FakeAnki:
+    """Just enough of AnkiConnect for the code under test, plugged in behind ANKI._post."""
+
+    def __init__(self):
+        self.notes = {}         # note id -> {"deck", "model", "fields", "tags"}
+        self.edited = set()     # ids returned for an "edited:N" search
+        self.rejected_models = set()
+        self.requests = []
+        self.next_id = 1000
+
+    def add(self, deck, model, fields, tags=()):
+        note_id = self.next_id
+        self.next_id += 1
+        self.notes[note_id] = {"deck": deck, "model": model, "fields": dict(fields), "tags": list(tags)}
+        return note_id
+
+    def post(self, payload, timeout=None):
+        self.requests.append(payload)
+        try:
+            return {"result": self.handle(payload["action"], payload.get("params", {})), "error": None}
+        except Exception as e:
+            return {"result": None, "error": str(e)}
+
+    def find(self, query):
+        if "edited:" in query:
+            return sorted(self.edited)
+        models = re.findall(r'note:"([^"]*)"', query)
+        decks = re.findall(r'deck:"([^"]*)"', query)
+        terms = [(k, re.sub(r"\\(.)", r"\1", v)) for k, v in re.findall(r'"([\w()]+):((?:[^"\\]|\\.)*)"', query)]
+        found = []
+        for note_id, note in self.notes.items():
+            if models and note["model"] not in models:
+                continue
+            if decks and note["deck"] not in decks:
+                continue
+            if all(note["fields"].get(k) == v for k, v in terms):
+                found.append(note_id)
+        return found
+
+    def can_add(self, note):
+        if note["modelName"] in self.rejected_models:
+            return False, "model was not found"
+        key = next(iter(note["fields"].values()))
+        if any(n["model"] == note["modelName"] and next(iter(n["fields"].values())) == key for n in self.notes.values()):
+            return False, "cannot create note because it is a duplicate"
+        return True, None
+
+    def handle(self, action, params):
+        if action == "multi":
+            replies = []
+            for call in params["actions"]:
+                try:
+                    replies.append({"result": self.handle(call["action"], call.get("params", {})), "error": None})
+                except Exception as e:
+                    replies.append({"result": None, "error": str(e)})
+            return replies
+        if action == "version":
+            return 6
+        if action == "findNotes":
+            return self.find(params["query"])
+        if action == "notesInfo":
+            return [{"noteId": i, "modelName": self.notes[i]["model"], "tags": self.notes[i]["tags"],
+                     "fields": {k: {"value": v, "order": 0} for k, v in self.notes[i]["fields"].items()}}
+                    for i in params["notes"] if i in self.notes]
+        if action == "canAddNotesWithErrorDetail":
+            return [dict(zip(("canAdd", "error"), self.can_add(note))) for note in params["notes"]]
+        if action == "addNotes":
+            return [self.add(n["deckName"], n["modelName"], n["fields"], n.get("tags", [])) if self.can_add(n)[0] else None
+                    for n in params["notes"]]
+        if action == "addNote":
+            note = params["note"]
+            ok, error = self.can_add(note)
+            if not ok:
+                raise Exception(error)
+            return self.add(note["deckName"], note["modelName"], note["fields"], note.get("tags", []))
+        if action == "getMediaFilesNames":
+            return []
+        raise Exception(f"unsupported action {action}")
+
+
+@pytest.fixture
+def anki(monkeypatch, tmp_path):
+    fake = FakeAnki()
+    monkeypatch.setattr(d.ANKI, "_post", fake.post)
+    monkeypatch.setattr(d, "DUPLICATE_INDEX", d.DuplicateIndex())
+    monkeypatch.setattr(d, "OUTBOX", d.Outbox(tmp_path / "outbox.jsonl", tmp_path / "outbox_media",
+                                              tmp_path / "rejected.jsonl", tmp_path / "rejected_media"))
+    monkeypatch.setattr(d, "_can_add_detail_supported", True)
+    return fake
+
+
+def word_data(word, translation, sentence):
+    return {"base_d": word, "base_e": translation, "artikel_d": "", "s1": sentence, "s1e": f"({translation})"}
+
+
+def word_note(word, deck="German", model=d.NOTE_TYPE):
+    return {"deckName": deck, "modelName": model, "fields": {"base_d": word, "s1": f"{word}!"},
+            "options": {"allowDuplicate": False}, "tags": ["danki"], "audio": []}
+
+
+# --- Translation memory ---
+
+def test_translation_memory_exact_and_fuzzy_hits(tmp_path):
+    tm = d.TranslationMemory(path=tmp_path / "tm.jsonl")
+    tm.add("Ich habe heute keine Zeit für das Kino", "Ich habe heute keine Zeit fürs Kino", "I have no time for the cinema today")
+    tm.add("Wir fahren morgen mit dem Zug nach Berlin", "Wir fahren morgen mit dem Zug nach Berlin", "We are taking the train to Berlin tomorrow")
+
+    kind, entry, similarity = tm.lookup("ich habe heute keine zeit für das kino")
+    assert kind == "exact" and similarity == 1.0
+    assert entry["translation"] == "I have no time for the cinema today"
+
+    kind, entry, similarity = tm.lookup("Wir fahren morgen mit dem Zug nach Berlin!")
+    assert kind in ("exact", "fuzzy")
+    kind, entry, similarity = tm.lookup("Wir fahren morgen mit dem Zug nach Berlln")
+    assert kind == "fuzzy" and similarity >= d.TM_FUZZY_THRESHOLD
+    assert entry["source"] == "Wir fahren morgen mit dem Zug nach Berlin"
+
+    assert tm.lookup("Wir fahren morgen mit dem Zug nach Berlin", language="Spanish")[0] is None
+    assert tm.lookup("Der Hund schläft im Garten")[0] is None
+
+    # The journal is the index: a new instance finds the same phrases
+    assert d.TranslationMemory(path=tmp_path / "tm.jsonl").lookup("Ich habe heute keine Zeit für das Kino")[0] == "exact"
+
+
+def test_translation_memory_newer_translation_replaces_older(tmp_path):
+    tm = d.TranslationMemory(path=tmp_path / "tm.jsonl")
+    tm.add("Das ist gut", "Das ist gut", "That is good")
+    tm.add("Das ist gut", "Das ist gut", "This is good")
+    assert len(tm) == 1
+    assert tm.lookup("Das ist gut")[1]["translation"] == "This is good"
+    assert d.TranslationMemory(path=tmp_path / "tm.jsonl").lookup("Das ist gut")[1]["translation"] == "This is good"
+
+
+# --- Duplicate index ---
+
+def test_duplicate_index_rereads_notes_edited_since_it_was_saved(anki):
+    hund = anki.add("German", d.NOTE_TYPE, {"base_d": "Hund"})
+    anki.add("Phrases", d.PHRASE_NOTE_TYPE, {"Phrase(German)": "Guten Morgen"})
+    index = d.DuplicateIndex()
+    assert index.maybe_resync()
+    assert index.contains("Hund") and index.contains("Guten Morgen", d.PHRASE_NOTE_TYPE)
+    saved = index.snapshot()
+
+    anki.notes[hund]["fields"]["base_d"] = "Katze"
+    anki.edited = {hund}
+    restored = d.DuplicateIndex()
+    restored.restore(saved)
+    assert restored.snapshot() is None  # not saved again before it has been revalidated
+    assert restored.maybe_resync()
+    assert restored.contains("Katze") and not restored.contains("Hund")
+    assert any("edited:" in json.dumps(p) for p in anki.requests)
+
+
+def test_duplicate_index_rebuilds_a_saved_index_that_is_too_old(anki):
+    anki.add("German", d.NOTE_TYPE, {"base_d": "Hund"})
+    index = d.DuplicateIndex()
+    index.restore({"note_keys": {999: ("word", "Vogel")}, "built_at": 0.0, "checked_day": 0})
+    assert index.contains("Vogel")
+    assert index.maybe_resync()
+    assert index.contains("Hund") and not index.contains("Vogel")
+    assert not any("edited:" in json.dumps(p) for p in anki.requests)
+
+
+def test_duplicate_index_reports_unreachable_anki(monkeypatch):
+    def unreachable(payload, timeout=None):
+        raise d.AnkiConnectUnavailable("connection refused")
+    monkeypatch.setattr(d.ANKI, "_post", unreachable)
+    index = d.DuplicateIndex()
+    assert not index.maybe_resync()
+    assert "connection refused" in index.sync_error
+
+
+# --- Offline outbox ---
+
+def test_outbox_replays_skips_present_notes_and_dead_letters_rejected(anki, tmp_path):
+    present, fresh, rejected = word_note("Hund"), word_note("Katze"), word_note("Maus", model="Unknown Type")
+    anki.add("German", d.NOTE_TYPE, present["fields"])
+    anki.rejected_models.add("Unknown Type")
+    d.OUTBOX.enqueue([present, fresh, rejected])
+    d.OUTBOX.enqueue([fresh])  # queued twice, replayed once
+    assert len(d.OUTBOX) == 3
+
+    assert d.OUTBOX.flush() == (1, 1, 1)
+    assert len(d.OUTBOX) == 0
+    assert sorted(n["fields"]["base_d"] for n in anki.notes.values()) == ["Hund", "Katze"]
+    dead = [json.loads(line) for line in open(tmp_path / "rejected.jsonl", encoding="utf-8")]
+    assert [r["note"]["fields"]["base_d"] for r in dead] == ["Maus"]
+    assert "model was not found" in dead[0]["error"]
+
+    # Nothing is replayed again after a restart
+    reopened = d.Outbox(tmp_path / "outbox.jsonl", tmp_path / "outbox_media",
+                        tmp_path / "rejected.jsonl", tmp_path / "rejected_media")
+    assert len(reopened) == 0
+
+
+def test_outbox_keeps_notes_while_anki_is_unreachable(anki, monkeypatch, tmp_path):
+    d.OUTBOX.enqueue([word_note("Hund")])
+    monkeypatch.setattr(d.ANKI, "_post", lambda payload, timeout=None: (_ for _ in ()).throw(d.AnkiConnectUnavailable("down")))
+    assert d.flush_outbox_if_reachable() is None
+    reopened = d.Outbox(tmp_path / "outbox.jsonl", tmp_path / "outbox_media",
+                        tmp_path / "rejected.jsonl", tmp_path / "rejected_media")
+    assert len(reopened) == 1
+
+
+# --- Note refresh ---
+
+def refresh_info(fields, tags=()):
+    fields = dict({"base_a": "[sound:old.mp3]", "s1a": "[sound:s1.mp3]", "s2a": "", "s3a": ""}, **fields)
+    return {"noteId": 1, "modelName": d.NOTE_TYPE, "tags": list(tags),
+            "fields": {name: {"value": value, "order": 0} for name, value in fields.items()}}
+
+
+def test_plan_note_refresh_writes_only_changed_non_empty_fields(monkeypatch):
+    monkeypatch.setattr(d, "GERMAN_DICT", {})
+    d.store_ai_result("Hund", "English", word_data("Hund", "dog", "Der Hund bellt."))
+    info = refresh_info({"base_d": "Hund", "base_e": "hound", "artikel_d": "der", "plural_d": "Hunde",
+                         "s1": "Der Hund bellt.", "s2": "Mein Hund schläft."})
+    update = d.plan_note_refresh(info, "English")
+    assert update == {"id": 1, "fields": {"base_e": "dog"}}
+
+    info = refresh_info({"base_d": "Hund", "base_e": "dog", "artikel_d": "", "s1": "Der Hund bellt."})
+    assert d.plan_note_refresh(info, "English") is None
+
+
+def test_plan_note_refresh_keeps_notes_made_for_another_language(monkeypatch):
+    monkeypatch.setattr(d, "GERMAN_DICT", {})
+    d.store_ai_result("Katze", "English", word_data("Katze", "cat", "Die Katze schläft."))
+    info = refresh_info({"base_d": "Katze", "base_e": "gato", "s1": "Die Katze schläft."},
+                        tags=[d.language_tag("Spanish")])
+    assert d.note_translation_language(info) == "Spanish"
+    assert d.plan_note_refresh(info, "English") is None
+
+
+# --- .apkg export ---
+
+APKG_MODELS = {
+    d.NOTE_TYPE: {
+        "id": 1700000000001, "fields": ["base_d", "base_e", "base_a"], "css": "",
+        "templates": [{"name": "Card 1", "qfmt": "{{base_d}}", "afmt": "{{base_e}} {{base_a}}"},
+                      {"name": "Card 2", "qfmt": "{{base_e}}", "afmt": "{{base_d}}"}],
+    },
+}
+
+
+def test_write_apkg_writes_notes_cards_and_media(tmp_path):
+    notes = [
+        {"deckName": "German::Animals", "modelName": d.NOTE_TYPE, "tags": ["danki"],
+         "fields": {"base_d": "Hund", "base_e": "dog", "base_a": ""},
+         "audio": [{"filename": "danki_hund.mp3", "data": base64.b64encode(b"mp3 bytes").decode(), "fields": ["base_a"]}]},
+        {"deckName": "German", "modelName": d.NOTE_TYPE, "tags": [],
+         "fields": {"base_d": "Katze", "base_e": "", "base_a": ""}, "audio": []},
+    ]
+    path = tmp_path / "out.apkg"
+    assert d.write_apkg(path, notes, APKG_MODELS) == 2
+
+    with zipfile.ZipFile(path) as package:
+        assert json.loads(package.read("media")) == {"0": "danki_hund.mp3"}
+        assert package.read("0") == b"mp3 bytes"
+        package.extract("collection.anki2", tmp_path)
+    db = sqlite3.connect(tmp_path / "collection.anki2")
+    try:
+        rows = db.execute("SELECT id, flds, sfld, tags FROM notes ORDER BY id").fetchall()
+        assert [r[1].split("\x1f") for r in rows] == [["Hund", "dog", "[sound:danki_hund.mp3]"], ["Katze", "", ""]]
+        assert rows[0][2] == "Hund" and rows[0][3] == " danki "
+        # Card 2 asks for base_e, which Katze lacks
+        cards = db.execute("SELECT nid, ord FROM cards ORDER BY nid, ord").fetchall()
+        assert cards == [(rows[0][0], 0), (rows[0][0], 1), (rows[1][0], 0)]
+        decks = json.loads(db.execute("SELECT decks FROM col").fetchone()[0])
+        assert {"German::Animals", "German"} <= {deck["name"] for deck in decks.values()}
+    finally:
+        db.close()
+
+
+def test_write_apkg_rejects_unknown_note_types(tmp_path):
+    with pytest.raises(d.AnkiConnectError):
+        d.write_apkg(tmp_path / "out.apkg", [word_note("Hund", model="Unknown Type")], APKG_MODELS)
+
+
+# --- Bulk import ---
+
+def imported(path, **kwargs):
+    source = d.WordImport(path, allow_duplicates=True, **kwargs)
+    return list(source), source
+
+
+def test_word_import_text_and_csv(tmp_path):
+    text = tmp_path / "words.txt"
+    text.write_text("Hund, Katze\nhaus\nHund\n\n", encoding="utf-8")
+    words, source = imported(text)
+    assert source.kind == "text" and words == ["Hund", "Katze", "haus"] and source.repeated == 1
+
+    csv_file = tmp_path / "words.csv"
+    csv_file.write_text("word;meaning\nHund;dog\n\"Straße\";street\n", encoding="utf-8")
+    assert imported(csv_file)[0] == ["Hund", "Straße"]
+
+    # Windows exports in cp1252
+    legacy = tmp_path / "legacy.txt"
+    legacy.write_bytes("Mädchen\nGrüße\n".encode("cp1252"))
+    assert imported(legacy)[0] == ["Mädchen", "Grüße"]
+
+
+def test_word_import_anki_plain_text_export(tmp_path):
+    export = tmp_path / "notes.txt"
+    export.write_text("#separator:tab\n#html:true\n#guid column:1\n"
+                      "abc123\t<b>Hund</b>\tdog [sound:x.mp3]\n"
+                      "def456\tKatze\tcat\n", encoding="utf-8")
+    assert imported(export)[0] == ["Hund", "Katze"]
+
+
+def test_word_import_anki_package_and_kindle(tmp_path):
+    package = tmp_path / "deck.apkg"
+    d.write_apkg(package, [
+        {"deckName": "German", "modelName": d.NOTE_TYPE, "fields": {"base_d": w, "base_e": "x", "base_a": ""}, "audio": []}
+        for w in ("Hund", "Katze")
+    ], APKG_MODELS)
+    words, source = imported(package)
+    assert source.kind == "anki-package" and words == ["Hund", "Katze"]
+
+    vocab = tmp_path / "vocab.db"
+    db = sqlite3.connect(vocab)
+    db.executescript("""
+        CREATE TABLE WORDS (id TEXT, word TEXT, stem TEXT, lang TEXT, timestamp INTEGER);
+        CREATE TABLE LOOKUPS (word_key TEXT, usage TEXT, timestamp INTEGER);
+        INSERT INTO WORDS VALUES ('de:liefen', 'liefen', 'laufen', 'de', 1), ('en:dog', 'dog', '', 'en', 2),
+                                 ('de:Häuser', 'Häuser', '', 'de', 3);
+        INSERT INTO LOOKUPS VALUES ('de:liefen', 'Sie liefen nach Hause.', 1), ('de:liefen', 'Wir liefen schnell.', 5);
+    """)
+    db.commit()
+    db.close()
+    words, source = imported(vocab)
+    assert source.kind == "kindle" and words == ["laufen", "Häuser"]
+    assert source.contexts == {"laufen": "Wir liefen schnell."}
+
+    not_vocab = tmp_path / "other.db"
+    sqlite3.connect(not_vocab).executescript("CREATE TABLE t (x INTEGER);")
+    with pytest.raises(ValueError):
+        d.WordImport(not_vocab)
+
+
+def test_word_import_skips_words_already_in_anki(anki, tmp_path):
+    anki.add("German", d.NOTE_TYPE, {"base_d": "Hund"})
+    text = tmp_path / "words.txt"
+    text.write_text("Hund\nKatze\n", encoding="utf-8")
+    source = d.WordImport(text)
+    assert list(source) == ["Katze"]
+    assert source.in_anki == 1 and "1 already in Anki" in source.describe()
+
+
+# --- Batch journal ---
+
+def test_batch_journal_resume_repeats_no_lookup_or_add(anki, monkeypatch, tmp_path):
+    monkeypatch.setattr(d, "BATCH_JOURNAL_DIR", tmp_path / "batches")
+    monkeypatch.setattr(d, "generate_tts_audio", lambda text, filename_hint=None: None)
+    words = ["Hund", "Katze", "Maus", "Vogel"]
+    settings = {"deck": "German", "note_type": d.NOTE_TYPE, "language": "English",
+                "allow_duplicates": False, "always_use_api": False, "defer_audio": False}
+    journal = d.BatchJournal.create(words, settings)
+    # Hund was added; Katze reached Anki but its result was never recorded; Maus was looked up
+    for i, word in enumerate(words[:3]):
+        journal.record_resolved(i, word_data(word, word.lower(), f"{word} ist da."), "AI cache")
+    journal.record_results([0], "added", 1)
+    journal.record_commit([1])
+    anki.add("German", d.NOTE_TYPE, {"base_d": "Hund"})
+    anki.add("German", d.NOTE_TYPE, {"base_d": "Katze", "s1": "Katze ist da."})
+
+    journal = d.BatchJournal.load(journal.path)
+    assert journal.done() == {0} and journal.in_flight == {1} and set(journal.resolved) == {0, 1, 2}
+    assert journal.describe() == "1 of 4 words done (deck 'German')"
+    assert [j.path for j in d.unfinished_batches()] == [journal.path]
+
+    looked_up = []
+    def resolve(word, translation_language="English", always_use_api=False):
+        looked_up.append(word)
+        return word_data(word, word.lower(), f"{word} ist da."), "AI cache", None
+    monkeypatch.setattr(d, "resolve_word", resolve)
+    results = []
+    summary = d.WordPipeline.from_journal(journal, on_result=results.append, on_message=lambda text: None).run()
+
+    assert looked_up == ["Vogel"]
+    assert summary["added"] == 4 and summary["failed"] == 0 and summary["duplicates"] == 0
+    assert sorted(n["fields"]["base_d"] for n in anki.notes.values()) == ["Hund", "Katze", "Maus", "Vogel"]
+    assert sorted(r["index"] for r in results) == [1, 2, 3]
+    assert d.BatchJournal.load(journal.path).finished and d.unfinished_batches() == []
+
+
+# --- Daemon job requests ---
+
+def test_parse_job_request_words_and_phrases():
+    config = {"translation_language": "Spanish", "use_advanced_cards": True, "defer_audio": True}
+    kind, items, settings = d.parse_job_request({"deck": "German", "text": "Hund, Katze\nHaus"}, config)
+    assert kind == "words" and items == ["Hund", "Katze", "Haus"]
+    assert settings == {"deck": "German", "language": "Spanish", "allow_duplicates": True,
+                        "note_type": d.NOTE_TYPE_ADVANCED, "always_use_api": False, "defer_audio": True}
+
+    kind, items, settings = d.parse_job_request(
+        {"deck": "Phrases", "phrases": "Guten Morgen\n\n Wie geht's? ", "include_notes": False,
+         "allow_duplicates": False, "language": "English"}, config)
+    assert kind == "phrases" and items == ["Guten Morgen", "Wie geht's?"]
+    assert settings == {"deck": "Phrases", "language": "English", "allow_duplicates": False,
+                        "context": "", "include_notes": False}
+
+
+@pytest.mark.parametrize("payload", [
+    ["Hund"],
+    {"words": ["Hund"]},
+    {"deck": "German", "words": "  "},
+    {"deck": "German", "words": ["Hund", 3]},
+    {"deck": "German", "words": ["Hund"] * (d.DAEMON_MAX_ITEMS + 1)},
+])
+def test_parse_job_request_rejects_invalid_jobs(payload):
+    with pytest.raises(ValueError):
+        d.parse_job_request(payload, {})